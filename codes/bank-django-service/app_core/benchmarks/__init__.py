@@ -0,0 +1,93 @@
+"""效能測試
+
+每個效能測試模組提供 run(repeat) 函數，回傳可以轉成JSON的測試結果。
+
+使用方法:
+
+    python manage.py benchmark 測試名稱 --repeat 次數 --output 結果.json
+
+與之前的結果比較(例如另一個提交的結果):
+
+    python manage.py benchmark 測試名稱 --output 結果.json --compare 基準.json --threshold 0.1
+
+新增效能測試時，請在 BENCHMARKS 中加入測試名稱與模組路徑。
+"""
+import time
+
+# 效能測試名稱對應的模組
+BENCHMARKS = {
+    "paillier_fixed_base": "app_core.benchmarks.paillier_fixed_base",
+    "multi_exponentiation": "app_core.benchmarks.multi_exponentiation",
+    "keypair_pool": "app_core.benchmarks.keypair_pool",
+    "paillier_decrypt": "app_core.benchmarks.paillier_decrypt",
+    "zero_knowledge_proof_generation": "app_core.benchmarks.zero_knowledge_proof_generation",
+    "zero_knowledge_proof_verification": "app_core.benchmarks.zero_knowledge_proof_verification",
+    "protocol_message_codec": "app_core.benchmarks.protocol_message_codec",
+    "token_cache": "app_core.benchmarks.token_cache",
+    "login_concurrency": "app_core.benchmarks.login_concurrency",
+    "user_lookup": "app_core.benchmarks.user_lookup",
+    "password_hashing": "app_core.benchmarks.password_hashing",
+    "database_connection": "app_core.benchmarks.database_connection",
+    "ledger_transfer": "app_core.benchmarks.ledger_transfer",
+    "bulk_transfer": "app_core.benchmarks.bulk_transfer",
+    "spent_coin_registry": "app_core.benchmarks.spent_coin_registry",
+    "protocol_session": "app_core.benchmarks.protocol_session",
+    "protocol_issuance": "app_core.benchmarks.protocol_issuance",
+    "suite": "app_core.benchmarks.suite",
+    "instrumentation": "app_core.benchmarks.instrumentation",
+}
+
+def measure(func, repeat:int = 10) ->dict:
+    """重複執行函數並且統計耗時
+
+    Args:
+        func: 不需要參數的函數。
+        repeat: int，重複次數。
+
+    Returns:
+        dict，{"repeat":次數, "mean":平均秒數, "min":最短秒數, "max":最長秒數}。
+    """
+    times = []
+    for i in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start_time)
+    return {"repeat":repeat, "mean":sum(times) / len(times), "min":min(times), "max":max(times)}
+
+# 比較時使用的耗時欄位，越小越好
+COMPARE_KEYS = ("mean", "mean_seconds")
+
+def timings(result, path:str = "") ->dict:
+    """取出結果中所有的耗時欄位，{路徑: 秒數}，路徑以/分隔，例如 cases/decrypt[q=256]/mean"""
+    values = dict()
+    if isinstance(result, dict):
+        for key, value in result.items():
+            key_path = "%s/%s" % (path, key) if path else str(key)
+            if key in COMPARE_KEYS and isinstance(value, (int, float)) and not isinstance(value, bool):
+                values[key_path] = value
+            else:
+                values.update(timings(value, key_path))
+    return values
+
+def compare(baseline:dict, result:dict, threshold:float = 0.1) ->dict:
+    """比較兩次效能測試的結果
+
+    只比較兩份結果都有的耗時欄位(COMPARE_KEYS)，ratio 為 目前 / 基準。
+
+    Args:
+        baseline: dict，基準的結果。
+        result: dict，目前的結果。
+        threshold: float，ratio 大於 1 + threshold 時視為變慢。
+
+    Returns:
+        dict，{"threshold", "timings": {路徑: {"baseline", "current", "ratio"}}, "regressions": [路徑, ...]}。
+    """
+    baseline_timings = timings(baseline)
+    current_timings = timings(result)
+    comparison = {"threshold":threshold, "timings":dict(), "regressions":[]}
+    for path in sorted(set(baseline_timings) & set(current_timings)):
+        ratio = current_timings[path] / baseline_timings[path] if baseline_timings[path] else None
+        comparison["timings"][path] = {"baseline":baseline_timings[path], "current":current_timings[path], "ratio":ratio}
+        if ratio is not None and ratio > 1 + threshold:
+            comparison["regressions"].append(path)
+    return comparison
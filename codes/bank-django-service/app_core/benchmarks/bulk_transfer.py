@@ -0,0 +1,70 @@
+"""批次轉帳的效能測試
+
+在 ACCOUNTS 個帳戶之間隨機轉帳，比較:
+    single: 每筆轉帳一個資料庫交易(Ledger.transfer)，只測試 SINGLE_TRANSFERS 筆。
+    bulk: BulkTransfer 解析 NDJSON，每 chunk_size 筆一個資料庫交易，
+          批次大小由環境變數 BENCHMARK_BULK_SIZES 指定(預設 10000,100000,1000000)。
+
+產生 NDJSON 的時間不計入。測試時會建立 user_id 從 BASE_USER_ID 開始的帳戶，結束後刪除帳戶與帳本分錄。
+"""
+import json
+import os
+import random
+import time
+from ..models.BulkTransfer import BulkTransfer
+from ..models.Currency import Currency
+from ..models.Ledger import Ledger
+from ..models.LedgerEntry import LedgerEntry
+
+ACCOUNTS = 1000
+INITIAL_BALANCE = 1000000000
+BASE_USER_ID = 910000000
+SINGLE_TRANSFERS = 10000
+SIZES = [int(size) for size in os.environ.get('BENCHMARK_BULK_SIZES', '10000,100000,1000000').split(',')]
+
+def reset(user_ids:list):
+    LedgerEntry.objects.filter(user_id__in=user_ids).delete()
+    Currency.objects.filter(user_id__in=user_ids).delete()
+    Currency.objects.bulk_create([Currency(user_id=user_id, balance=INITIAL_BALANCE) for user_id in user_ids])
+
+def random_transfers(user_ids:list, size:int) ->list:
+    random_generator = random.Random(size)
+    return [tuple(random_generator.sample(user_ids, 2)) + (random_generator.randint(1, 100),) for i in range(size)]
+
+def run(repeat:int = 1) ->dict:
+    user_ids = list(range(BASE_USER_ID, BASE_USER_ID + ACCOUNTS))
+    result = {"accounts":ACCOUNTS, "chunk_size":BulkTransfer().chunk_size}
+    try:
+        seconds = 0
+        for i in range(repeat):
+            reset(user_ids)
+            transfers = random_transfers(user_ids, SINGLE_TRANSFERS)
+            start_time = time.perf_counter()
+            for transfer in transfers:
+                Ledger.transfer(*transfer)
+            seconds += time.perf_counter() - start_time
+        result["single"] = {"transfers":SINGLE_TRANSFERS, "transfers_per_second":SINGLE_TRANSFERS * repeat / seconds}
+        for size in SIZES:
+            lines = [json.dumps({"sender":sender, "receiver":receiver, "amount":amount}).encode('utf-8') + b"\n"
+                for sender, receiver, amount in random_transfers(user_ids, size)]
+            seconds = 0
+            for i in range(repeat):
+                reset(user_ids)
+                # 直接呼叫時不限制筆數，結果逐行計算長度，不會全部留在記憶體
+                bulk_transfer = BulkTransfer(max_transfers=0)
+                start_time = time.perf_counter()
+                output_bytes = sum(len(line) for line in bulk_transfer.process(lines))
+                seconds += time.perf_counter() - start_time
+            result["bulk_%d" % size] = {
+                "seconds":seconds / repeat,
+                "transfers_per_second":size * repeat / seconds,
+                "succeeded":bulk_transfer.succeeded,
+                "failed":bulk_transfer.failed,
+                "request_bytes":sum(len(line) for line in lines),
+                "response_bytes":output_bytes,
+            }
+            result["bulk_%d" % size]["speedup"] = result["bulk_%d" % size]["transfers_per_second"] / result["single"]["transfers_per_second"]
+        return result
+    finally:
+        LedgerEntry.objects.filter(user_id__in=user_ids).delete()
+        Currency.objects.filter(user_id__in=user_ids).delete()
@@ -0,0 +1,86 @@
+"""資料庫連線模式的效能測試
+
+多個執行緒請求 /api/login，比較每個請求建立新連線(CONN_MAX_AGE=0，external 模式的Django端也是如此)、
+持續連線，以及持續連線加上健康檢查的每秒請求數與建立連線的次數。
+
+登入時的 PBKDF2 雜湊遠比建立連線耗時，測試期間將迭代次數暫時降低為 ITERATIONS，
+讓結果反映資料庫連線的差異。MySQL建立連線需要TCP與認證往返，差異會比SQLite明顯。
+
+測試用的 Client 在請求期間會停用 close_old_connections，所以在每個請求前後自行呼叫，
+與伺服器處理請求時的 request_started、request_finished 相同。
+
+需要可以連線的Redis與資料庫，測試時會建立 benchmark-connection 帳號，結束後刪除。
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections, connections
+from django.test import Client
+from ..models.DatabaseConnection import DatabaseConnection
+from ..models.PasswordHashing import ConfigurablePBKDF2PasswordHasher
+from ..models.User import User
+
+ACCOUNT = "benchmark-connection"
+PASSWORD = "benchmark"
+THREADS = 8
+REQUESTS = 400
+ITERATIONS = 1000
+
+# 名稱對應 (CONN_MAX_AGE, CONN_HEALTH_CHECKS)
+MODES = {
+    "none":(0, False),
+    "persistent":(60, False),
+    "persistent_health_checks":(60, True),
+}
+
+def close_all():
+    connections.close_all()
+
+def login_all() ->float:
+    client = Client(HTTP_HOST="localhost")
+    def login(i):
+        close_old_connections()
+        response = client.post("/api/login", {"account":ACCOUNT, "password":PASSWORD})
+        close_old_connections()
+        if json.loads(response.content).get("code") != 1:
+            raise Exception("登入失敗。")
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        list(executor.map(login, range(REQUESTS)))
+        # 關閉各執行緒的連線，下一次測試重新建立
+        list(executor.map(lambda i: close_all(), range(THREADS)))
+    return time.perf_counter() - start_time
+
+def run(repeat:int = 3) ->dict:
+    iterations = ConfigurablePBKDF2PasswordHasher.iterations
+    ConfigurablePBKDF2PasswordHasher.iterations = ITERATIONS
+    settings_dict = connections['default'].settings_dict
+    conn_max_age = settings_dict.get('CONN_MAX_AGE', 0)
+    conn_health_checks = settings_dict.get('CONN_HEALTH_CHECKS', False)
+    User.objects.update_or_create(account=ACCOUNT, defaults={"password_hash":make_password(PASSWORD)})
+    result = {"threads":THREADS, "requests":REQUESTS, "vendor":connections['default'].vendor}
+    try:
+        for name, (max_age, health_checks) in MODES.items():
+            # 每個執行緒的連線物件共用同一個 settings_dict
+            settings_dict['CONN_MAX_AGE'] = max_age
+            settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+            close_all()
+            seconds = 0
+            metrics_before = DatabaseConnection.metrics()
+            for i in range(repeat):
+                seconds += login_all()
+            metrics_after = DatabaseConnection.metrics()
+            result[name] = {
+                "requests_per_second":REQUESTS * repeat / seconds,
+                "connections_per_request":(metrics_after["created"] - metrics_before["created"]) / (REQUESTS * repeat),
+                "health_checks":metrics_after["health_checks"] - metrics_before["health_checks"],
+            }
+        result["speedup"] = result["persistent"]["requests_per_second"] / result["none"]["requests_per_second"]
+        return result
+    finally:
+        settings_dict['CONN_MAX_AGE'] = conn_max_age
+        settings_dict['CONN_HEALTH_CHECKS'] = conn_health_checks
+        ConfigurablePBKDF2PasswordHasher.iterations = iterations
+        close_all()
+        User.objects.filter(account=ACCOUNT).delete()
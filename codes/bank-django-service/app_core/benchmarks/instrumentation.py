@@ -0,0 +1,53 @@
+"""耗時統計(Instrumentation)的額外負擔
+
+比較被 Instrumentation.timed 裝飾的函數與原本的函數(__wrapped__):
+    empty: 空函數，每次呼叫的額外奈秒數，也就是最差的情況(例如 TokenCache 命中的 login_verify)。
+    yi_encrypt: 256位元q的Yi加密，額外負擔佔加密耗時的比例。
+各自以取樣比例 0(停止記錄)、0.01 與 1 測試，不需要Redis與資料庫。
+"""
+import random
+import time
+from ..models.Instrumentation import Instrumentation
+from ..models.YiModifiedPaillierEncryptionPy import YiModifiedPaillierEncryptionPy
+
+SAMPLE_RATES = (0.0, 0.01, 1.0)
+
+def per_call_seconds(func, calls:int) ->float:
+    start_time = time.perf_counter()
+    for i in range(calls):
+        func()
+    return (time.perf_counter() - start_time) / calls
+
+def compare(plain, decorated, calls:int, repeat:int) ->dict:
+    """回傳原本與每個取樣比例的每次呼叫秒數(重複 repeat 次取最小值)"""
+    original_sample_rate = Instrumentation.sample_rate
+    result = {"plain":min(per_call_seconds(plain, calls) for i in range(repeat))}
+    try:
+        for sample_rate in SAMPLE_RATES:
+            Instrumentation.sample_rate = sample_rate
+            result["sample_rate_%g" % sample_rate] = min(per_call_seconds(decorated, calls) for i in range(repeat))
+    finally:
+        Instrumentation.sample_rate = original_sample_rate
+        Instrumentation.reset()
+    return result
+
+def run(repeat:int = 20) ->dict:
+    def empty():
+        pass
+    timed_empty = Instrumentation.timed("cbdc_benchmark_seconds")(empty)
+    empty_result = compare(empty, timed_empty, 10000, repeat)
+
+    q = 115792089237316195423570985008687907852837564279074904382605163141518161494337
+    Yi = YiModifiedPaillierEncryptionPy()
+    keys = Yi.generate_keypairs(q)
+    N, g = keys["PublicKey_N"], keys["PublicKey_g"]
+    m, r = random.randrange(1, q), Yi.generate_r(N)
+    plain_encrypt = YiModifiedPaillierEncryptionPy.encrypt.__wrapped__
+    encrypt_result = compare(lambda: plain_encrypt(Yi, m, N, g, r, q), lambda: Yi.encrypt(m, N, g, r, q), 200, repeat)
+
+    return {
+        "empty":dict(empty_result, overhead_nanoseconds={
+            name:(seconds - empty_result["plain"]) * 1e9 for name, seconds in empty_result.items() if name != "plain"}),
+        "yi_encrypt":dict(encrypt_result, overhead_ratio={
+            name:seconds / encrypt_result["plain"] - 1 for name, seconds in encrypt_result.items() if name != "plain"}),
+    }
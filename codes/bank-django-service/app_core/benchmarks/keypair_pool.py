@@ -0,0 +1,49 @@
+"""Yi鑰匙池的效能比較
+
+比較使用者端 generate_keypairs_parameters 同步生成鑰匙與從鑰匙池取出鑰匙的耗時，並且回報鑰匙池的命中統計。
+"""
+import time
+from ..models.PartiallyBlindSignatureClientInterface import PartiallyBlindSignatureClientInterface
+from ..models.YiKeyPairPool import YiKeyPairPool, generate_keypair
+from . import measure
+
+# 模擬簽署者第一步驟的輸出，只需要K1點
+SIGNER_STEP1 = '{"K1x": 55066263022277343669578718895168534326250603453777594175500187360389116729240, "K1y": 32670510020758816978083085130507043184471273380659243275938904335757337482424, "b_list": []}'
+
+def new_client(keypair_pool:YiKeyPairPool = None) ->PartiallyBlindSignatureClientInterface:
+    client = PartiallyBlindSignatureClientInterface(keypair_pool)
+    client.generate_message_hash("Message")
+    client.generate_I("Public")
+    client.step1_input(SIGNER_STEP1)
+    return client
+
+def wait_until_full(pool:YiKeyPairPool):
+    pool.refill()
+    while pool.metrics()["pending"] > 0:
+        time.sleep(0.05)
+
+def run(repeat:int = 20) ->dict:
+    q = new_client().q
+    pool = YiKeyPairPool(q, target_size = repeat, refill_watermark = 0)
+
+    # 只有鑰匙生成
+    keygen_synchronous = measure(lambda: generate_keypair(q), repeat)
+    wait_until_full(pool)
+    keygen_pool = measure(pool.acquire, repeat)
+
+    # 使用者端完整的 generate_keypairs_parameters
+    synchronous = measure(lambda: new_client().generate_keypairs_parameters(), repeat)
+    wait_until_full(pool)
+    pooled = measure(lambda: new_client(pool).generate_keypairs_parameters(), repeat)
+    metrics = pool.metrics()
+    pool.shutdown()
+
+    return {
+        "keygen_synchronous":keygen_synchronous,
+        "keygen_pool":keygen_pool,
+        "keygen_speedup":keygen_synchronous["mean"] / keygen_pool["mean"],
+        "generate_keypairs_parameters_synchronous":synchronous,
+        "generate_keypairs_parameters_pool":pooled,
+        "generate_keypairs_parameters_speedup":synchronous["mean"] / pooled["mean"],
+        "pool_metrics":metrics,
+    }
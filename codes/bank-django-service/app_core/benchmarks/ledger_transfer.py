@@ -0,0 +1,94 @@
+"""熱門帳戶並行轉帳的效能測試
+
+THREADS 個執行緒在 HOT_ACCOUNTS 個帳戶之間隨機轉帳 TRANSFERS 次，比較:
+    naive: 以ORM讀取餘額、在Python中加減後 save，沒有鎖定。
+    ledger: Ledger.transfer，依照 user_id 順序鎖定並且寫入帳本分錄。
+
+結果包含每秒完成的轉帳數、失敗次數，以及遺失的金額(所有帳戶的總餘額與初始值的差異，
+沒有遺失更新時為0)。SQLite 會忽略 SELECT ... FOR UPDATE 並且鎖定整個資料庫，
+同時寫入時可能出現 database is locked 的失敗，請以MySQL測試。
+
+測試時會建立 user_id 從 BASE_USER_ID 開始的帳戶，結束後刪除帳戶與帳本分錄。
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connections
+from ..models.Currency import Currency
+from ..models.Ledger import Ledger
+from ..models.LedgerEntry import LedgerEntry
+
+HOT_ACCOUNTS = 4
+THREADS = 8
+TRANSFERS = 2000
+INITIAL_BALANCE = 1000000
+BASE_USER_ID = 900000000
+
+def naive_transfer(sender_id:int, receiver_id:int, amount:int):
+    """沒有鎖定的讀取、修改、寫入，同時進行時會遺失更新"""
+    sender = Currency.objects.get(user_id=sender_id)
+    receiver = Currency.objects.get(user_id=receiver_id)
+    if sender.balance < amount:
+        raise Exception("餘額不足。")
+    sender.balance -= amount
+    receiver.balance += amount
+    sender.save(update_fields=['balance'])
+    receiver.save(update_fields=['balance'])
+
+IMPLEMENTATIONS = {
+    "naive":naive_transfer,
+    "ledger":Ledger.transfer,
+}
+
+def reset(user_ids:list):
+    LedgerEntry.objects.filter(user_id__in=user_ids).delete()
+    Currency.objects.filter(user_id__in=user_ids).delete()
+    Currency.objects.bulk_create([Currency(user_id=user_id, balance=INITIAL_BALANCE) for user_id in user_ids])
+
+def run_transfers(transfer, user_ids:list) ->dict:
+    random_generator = random.Random(0)
+    transfers = [tuple(random_generator.sample(user_ids, 2)) + (random_generator.randint(1, 100),) for i in range(TRANSFERS)]
+    def run_one(arguments):
+        try:
+            transfer(*arguments)
+            return True
+        except Exception:
+            return False
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(run_one, transfers))
+        list(executor.map(lambda i: connections.close_all(), range(THREADS)))
+    seconds = time.perf_counter() - start_time
+    return {"seconds":seconds, "succeeded":sum(results), "failed":len(results) - sum(results)}
+
+def run(repeat:int = 3) ->dict:
+    user_ids = list(range(BASE_USER_ID, BASE_USER_ID + HOT_ACCOUNTS))
+    result = {
+        "vendor":connections['default'].vendor,
+        "threads":THREADS,
+        "hot_accounts":HOT_ACCOUNTS,
+        "transfers":TRANSFERS,
+    }
+    try:
+        for name, transfer in IMPLEMENTATIONS.items():
+            seconds = 0
+            succeeded = 0
+            failed = 0
+            lost = 0
+            for i in range(repeat):
+                reset(user_ids)
+                transfers = run_transfers(transfer, user_ids)
+                seconds += transfers["seconds"]
+                succeeded += transfers["succeeded"]
+                failed += transfers["failed"]
+                total = sum(Currency.objects.filter(user_id__in=user_ids).values_list('balance', flat=True))
+                lost += abs(INITIAL_BALANCE * HOT_ACCOUNTS - total)
+            result[name] = {
+                "transfers_per_second":succeeded / seconds,
+                "failed":failed,
+                "lost_amount":lost,
+            }
+        return result
+    finally:
+        LedgerEntry.objects.filter(user_id__in=user_ids).delete()
+        Currency.objects.filter(user_id__in=user_ids).delete()
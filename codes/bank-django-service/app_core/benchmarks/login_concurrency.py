@@ -0,0 +1,110 @@
+"""登入API的並行效能測試
+
+多個執行緒同時請求 /api/login，分別測試所有請求都是同一個帳號，以及請求分散在多個帳號的情況，
+比較原本逐一呼叫 exists/get/set/expire 的寫入方式與Lua腳本的寫入方式:
+    每秒登入次數、每次登入的Redis往返次數，以及每個帳號實際建立的Token數量(大於1表示發生競爭)。
+
+需要可以連線的Redis與資料庫，測試時會建立 benchmark-login-0000 開始的帳號，結束後刪除。
+"""
+import hashlib
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.test import Client
+from ..models.Login import Login
+from ..models.RedisConnection import RedisConnection
+from ..models.User import User
+
+ACCOUNTS = 50
+THREADS = 16
+LOGINS = 400
+PASSWORD = "benchmark"
+
+def legacy_set_user_token(self, account:str):
+    """原本的寫入方式，最多6次Redis往返，同一帳號同時登入時可能建立多個Token"""
+    token = uuid.uuid4().hex
+    json_data = json.dumps({'account':account})
+    redis_connection_token_index = RedisConnection.get(RedisConnection.TOKEN_INDEX)
+    redis_connection_user_index = RedisConnection.get(RedisConnection.USER_INDEX)
+    if redis_connection_user_index.exists(account):
+        return redis_connection_user_index.get(account).decode("utf-8")
+    redis_connection_user_index.set(account,token)
+    redis_connection_user_index.expire(account,300)
+    redis_connection_token_index.set(token,json_data)
+    redis_connection_token_index.expire(token,300)
+    return token
+
+IMPLEMENTATIONS = {
+    "legacy":legacy_set_user_token,
+    "atomic":Login.setUserToken,
+}
+
+def redis_checkouts() ->int:
+    return sum(metrics["checkouts"] for metrics in RedisConnection.metrics().values())
+
+def clear_sessions(accounts:list):
+    redis_connection_token_index = RedisConnection.get(RedisConnection.TOKEN_INDEX)
+    redis_connection_user_index = RedisConnection.get(RedisConnection.USER_INDEX)
+    tokens = [token for token in redis_connection_user_index.mget(accounts) if token is not None]
+    if tokens:
+        redis_connection_token_index.delete(*tokens)
+    redis_connection_user_index.delete(*accounts)
+
+def login_all(accounts:list) ->dict:
+    """並行登入，回傳耗時與每個帳號取得的Token"""
+    client = Client(HTTP_HOST="localhost")
+    def login(account):
+        response = client.post("/api/login", {"account":account, "password":PASSWORD})
+        return account, json.loads(response.content).get("token")
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(login, [accounts[i % len(accounts)] for i in range(LOGINS)]))
+    seconds = time.perf_counter() - start_time
+    tokens = dict()
+    for account, token in results:
+        tokens.setdefault(account, set()).add(token)
+    return {"seconds":seconds, "tokens":tokens}
+
+def run_scenario(accounts:list, repeat:int) ->dict:
+    result = dict()
+    for name, set_user_token in IMPLEMENTATIONS.items():
+        Login.setUserToken = set_user_token
+        seconds = []
+        max_tokens = 0
+        failures = 0
+        checkouts = 0
+        for i in range(repeat):
+            clear_sessions(accounts)
+            checkouts_before = redis_checkouts()
+            logins = login_all(accounts)
+            checkouts += redis_checkouts() - checkouts_before
+            seconds.append(logins["seconds"])
+            max_tokens = max(max_tokens, max(len(tokens) for tokens in logins["tokens"].values()))
+            failures += sum(1 for tokens in logins["tokens"].values() if None in tokens)
+        result[name] = {
+            "logins_per_second":LOGINS * repeat / sum(seconds),
+            "redis_round_trips_per_login":checkouts / (LOGINS * repeat),
+            "max_tokens_per_account":max_tokens,
+            "failed_accounts":failures,
+        }
+    result["speedup"] = result["atomic"]["logins_per_second"] / result["legacy"]["logins_per_second"]
+    return result
+
+def run(repeat:int = 3) ->dict:
+    accounts = ["benchmark-login-%04d" % i for i in range(ACCOUNTS)]
+    password_hash = hashlib.sha256(PASSWORD.encode('utf-8')).hexdigest()
+    for account in accounts:
+        User.objects.get_or_create(account=account, defaults={"password_hash":password_hash})
+    set_user_token = Login.setUserToken
+    try:
+        return {
+            "threads":THREADS,
+            "logins":LOGINS,
+            "one_account":run_scenario(accounts[:1], repeat),
+            "many_accounts":run_scenario(accounts, repeat),
+        }
+    finally:
+        Login.setUserToken = set_user_token
+        clear_sessions(accounts)
+        User.objects.filter(account__in=accounts).delete()
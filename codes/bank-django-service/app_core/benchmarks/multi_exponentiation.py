@@ -0,0 +1,48 @@
+"""同時多重冪次運算的效能比較
+
+以正式使用的金鑰大小(secp256k1 的 q，N約770位元)比較:
+    1. 加密的 g^m * r^N: 兩次 gmpy2.powmod、強制交錯計算、依照成本估計自動選擇。
+    2. 批次驗證的 Π C_i^s_i(40個底數，64位元指數): 逐一 gmpy2.powmod 與交錯計算。
+結果也可以用來校正 MultiExponentiation 中的 POWMOD_STEP_COST 與 LOOP_STEP_COST。
+"""
+import random
+import gmpy2
+from ..models.YiModifiedPaillierEncryptionPy import YiModifiedPaillierEncryptionPy
+from ..models.MultiExponentiation import multi_powmod
+from . import measure
+
+# secp256k1 的 Order
+SECP256K1_Q = 115792089237316195423570985008687907852837564279074904382605163141518161494337
+
+def run(repeat:int = 20) ->dict:
+    q = SECP256K1_Q
+    Yi = YiModifiedPaillierEncryptionPy()
+    keys = Yi.generate_keypairs(q)
+    N, g, r = gmpy2.mpz(keys["PublicKey_N"]), gmpy2.mpz(keys["PublicKey_g"]), gmpy2.mpz(keys["RandomNumber_r"])
+    N_power_2 = pow(N, 2)
+    m = random.randrange(2**255, q)
+
+    # 加密的兩個底數
+    encrypt_separate = measure(lambda: gmpy2.mod(gmpy2.powmod(g, m, N_power_2) * gmpy2.powmod(r, N, N_power_2), N_power_2), repeat)
+    encrypt_interleave = measure(lambda: multi_powmod([g, r], [m, N], N_power_2, interleave = True), repeat)
+    encrypt_auto = measure(lambda: multi_powmod([g, r], [m, N], N_power_2), repeat)
+
+    # 批次驗證的40個底數
+    bases = [Yi.generate_r(N) for i in range(40)]
+    exponents = [random.randrange(1, 2**64) for i in range(40)]
+    batch_separate = measure(lambda: multi_powmod(bases, exponents, N_power_2, interleave = False), repeat)
+    batch_interleave = measure(lambda: multi_powmod(bases, exponents, N_power_2, interleave = True), repeat)
+
+    if multi_powmod(bases, exponents, N_power_2, interleave = True) != multi_powmod(bases, exponents, N_power_2, interleave = False):
+        raise Exception("交錯計算的結果與逐一計算不同。")
+
+    return {
+        "N_bits":int(N.bit_length()),
+        "encrypt_two_powmod":encrypt_separate,
+        "encrypt_interleave":encrypt_interleave,
+        "encrypt_auto":encrypt_auto,
+        "encrypt_interleave_speedup":encrypt_separate["mean"] / encrypt_interleave["mean"],
+        "batch_40_bases_separate":batch_separate,
+        "batch_40_bases_interleave":batch_interleave,
+        "batch_40_bases_speedup":batch_separate["mean"] / batch_interleave["mean"],
+    }
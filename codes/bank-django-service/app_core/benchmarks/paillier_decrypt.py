@@ -0,0 +1,37 @@
+"""CRT解密與原本 decrypt 的效能比較
+
+使用 secp256k1 的 q，解密256位元的m。
+"""
+import random
+from ..models.YiModifiedPaillierEncryptionPy import YiModifiedPaillierEncryptionPy
+from ..models.YiDecryptionContext import YiDecryptionContext
+from . import measure
+
+# secp256k1 的 Order
+SECP256K1_Q = 115792089237316195423570985008687907852837564279074904382605163141518161494337
+
+def run(repeat:int = 20) ->dict:
+    q = SECP256K1_Q
+    Yi = YiModifiedPaillierEncryptionPy()
+    keys = Yi.generate_keypairs(q)
+    p, k, N, g = keys["PrivateKey_p"], keys["PrivateKey_k"], keys["PublicKey_N"], keys["PublicKey_g"]
+    messages = [random.randrange(2**255, q) for i in range(repeat)]
+    C_list = [Yi.encrypt(m, N, g, Yi.generate_r(N), q) for m in messages]
+
+    C_iter = iter(C_list * 2)
+    baseline = measure(lambda: Yi.decrypt(next(C_iter), p, k, q, N, crt = False), repeat)
+    C_iter = iter(C_list * 2)
+    crt = measure(lambda: Yi.decrypt(next(C_iter), p, k, q, N), repeat)
+    build_context = measure(lambda: YiDecryptionContext(p, k, q, N), repeat)
+    batch = measure(lambda: Yi.decrypt_many(C_list, p, k, q, N), 1)
+
+    if Yi.decrypt_many(C_list, p, k, q, N) != messages:
+        raise Exception("CRT解密的結果與明文不同。")
+
+    return {
+        "decrypt":baseline,
+        "decrypt_crt":crt,
+        "decrypt_crt_speedup":baseline["mean"] / crt["mean"],
+        "build_context":build_context,
+        "decrypt_many_per_ciphertext":batch["mean"] / len(C_list),
+    }
@@ -0,0 +1,58 @@
+"""固定底數預計算與原本 encrypt 的效能比較
+
+使用 secp256k1 的 q，加密256位元的m。
+"""
+import random
+import time
+import gmpy2
+from ..models.YiModifiedPaillierEncryptionPy import YiModifiedPaillierEncryptionPy
+from ..models.YiFixedBasePrecomputation import YiFixedBasePrecomputation
+from . import measure
+
+# secp256k1 的 Order
+SECP256K1_Q = 115792089237316195423570985008687907852837564279074904382605163141518161494337
+
+def run(repeat:int = 20) ->dict:
+    q = SECP256K1_Q
+    Yi = YiModifiedPaillierEncryptionPy()
+    keys = Yi.generate_keypairs(q)
+    N, g, r = keys["PublicKey_N"], keys["PublicKey_g"], keys["RandomNumber_r"]
+    N_power_2 = pow(gmpy2.mpz(N), 2)
+    messages = [random.randrange(2**255, q) for i in range(repeat)]
+
+    # 建表耗時
+    start_time = time.perf_counter()
+    fixed_base = YiFixedBasePrecomputation(g, N, q.bit_length())
+    build_time = time.perf_counter() - start_time
+
+    # 原本的 encrypt 與 g^m
+    messages_iter = iter(messages * 2)
+    baseline_encrypt = measure(lambda: Yi.encrypt(next(messages_iter), N, g, r, q), repeat)
+    messages_iter = iter(messages * 2)
+    baseline_powmod = measure(lambda: gmpy2.powmod(g, next(messages_iter), N_power_2), repeat)
+
+    # 查表的 encrypt 與 g^m
+    messages_iter = iter(messages * 2)
+    fixed_base_encrypt = measure(lambda: fixed_base.encrypt(next(messages_iter), r), repeat)
+    messages_iter = iter(messages * 2)
+    fixed_base_powmod = measure(lambda: fixed_base.powmod(next(messages_iter)), repeat)
+
+    # 檢查結果相同
+    for m in messages:
+        if fixed_base.encrypt(m, r) != Yi.encrypt(m, N, g, r, q):
+            raise Exception("預計算表的加密結果與原本的 encrypt 不同。")
+
+    return {
+        "N_bits":int(gmpy2.mpz(N).bit_length()),
+        "m_bits":256,
+        "window":fixed_base.window,
+        "build_table_seconds":build_time,
+        "encrypt":baseline_encrypt,
+        "encrypt_fixed_base":fixed_base_encrypt,
+        "encrypt_speedup":baseline_encrypt["mean"] / fixed_base_encrypt["mean"],
+        "g_power_m":baseline_powmod,
+        "g_power_m_fixed_base":fixed_base_powmod,
+        "g_power_m_speedup":baseline_powmod["mean"] / fixed_base_powmod["mean"],
+        # 預計算表在幾次加密後回本
+        "break_even_encryptions":build_time / max(baseline_encrypt["mean"] - fixed_base_encrypt["mean"], 1e-12),
+    }
@@ -0,0 +1,34 @@
+"""密碼雜湊的效能測試
+
+比較舊版 SHA-256 與不同迭代次數的 PBKDF2 驗證一次密碼的耗時(不含重新雜湊)，
+舊版密碼第一次登入(驗證並且重新雜湊)的耗時，
+並且以 THREADS 個執行緒同時登入，回報有上限的執行緒池中雜湊與排隊的延遲。
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.hashers import check_password, make_password
+from ..models.PasswordHashing import ConfigurablePBKDF2PasswordHasher, PasswordHashing
+from . import measure
+
+PASSWORD = "benchmark"
+ITERATIONS = [10000, 100000, 260000]
+THREADS = 16
+
+def run(repeat:int = 20) ->dict:
+    legacy_encoded = hashlib.sha256(PASSWORD.encode('utf-8')).hexdigest()
+    result = {"legacy_sha256":measure(lambda: check_password(PASSWORD, PasswordHashing.LEGACY_PREFIX + legacy_encoded), repeat)}
+    for iterations in ITERATIONS:
+        encoded = ConfigurablePBKDF2PasswordHasher().encode(PASSWORD, ConfigurablePBKDF2PasswordHasher().salt(), iterations)
+        result["pbkdf2_%d" % iterations] = measure(lambda: check_password(PASSWORD, encoded), repeat)
+    # 舊版密碼第一次登入，驗證後以目前的迭代次數重新雜湊
+    hashing = PasswordHashing()
+    result["legacy_sha256_rehash"] = measure(lambda: hashing.check(PASSWORD, legacy_encoded), repeat)
+
+    # 同時登入，雜湊在 PasswordHashing 的執行緒池中執行
+    encoded = make_password(PASSWORD)
+    hashing = PasswordHashing()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        list(executor.map(lambda i: hashing.verify(PASSWORD, encoded), range(repeat * THREADS)))
+    result["concurrent"] = dict(hashing.metrics(), threads=THREADS)
+    hashing.shutdown()
+    return result
@@ -0,0 +1,110 @@
+"""部分盲簽章完整發行的效能測試
+
+在同一個程序中依序執行完整的發行流程(簽署者三個步驟、使用者解密並且驗證簽章)，每次使用新的登入Token與協定狀態:
+    每個步驟: 簽署者 process(含格式檢查、密碼學運算、編碼與Redis)的延遲。
+    end_to_end: 一次發行的總延遲，包含使用者端的運算(Yi鑰匙從預先填滿的鑰匙池取出)。
+    per_core: 以CPU時間(time.process_time)換算，每個CPU核心每秒可以完成的發行次數，
+              signer 只計算簽署者，end_to_end 包含使用者端。
+零知識證明在目前執行緒驗證(不使用 ProtocolExecutor)，CPU時間才會完整計入這個程序。
+
+需要可以連線的Redis與ECDSA鑰匙(ECDSA_PUBLICKEY、ECDSA_PRIVATEKEY)，測試用的鍵在結束後刪除。
+"""
+import json
+import os
+import time
+import uuid
+from ellipticcurve.privateKey import PublicKey
+from ..models.PartiallyBlindSignatureClientInterface import PartiallyBlindSignatureClientInterface
+from ..models.PartiallyBlindSignatureServerInterface import PartiallyBlindSignatureServerInterface
+from ..models.ProtocolSession import ProtocolSession
+from ..models.RedisConnection import RedisConnection
+from ..models.YiKeyPairPool import YiKeyPairPool
+
+EXPIRE_SECONDS = 300
+
+class Timer:
+    """累計牆上時間與CPU時間"""
+    def __init__(self):
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    def __call__(self, func, *args):
+        start_time, start_cpu_time = time.perf_counter(), time.process_time()
+        try:
+            return func(*args)
+        finally:
+            self.seconds += time.perf_counter() - start_time
+            self.cpu_seconds += time.process_time() - start_cpu_time
+
+def issue(token:str, keypair_pool:YiKeyPairPool, signer_timers:dict, user_timer:Timer, signer_class = PartiallyBlindSignatureServerInterface) ->tuple:
+    """完整發行一次，回傳使用者與得到的簽章
+
+    signer_class 可以是設定不同零知識證明回合數的子類別，使用者使用相同的回合數。
+    """
+    def signer(step, input = None):
+        return signer_timers[step](lambda: signer_class(token).process(token, input))
+    user = PartiallyBlindSignatureClientInterface(keypair_pool)
+    user.NumberOfZeroKnowledgeProofRound = signer_class.NumberOfZeroKnowledgeProofRound
+    user_timer(user.generate_message_hash, "Message")
+    user_timer(user.generate_I, "Public")
+    user_timer(user.step1_input, *signer(1))
+    user_timer(user.generate_keypairs_parameters)
+    user_timer(user.step2_input, *signer(2, user_timer(user.step1_output)))
+    signature = user_timer(user.step3_input, *signer(3, user_timer(user.step2_output)))
+    return user, signature
+
+def summarize(timer:Timer, count:int) ->dict:
+    return {"mean_seconds":timer.seconds / count, "mean_cpu_seconds":timer.cpu_seconds / count}
+
+def run(repeat:int = 20) ->dict:
+    redis_connection = RedisConnection.get(RedisConnection.TOKEN_INDEX)
+    Q = PublicKey.fromPem(os.environ['ECDSA_PUBLICKEY']).point
+    keypair_pool = YiKeyPairPool(PartiallyBlindSignatureClientInterface().q, target_size = repeat + 1, refill_watermark = 0)
+    keypair_pool.refill()
+    while keypair_pool.metrics()["pending"] > 0:
+        time.sleep(0.05)
+
+    signer_timers = {step:Timer() for step in PartiallyBlindSignatureServerInterface.STEPS}
+    user_timer = Timer()
+    total_timer = Timer()
+    latencies = []
+    failures = 0
+    tokens = ["benchmark-" + uuid.uuid4().hex for i in range(repeat + 1)]
+    try:
+        for token in tokens:
+            redis_connection.set(token, json.dumps({"account":"benchmark"}), ex=EXPIRE_SECONDS)
+        # 第一次發行載入模組與建立連線，不計入
+        issue(tokens[0], keypair_pool, {step:Timer() for step in signer_timers}, Timer())
+        for token in tokens[1:]:
+            start_time = time.perf_counter()
+            user, signature = total_timer(issue, token, keypair_pool, signer_timers, user_timer)
+            latencies.append(time.perf_counter() - start_time)
+            # 驗證簽章不計入發行時間
+            failures += 0 if user.verify_signature(Q.x, Q.y) else 1
+    finally:
+        for token in tokens:
+            redis_connection.delete(token, ProtocolSession.KEY_PREFIX + token)
+        keypair_pool.shutdown()
+
+    signer_cpu_seconds = sum(timer.cpu_seconds for timer in signer_timers.values()) / repeat
+    latencies.sort()
+    return {
+        "repeat":repeat,
+        "invalid_signatures":failures,
+        "steps":{"step_%d" % step:summarize(timer, repeat) for step, timer in signer_timers.items()},
+        "signer":{
+            "mean_seconds":sum(timer.seconds for timer in signer_timers.values()) / repeat,
+            "mean_cpu_seconds":signer_cpu_seconds,
+        },
+        "user":summarize(user_timer, repeat),
+        "end_to_end":dict(summarize(total_timer, repeat),
+            p50=latencies[len(latencies) // 2],
+            p95=latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            max=latencies[-1],
+        ),
+        "per_core":{
+            "signer_issuances_per_second":1 / signer_cpu_seconds,
+            "end_to_end_issuances_per_second":repeat / total_timer.cpu_seconds,
+        },
+        "sequential_issuances_per_second":repeat / total_timer.seconds,
+    }
@@ -0,0 +1,24 @@
+"""協定訊息編碼格式的效能比較
+
+以使用者第二步驟的輸出(20回合的零知識證明)比較JSON與二進位格式的編碼、解碼耗時與訊息大小。
+"""
+from ..models.ProtocolMessageCodec import ProtocolMessageCodec
+from .zero_knowledge_proof_verification import generate_proof
+from . import measure
+
+def run(repeat:int = 20) ->dict:
+    b_list, message = generate_proof()
+    result = dict()
+    for name, content_type in (("json", ProtocolMessageCodec.CONTENT_TYPE_JSON), ("binary", ProtocolMessageCodec.CONTENT_TYPE_BINARY)):
+        data = ProtocolMessageCodec.encode(message, content_type)
+        if ProtocolMessageCodec.decode(data, content_type) != message:
+            raise Exception("解碼後的訊息與原本不同。")
+        result[name] = {
+            "bytes":len(data.encode("utf-8") if isinstance(data, str) else data),
+            "encode":measure(lambda: ProtocolMessageCodec.encode(message, content_type), repeat),
+            "decode":measure(lambda: ProtocolMessageCodec.decode(data, content_type), repeat),
+        }
+    result["size_ratio"] = result["json"]["bytes"] / result["binary"]["bytes"]
+    result["encode_speedup"] = result["json"]["encode"]["mean"] / result["binary"]["encode"]["mean"]
+    result["decode_speedup"] = result["json"]["decode"]["mean"] / result["binary"]["decode"]["mean"]
+    return result
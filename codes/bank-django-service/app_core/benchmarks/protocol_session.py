@@ -0,0 +1,100 @@
+"""盲簽章協定狀態的效能測試
+
+模擬一次協定的狀態變化(2048位元的N，4096位元的密文，20回合的零知識證明都存入狀態)，比較:
+    json: 原本的方式，每個步驟 GET 整個JSON、解析、SET 整個JSON、EXPIRE，大整數為十進位文字。
+    hash: ProtocolSession，每個步驟一次Lua腳本，只寫入改變的欄位，大整數為二進位。
+統計每個步驟寫入與讀取的位元組(欄位名稱與值，不含Redis協定本身)與延遲。
+
+需要可以連線的Redis，測試用的鍵在結束後刪除。
+"""
+import json
+import random
+import time
+import uuid
+from ..models.ProtocolSession import ProtocolSession
+from ..models.RedisConnection import RedisConnection
+
+ROUNDS = 20
+EXPIRE_SECONDS = 300
+
+def step_fields(random_generator) ->list:
+    """每個步驟改變的欄位，[(步驟, 欄位), ...]"""
+    def number(bits):
+        return random_generator.getrandbits(bits) | (1 << (bits - 1))
+    zero_knowledge_proof = lambda: [{"Cp":number(4096), "x":number(256), "rp":number(2048), "xp":number(256), "rpp":number(2048)} for i in range(ROUNDS)]
+    return [
+        (1, dict()),
+        (2, {"C1":number(4096), "C2":number(4096), "N":number(2048), "g":number(2048),
+             "ZeroKnowledgeProofC1List":zero_knowledge_proof(), "ZeroKnowledgeProofC2List":zero_knowledge_proof()}),
+        (3, {"C":number(4096)}),
+        (4, {"L":[number(256) for i in range(40)]}),
+    ]
+
+def initial_fields(random_generator) ->dict:
+    return {"i_list":sorted(random_generator.sample(range(41), 20)), "b_list":[random_generator.randrange(2) for i in range(ROUNDS)]}
+
+def run_json(redis_connection, token:str, initial:dict, steps:list, result:dict):
+    key = "benchmark_json_session:" + token
+    status = dict(initial, step=1)
+    data = json.dumps(status)
+    start_time = time.perf_counter()
+    redis_connection.set(key, data)
+    redis_connection.expire(key, EXPIRE_SECONDS)
+    result.setdefault("load", []).append((len(data), 0, time.perf_counter() - start_time))
+    for step, fields in steps:
+        start_time = time.perf_counter()
+        data = redis_connection.get(key)
+        status = json.loads(data)
+        status.update(fields)
+        status["step"] = step + 1
+        written = json.dumps(status)
+        redis_connection.set(key, written)
+        redis_connection.expire(key, EXPIRE_SECONDS)
+        result.setdefault("advance_%d" % step, []).append((len(written), len(data), time.perf_counter() - start_time))
+    redis_connection.delete(key)
+
+def run_hash(redis_connection, token:str, initial:dict, steps:list, result:dict):
+    session = ProtocolSession(token, EXPIRE_SECONDS)
+    start_time = time.perf_counter()
+    session.load(initial)
+    result.setdefault("load", []).append((sum(len(argument) for argument in ProtocolSession.encode_fields(initial)), 0, time.perf_counter() - start_time))
+    for step, fields in steps:
+        # 每個請求都需要載入目前的狀態
+        start_time = time.perf_counter()
+        values = redis_connection.hgetall(session.key)
+        session.advance(step, fields)
+        written = sum(len(argument) for argument in ProtocolSession.encode_fields(fields))
+        read = sum(len(name) + len(value) for name, value in values.items())
+        result.setdefault("advance_%d" % step, []).append((written, read, time.perf_counter() - start_time))
+    session.delete()
+
+def summarize(result:dict) ->dict:
+    return {operation:{
+        "bytes_written":sum(sample[0] for sample in samples) / len(samples),
+        "bytes_read":sum(sample[1] for sample in samples) / len(samples),
+        "mean_seconds":sum(sample[2] for sample in samples) / len(samples),
+    } for operation, samples in result.items()}
+
+def run(repeat:int = 20) ->dict:
+    redis_connection = RedisConnection.get(RedisConnection.TOKEN_INDEX)
+    random_generator = random.Random(0)
+    results = {"json":dict(), "hash":dict()}
+    token = "benchmark-" + uuid.uuid4().hex
+    redis_connection.set(token, json.dumps({"account":"benchmark"}), ex=EXPIRE_SECONDS)
+    try:
+        for i in range(repeat):
+            initial = initial_fields(random_generator)
+            steps = step_fields(random_generator)
+            run_json(redis_connection, token, initial, steps, results["json"])
+            run_hash(redis_connection, token, initial, steps, results["hash"])
+    finally:
+        redis_connection.delete(token, ProtocolSession.KEY_PREFIX + token)
+    result = {name:summarize(samples) for name, samples in results.items()}
+    for name in ("json", "hash"):
+        result[name]["total"] = {
+            "bytes_written":sum(step["bytes_written"] for step in result[name].values()),
+            "bytes_read":sum(step["bytes_read"] for step in result[name].values()),
+            "mean_seconds":sum(step["mean_seconds"] for step in result[name].values()),
+        }
+    result["speedup"] = result["json"]["total"]["mean_seconds"] / result["hash"]["total"]["mean_seconds"]
+    return result
@@ -0,0 +1,93 @@
+"""已使用貨幣登記的效能測試
+
+建立暫時的已使用貨幣資料表，寫入 BENCHMARK_SPENT_COINS 個(預設100,000,000)貨幣，
+以相同數量為容量重建布隆過濾器後比較:
+    database: 每次以主鍵查詢資料庫。
+    filter: SpentCoinRegistry.is_spent，過濾器回報不存在時不查詢資料庫。
+分別查詢 CHECKS 個未使用與已使用的貨幣，並且統計實際的誤判率與重建耗時。
+
+寫入1億筆需要相當長的時間與磁碟空間，可以用環境變數調整數量。
+暫時的資料表與過濾器在測試結束後刪除，不會影響 app_core_spentcoin。
+"""
+import os
+import random
+import time
+from django.db import connection, models
+from django.utils import timezone
+from ..models.SpentCoinRegistry import SpentCoinRegistry
+from . import measure
+
+COINS = int(os.environ.get('BENCHMARK_SPENT_COINS', 100000000))
+BATCH_SIZE = 10000
+CHECKS = 10000
+KEY_PREFIX = "benchmark_spent_coin_filter"
+
+class BenchmarkSpentCoin(models.Model):
+    coin_hash = models.CharField(max_length=64, primary_key=True)
+    spent_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        app_label = 'app_core'
+        managed = False
+        db_table = 'benchmark_spent_coin'
+
+def coin(random_generator, index:int) ->bytes:
+    return index.to_bytes(8, 'big') + random_generator.getrandbits(128).to_bytes(16, 'big')
+
+def fill(random_generator) ->list:
+    """寫入貨幣，回傳其中 CHECKS 個已使用的貨幣"""
+    spent = []
+    spent_at = timezone.now()
+    for start in range(0, COINS, BATCH_SIZE):
+        coins = [coin(random_generator, index) for index in range(start, min(start + BATCH_SIZE, COINS))]
+        if len(spent) < CHECKS:
+            spent.extend(coins[:CHECKS - len(spent)])
+        BenchmarkSpentCoin.objects.bulk_create([BenchmarkSpentCoin(coin_hash=SpentCoinRegistry.coin_hash(item), spent_at=spent_at) for item in coins])
+    return spent
+
+def run(repeat:int = 3) ->dict:
+    random_generator = random.Random(0)
+    registry = SpentCoinRegistry(capacity=COINS, model=BenchmarkSpentCoin, key_prefix=KEY_PREFIX)
+    with connection.schema_editor() as schema_editor:
+        schema_editor.create_model(BenchmarkSpentCoin)
+    try:
+        start_time = time.perf_counter()
+        spent = fill(random_generator)
+        fill_seconds = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        registry.rebuild()
+        rebuild_seconds = time.perf_counter() - start_time
+        # 序號從 COINS 開始，一定沒有使用過
+        unspent = [coin(random_generator, COINS + index) for index in range(CHECKS)]
+
+        def database_check(coins):
+            return lambda: [BenchmarkSpentCoin.objects.filter(coin_hash=SpentCoinRegistry.coin_hash(item)).exists() for item in coins]
+
+        def filter_check(coins):
+            return lambda: [registry.is_spent(item) for item in coins]
+
+        result = {
+            "vendor":connection.vendor,
+            "coins":COINS,
+            "checks":CHECKS,
+            "fill_seconds":fill_seconds,
+            "rebuild_seconds":rebuild_seconds,
+            "unspent_database":measure(database_check(unspent), repeat),
+            "spent_database":measure(database_check(spent), repeat),
+        }
+        metrics_before = registry.metrics()
+        result["unspent_filter"] = measure(filter_check(unspent), repeat)
+        metrics_after = registry.metrics()
+        result["spent_filter"] = measure(filter_check(spent), repeat)
+        for name in ("unspent_database", "spent_database", "unspent_filter", "spent_filter"):
+            result[name]["checks_per_second"] = CHECKS / result[name]["mean"]
+        result["speedup"] = result["unspent_filter"]["checks_per_second"] / result["unspent_database"]["checks_per_second"]
+        checks = metrics_after["checks"] - metrics_before["checks"]
+        result["false_positive_rate"] = (metrics_after["false_positives"] - metrics_before["false_positives"]) / checks
+        result["expected_false_positive_rate"] = registry.error_rate
+        result["filter"] = {"bits":registry.bits, "hashes":registry.hashes, "bytes":registry.metrics()["bytes"]}
+        return result
+    finally:
+        registry.clear()
+        with connection.schema_editor() as schema_editor:
+            schema_editor.delete_model(BenchmarkSpentCoin)
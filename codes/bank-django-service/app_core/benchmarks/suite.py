@@ -0,0 +1,178 @@
+"""部分盲簽章的效能測試組合
+
+不需要Redis、MySQL或環境變數中的ECDSA鑰匙，可以在每個提交上執行，之後比較結果:
+    keygen: Yi鑰匙生成。
+    encrypt: Yi加密(g^m * r^N 同時多重冪次運算)。
+    encrypt_fixed_base: 使用固定底數預計算表的Yi加密。
+    decrypt: CRT解密。
+    zkp_generate: 使用者生成全部回合的零知識證明，不含鑰匙生成。
+    zkp_verify: 簽署者以批次驗證檢查全部回合。
+    issuance: 完整發行(簽署者三個步驟、使用者端的運算與鑰匙生成)，
+              協定狀態存放在 fakeredis 的記憶體Redis，ECDSA鑰匙在執行時臨時生成。
+              q 固定為 secp256k1 的 order，只依照回合數參數化。
+              fakeredis 為選用的套件(pip install fakeredis lupa)，沒有安裝時略過並且記錄原因。
+
+參數可以由環境變數指定(逗號分隔):
+    BENCHMARK_KEY_SIZES: q 的位元數，Yi的 N = p * q * k 約為3倍，預設 "256,512"。
+    BENCHMARK_ROUNDS: 零知識證明回合數，預設 "20,40"。
+
+案例名稱為 測試[參數]，例如 zkp_verify[q=256,rounds=20]。
+
+使用方法:
+    python manage.py benchmark suite --repeat 10 --output baseline.json
+    (切換到其他提交)
+    python manage.py benchmark suite --repeat 10 --output current.json --compare baseline.json
+"""
+import contextlib
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import uuid
+import gmpy2
+from ellipticcurve.privateKey import PrivateKey
+from ..models.PartiallyBlindSignatureClientInterface import PartiallyBlindSignatureClientInterface
+from ..models.PartiallyBlindSignatureServerInterface import PartiallyBlindSignatureServerInterface, zero_knowledge_proof_verify_rounds
+from ..models.ProtocolSession import ProtocolSession
+from ..models.RedisConnection import RedisConnection
+from ..models.YiModifiedPaillierEncryptionPy import YiModifiedPaillierEncryptionPy
+from . import measure
+from .protocol_issuance import Timer, issue
+
+def parameter_list(name:str, default:str) ->list:
+    return [int(value) for value in os.environ.get(name, default).split(",") if value.strip()]
+
+def environment() ->dict:
+    """執行環境，比較結果時確認是否在相同的環境執行"""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit":commit,
+        "python":platform.python_version(),
+        "gmpy2":gmpy2.version(),
+        "machine":platform.machine(),
+        "cpu_count":os.cpu_count(),
+        "time":datetime.datetime.now().isoformat(),
+    }
+
+@contextlib.contextmanager
+def in_memory_redis():
+    """將 RedisConnection 共用的客戶端暫時替換成 fakeredis"""
+    import fakeredis
+    server = fakeredis.FakeServer()
+    with RedisConnection.lock:
+        original_clients = dict(RedisConnection.clients)
+        for db in (RedisConnection.TOKEN_INDEX, RedisConnection.USER_INDEX, RedisConnection.SPENT_COIN_INDEX):
+            RedisConnection.clients[db] = fakeredis.FakeRedis(server=server, db=db)
+    try:
+        yield RedisConnection.clients[RedisConnection.TOKEN_INDEX]
+    finally:
+        with RedisConnection.lock:
+            RedisConnection.clients.clear()
+            RedisConnection.clients.update(original_clients)
+
+@contextlib.contextmanager
+def ephemeral_ecdsa_keys():
+    """暫時以新生成的ECDSA鑰匙取代環境變數中的鑰匙，回傳公鑰的點"""
+    private_key = PrivateKey()
+    names = ('ECDSA_PUBLICKEY', 'ECDSA_PRIVATEKEY')
+    original = {name:os.environ.get(name) for name in names}
+    os.environ['ECDSA_PUBLICKEY'] = private_key.publicKey().toPem()
+    os.environ['ECDSA_PRIVATEKEY'] = private_key.toPem()
+    try:
+        yield private_key.publicKey().point
+    finally:
+        for name, value in original.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def new_client(q:int, rounds:int) ->PartiallyBlindSignatureClientInterface:
+    """完成第一步驟並且生成鑰匙的使用者，q 可以不是 secp256k1 的 order"""
+    client = PartiallyBlindSignatureClientInterface()
+    client.q = q
+    client.NumberOfZeroKnowledgeProofRound = rounds
+    client.generate_message_hash("Message")
+    client.generate_I("Public")
+    client.step1_input(json.dumps({"K1x":client.curve_Gx, "K1y":client.curve_Gy, "b_list":[random.randrange(2) for i in range(rounds)]}))
+    client.generate_keypairs_parameters()
+    return client
+
+def cycle(values:list):
+    """每次呼叫時依序回傳下一個值，用完後從頭開始"""
+    iterator = itertools.cycle(values)
+    return lambda: next(iterator)
+
+def primitive_cases(q_bits:int, rounds_list:list, repeat:int) ->dict:
+    """鑰匙生成、加解密與零知識證明的案例"""
+    cases = dict()
+    label = "q=%d" % q_bits
+    Yi = YiModifiedPaillierEncryptionPy()
+    q = Yi.generate_q(2**(q_bits - 1), 2**q_bits)
+    cases["keygen[%s]" % label] = measure(lambda: YiModifiedPaillierEncryptionPy().generate_keypairs(q), repeat)
+
+    keys = Yi.generate_keypairs(q)
+    p, k, N, g = keys["PrivateKey_p"], keys["PrivateKey_k"], keys["PublicKey_N"], keys["PublicKey_g"]
+    next_message = cycle([(random.randrange(1, q), Yi.generate_r(N)) for i in range(repeat)])
+    def encrypt(Yi):
+        m, r = next_message()
+        return Yi.encrypt(m, N, g, r, q)
+    cases["encrypt[%s]" % label] = measure(lambda: encrypt(Yi), repeat)
+    fixed_base_Yi = YiModifiedPaillierEncryptionPy()
+    fixed_base_Yi.enable_fixed_base(N, g, q)
+    cases["encrypt_fixed_base[%s]" % label] = measure(lambda: encrypt(fixed_base_Yi), repeat)
+    next_C = cycle([encrypt(Yi) for i in range(repeat)])
+    cases["decrypt[%s]" % label] = measure(lambda: Yi.decrypt(next_C(), p, k, q, N), repeat)
+
+    for rounds in rounds_list:
+        rounds_label = "%s,rounds=%d" % (label, rounds)
+        client = new_client(q, rounds)
+        cases["zkp_generate[%s]" % rounds_label] = measure(client.generate_zero_know_proof_parameter_sets, repeat)
+        proof = client.generate_zero_know_proof_parameter_sets()
+        job = (int(client.N), int(client.g), q, int(client.C1), int(client.C2), True, 64, True,
+            [(i, client.b_list[i], proof["ZeroKnowledgeProofC1List"][i], proof["ZeroKnowledgeProofC2List"][i]) for i in range(rounds)])
+        if zero_knowledge_proof_verify_rounds(job):
+            raise Exception("零知識證明驗證失敗，效能測試的輸入錯誤。")
+        cases["zkp_verify[%s]" % rounds_label] = measure(lambda: zero_knowledge_proof_verify_rounds(job), repeat)
+    return cases
+
+def issuance_cases(rounds_list:list, repeat:int) ->dict:
+    """完整發行的案例，協定狀態存放在記憶體Redis"""
+    cases = dict()
+    with in_memory_redis() as redis_connection, ephemeral_ecdsa_keys() as Q:
+        for rounds in rounds_list:
+            signer_class = type("BenchmarkSigner", (PartiallyBlindSignatureServerInterface,), {"NumberOfZeroKnowledgeProofRound":rounds})
+            users = []
+            def issue_once():
+                token = "benchmark-" + uuid.uuid4().hex
+                redis_connection.set(token, json.dumps({"account":"benchmark"}), ex=300)
+                signer_timers = {step:Timer() for step in signer_class.STEPS}
+                users.append(issue(token, None, signer_timers, Timer(), signer_class)[0])
+                redis_connection.delete(token, ProtocolSession.KEY_PREFIX + token)
+            result = measure(issue_once, repeat)
+            result["invalid_signatures"] = sum(0 if user.verify_signature(Q.x, Q.y) else 1 for user in users)
+            cases["issuance[q=256,rounds=%d]" % rounds] = result
+    return cases
+
+def run(repeat:int = 20) ->dict:
+    key_sizes = parameter_list("BENCHMARK_KEY_SIZES", "256,512")
+    rounds_list = parameter_list("BENCHMARK_ROUNDS", "20,40")
+    result = {
+        "environment":environment(),
+        "parameters":{"key_sizes":key_sizes, "rounds":rounds_list, "repeat":repeat},
+        "cases":dict(),
+        "skipped":dict(),
+    }
+    for q_bits in key_sizes:
+        result["cases"].update(primitive_cases(q_bits, rounds_list, repeat))
+    try:
+        result["cases"].update(issuance_cases(rounds_list, repeat))
+    except ImportError as e:
+        result["skipped"]["issuance"] = "需要 fakeredis 與 lupa: %s" % e
+    return result
@@ -0,0 +1,47 @@
+"""登入Token快取的效能比較
+
+模擬多個已登入使用者重複請求需要登入的頁面，比較每次都查詢Redis與使用Token快取的耗時，
+並且回報快取命中率與省下的Redis往返次數。需要可以連線的Redis。
+"""
+import uuid
+from ..models.Login import Login
+from ..models.RedisConnection import RedisConnection
+from ..models.TokenCache import TokenCache
+from . import measure
+
+# 同時登入的使用者數量與每個使用者的請求數
+USERS = 100
+REQUESTS_PER_USER = 10
+
+def verify_all(login:Login, tokens:list):
+    for i in range(REQUESTS_PER_USER):
+        for token in tokens:
+            login.login_verify(token)
+
+def run(repeat:int = 20) ->dict:
+    redis_connection = RedisConnection.get(RedisConnection.TOKEN_INDEX)
+    tokens = [uuid.uuid4().hex for i in range(USERS)]
+    for token in tokens:
+        redis_connection.set(token, "{}", ex=300)
+    login = Login()
+    original_cache = TokenCache.shared_cache
+    try:
+        # 停用快取，每次都查詢Redis
+        TokenCache.shared_cache = TokenCache(ttl=0)
+        uncached = measure(lambda: verify_all(login, tokens), repeat)
+
+        TokenCache.shared_cache = TokenCache()
+        cached = measure(lambda: verify_all(login, tokens), repeat)
+        metrics = TokenCache.shared_cache.metrics()
+    finally:
+        TokenCache.shared_cache = original_cache
+        redis_connection.delete(*tokens)
+
+    return {
+        "users":USERS,
+        "requests_per_user":REQUESTS_PER_USER,
+        "uncached":uncached,
+        "cached":cached,
+        "speedup":uncached["mean"] / cached["mean"],
+        "cache_metrics":metrics,
+    }
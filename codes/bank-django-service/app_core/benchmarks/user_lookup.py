@@ -0,0 +1,78 @@
+"""使用者登入查詢的效能比較
+
+建立兩張暫時的使用者資料表，各自寫入 BENCHMARK_USERS 筆(預設1,000,000)使用者，比較:
+    before: 沒有索引的帳號，account__contains(LIKE '%帳號%')計數後，再以帳號與密碼雜湊計數，共兩次查詢。
+    after: 帳號有唯一索引，以帳號查詢一次取得密碼雜湊，在Python中比對。
+
+暫時的資料表在測試結束後刪除，不會影響 app_core_user。
+"""
+import hashlib
+import hmac
+import os
+import random
+from django.db import connection, models
+from . import measure
+
+USERS = int(os.environ.get('BENCHMARK_USERS', 1000000))
+BATCH_SIZE = 10000
+PASSWORD = "benchmark"
+
+class BenchmarkUserBefore(models.Model):
+    account = models.CharField(max_length=100)
+    password_hash = models.CharField(max_length=100)
+
+    class Meta:
+        app_label = 'app_core'
+        managed = False
+        db_table = 'benchmark_user_before'
+
+class BenchmarkUserAfter(models.Model):
+    account = models.CharField(max_length=100, unique=True)
+    password_hash = models.CharField(max_length=100)
+
+    class Meta:
+        app_label = 'app_core'
+        managed = False
+        db_table = 'benchmark_user_after'
+
+def fill(model, password_hash:str):
+    for start in range(0, USERS, BATCH_SIZE):
+        model.objects.bulk_create(
+            [model(account="benchmark-%08d" % i, password_hash=password_hash) for i in range(start, min(start + BATCH_SIZE, USERS))],
+            batch_size=BATCH_SIZE,
+        )
+
+def authenticate_before(account:str, password:str) ->bool:
+    if BenchmarkUserBefore.objects.filter(account__contains=account).count() != 1:
+        return False
+    password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
+    return BenchmarkUserBefore.objects.filter(account=account, password_hash=password_hash).count() == 1
+
+def authenticate_after(account:str, password:str) ->bool:
+    password_hash = BenchmarkUserAfter.objects.filter(account=account).values_list('password_hash', flat=True).first()
+    if password_hash is None:
+        return False
+    return hmac.compare_digest(password_hash, hashlib.sha256(password.encode('utf-8')).hexdigest())
+
+def run(repeat:int = 20) ->dict:
+    password_hash = hashlib.sha256(PASSWORD.encode('utf-8')).hexdigest()
+    accounts = ["benchmark-%08d" % random.randrange(USERS) for i in range(repeat)]
+    with connection.schema_editor() as schema_editor:
+        schema_editor.create_model(BenchmarkUserBefore)
+        schema_editor.create_model(BenchmarkUserAfter)
+    try:
+        fill(BenchmarkUserBefore, password_hash)
+        fill(BenchmarkUserAfter, password_hash)
+        result = dict()
+        for name, authenticate in (("before", authenticate_before), ("after", authenticate_after)):
+            accounts_iterator = iter(accounts * 2)
+            if not all(authenticate(account, PASSWORD) for account in accounts):
+                raise Exception("登入驗證結果錯誤。")
+            result[name] = measure(lambda: authenticate(next(accounts_iterator), PASSWORD), repeat)
+        result["users"] = USERS
+        result["speedup"] = result["before"]["mean"] / result["after"]["mean"]
+        return result
+    finally:
+        with connection.schema_editor() as schema_editor:
+            schema_editor.delete_model(BenchmarkUserBefore)
+            schema_editor.delete_model(BenchmarkUserAfter)
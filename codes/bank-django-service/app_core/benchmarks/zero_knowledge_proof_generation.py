@@ -0,0 +1,39 @@
+"""零知識證明生成的平行化效能比較
+
+比較使用者端 generate_zero_know_proof_parameter_sets 依序執行，以及使用 thread、process 執行器的耗時，
+並且以相同的亂數種子檢查平行與依序執行的結果相同。
+"""
+import os
+import random
+from ..models.PartiallyBlindSignatureClientInterface import PartiallyBlindSignatureClientInterface
+from ..models.ProtocolExecutor import ProtocolExecutor
+from . import measure
+
+# 模擬簽署者第一步驟的輸出
+SIGNER_STEP1 = '{"K1x": 55066263022277343669578718895168534326250603453777594175500187360389116729240, "K1y": 32670510020758816978083085130507043184471273380659243275938904335757337482424, "b_list": [0, 1, 0, 1, 1, 0, 0, 1, 0, 1, 1, 1, 0, 0, 1, 0, 1, 0, 0, 1]}'
+
+def new_client(executor:ProtocolExecutor = None) ->PartiallyBlindSignatureClientInterface:
+    client = PartiallyBlindSignatureClientInterface(executor = executor)
+    client.generate_message_hash("Message")
+    client.generate_I("Public")
+    client.step1_input(SIGNER_STEP1)
+    client.generate_keypairs_parameters()
+    return client
+
+def run(repeat:int = 20) ->dict:
+    client = new_client()
+    result = {"cpu_count":os.cpu_count(), "serial":measure(lambda: client.generate_zero_know_proof_parameter_sets(), repeat)}
+    for kind in ("thread", "process"):
+        executor = ProtocolExecutor(kind)
+        # 啟動子程序，不計入耗時
+        client.generate_zero_know_proof_parameter_sets(executor)
+        result[kind] = measure(lambda: client.generate_zero_know_proof_parameter_sets(executor), repeat)
+        result[kind + "_speedup"] = result["serial"]["mean"] / result[kind]["mean"]
+        # 相同亂數種子下，結果必須與依序執行相同
+        random.seed(repeat)
+        serial_output = client.generate_zero_know_proof_parameter_sets()
+        random.seed(repeat)
+        if client.generate_zero_know_proof_parameter_sets(executor) != serial_output:
+            raise Exception("平行生成的零知識證明參數與依序生成不同。")
+        executor.shutdown()
+    return result
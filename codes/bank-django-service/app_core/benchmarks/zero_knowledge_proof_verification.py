@@ -0,0 +1,64 @@
+"""零知識證明驗證的效能比較
+
+在簽署者端比較:
+    1. 逐回合驗證與批次驗證。
+    2. 依序與 process 執行器平行驗證。
+    3. 有一個錯誤回合時，early exit 與完整稽核模式的耗時(early exit 只縮短等待，其他子程序仍會算完)。
+直接使用 zero_knowledge_proof_verify_rounds，不需要Redis與ECDSA鑰匙。
+"""
+import json
+import os
+import random
+from ..models.PartiallyBlindSignatureClientInterface import PartiallyBlindSignatureClientInterface
+from ..models.PartiallyBlindSignatureServerInterface import zero_knowledge_proof_verify_rounds
+from ..models.ProtocolExecutor import ProtocolExecutor
+from . import measure
+
+def generate_proof(rounds:int = 20) ->tuple:
+    """模擬使用者第二步驟的輸出
+
+    Returns:
+        (b_list, input): tuple，簽署者的b_list與使用者的輸入。
+    """
+    b_list = [random.randrange(2) for i in range(rounds)]
+    client = PartiallyBlindSignatureClientInterface()
+    client.NumberOfZeroKnowledgeProofRound = rounds
+    client.generate_message_hash("Message")
+    client.generate_I("Public")
+    client.step1_input(json.dumps({
+        "K1x":55066263022277343669578718895168534326250603453777594175500187360389116729240,
+        "K1y":32670510020758816978083085130507043184471273380659243275938904335757337482424,
+        "b_list":b_list,
+    }))
+    client.generate_keypairs_parameters()
+    return b_list, json.loads(client.step1_output())
+
+def verify(b_list:list, input:dict, q:int, batch:bool, early_exit:bool, executor:ProtocolExecutor = None) ->list:
+    rounds = [(i, b_list[i], input["ZeroKnowledgeProofC1List"][i], input["ZeroKnowledgeProofC2List"][i]) for i in range(len(b_list))]
+    parameters = (input["N"], input["g"], q, input["C1"], input["C2"], batch, 64, early_exit)
+    if executor is None:
+        return zero_knowledge_proof_verify_rounds(parameters + (rounds,))
+    return executor.find_failures(zero_knowledge_proof_verify_rounds, [parameters + (chunk,) for chunk in executor.split(rounds)], early_exit)
+
+def run(repeat:int = 20) ->dict:
+    q = PartiallyBlindSignatureClientInterface().q
+    b_list, input = generate_proof()
+    # 第一回合錯誤的輸入
+    bad_input = json.loads(json.dumps(input))
+    bad_input["ZeroKnowledgeProofC1List"][0]["Cp"] += 1
+
+    executor = ProtocolExecutor("process")
+    verify(b_list, input, q, True, True, executor) # 啟動子程序，不計入耗時
+    result = {
+        "cpu_count":os.cpu_count(),
+        "workers":executor.max_workers,
+        "per_round":measure(lambda: verify(b_list, input, q, False, True), repeat),
+        "batch":measure(lambda: verify(b_list, input, q, True, True), repeat),
+        "batch_process":measure(lambda: verify(b_list, input, q, True, True, executor), repeat),
+        "bad_round_early_exit":measure(lambda: verify(b_list, bad_input, q, True, True, executor), repeat),
+        "bad_round_audit":measure(lambda: verify(b_list, bad_input, q, True, False, executor), repeat),
+    }
+    if verify(b_list, bad_input, q, True, False, executor) != [0]:
+        raise Exception("完整稽核模式沒有找到錯誤的回合。")
+    executor.shutdown()
+    return result
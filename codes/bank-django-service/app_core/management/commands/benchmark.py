@@ -0,0 +1,37 @@
+import importlib
+import json
+from django.core.management.base import BaseCommand, CommandError
+from app_core.benchmarks import BENCHMARKS, compare
+
+class Command(BaseCommand):
+    """執行效能測試
+
+    使用方法:
+        python manage.py benchmark paillier_fixed_base --repeat 20 --output result.json
+        python manage.py benchmark suite --output current.json --compare baseline.json
+
+    有 --compare 時輸出與基準的比較，有任何耗時超過 threshold 時以錯誤結束。
+    """
+    help = "執行效能測試，並且輸出JSON格式的結果。"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(BENCHMARKS.keys()), help="效能測試名稱")
+        parser.add_argument("--repeat", type=int, default=20, help="重複次數")
+        parser.add_argument("--output", default=None, help="將結果寫入JSON檔案")
+        parser.add_argument("--compare", default=None, help="比較的基準JSON檔案")
+        parser.add_argument("--threshold", type=float, default=0.1, help="耗時增加超過這個比例時視為變慢")
+
+    def handle(self, *args, **options):
+        module = importlib.import_module(BENCHMARKS[options["name"]])
+        result = module.run(repeat=options["repeat"])
+        text = json.dumps(result, indent=4, ensure_ascii=False)
+        self.stdout.write(text)
+        if options["output"] is not None:
+            with open(options["output"], "w", encoding="utf-8") as output_file:
+                output_file.write(text)
+        if options["compare"] is not None:
+            with open(options["compare"], encoding="utf-8") as baseline_file:
+                comparison = compare(json.load(baseline_file), result, options["threshold"])
+            self.stdout.write(json.dumps(comparison, indent=4, ensure_ascii=False))
+            if comparison["regressions"]:
+                raise CommandError("效能變慢: %s" % ", ".join(comparison["regressions"]))
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from app_core.models.SpentCoinRegistry import SpentCoinRegistry
+
+class Command(BaseCommand):
+    """由資料庫重建已使用貨幣的布隆過濾器
+
+    使用方法:
+        python manage.py rebuild_spent_coin_filter
+        python manage.py rebuild_spent_coin_filter --if-missing
+    """
+    help = "由 SpentCoin 資料表重建Redis中已使用貨幣的布隆過濾器。"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--if-missing", action="store_true", help="過濾器已經存在時不重建")
+        parser.add_argument("--batch-size", type=int, default=SpentCoinRegistry.REBUILD_BATCH_SIZE, help="每次查詢的貨幣數量")
+
+    def handle(self, *args, **options):
+        registry = SpentCoinRegistry()
+        if options["if_missing"] and registry.ready():
+            self.stdout.write("布隆過濾器已經存在: %s" % registry.key)
+            return
+        start_time = time.perf_counter()
+        def progress(count):
+            if count % 1000000 < options["batch_size"]:
+                self.stdout.write("已處理 %d 個貨幣" % count)
+        count = registry.rebuild(options["batch_size"], progress)
+        self.stdout.write("重建完成: %s，%d 個貨幣，%d 位元，%d 個雜湊，耗時 %.2f 秒" % (
+            registry.key, count, registry.bits, registry.hashes, time.perf_counter() - start_time))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from app_core.models.RequestProfiler import RequestProfiler
+
+class Command(BaseCommand):
+    """產生分析指定路徑的 X-Profile 標頭，需要與伺服器相同的 PROFILING_SECRET
+
+    使用方法:
+        python manage.py sign_profile_request /api/blind_signature
+        curl -H "X-Profile: (輸出的值)" ...
+    """
+    help = "產生效能分析的 X-Profile 簽章標頭。"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="要分析的請求路徑，例如 /api/login")
+
+    def handle(self, *args, **options):
+        try:
+            value = RequestProfiler.sign(options["path"])
+        except Exception as e:
+            raise CommandError(str(e))
+        self.stdout.write("%s: %s" % (RequestProfiler.HEADER, value))
+        self.stdout.write("有效 %d 秒，結果存放在 %s" % (RequestProfiler.max_age, RequestProfiler.file_path(RequestProfiler.route(options["path"]), "(請求編號)")))
@@ -1,5 +1,7 @@
+import asyncio
 from django.shortcuts import redirect
 from app_core.models.Login import Login
+from app_core.models.TokenCache import TokenCache
 from app_core.urls import none_login_pages
 from django.http import HttpResponse
 import json
@@ -10,8 +12,15 @@ class LoginMiddleware:
     請將不需要登入的頁面，
     撰寫到下方self.none_login_pages中。
     """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        # 在ASGI下 get_response 為協程函數，中間層也以協程處理請求
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
         self.login = Login()
         
         # 把不用登入的頁面與API寫到這裡
@@ -29,16 +38,43 @@ class LoginMiddleware:
         else:   
             return False
 
-    def __call__(self, request):
-        verify_login_result =self.login.check_login_from_request(request)
-        if not self.check_prefix_in_list(request.path) :
-            if not verify_login_result and not self.is_api(request.path):
+    # 是否需要驗證Token，不需要登入的頁面只有登入頁面需要驗證(已經登入時跳轉到首頁)
+    def need_verify(self,path:str):
+        if not self.check_prefix_in_list(path):
+            return True
+        return not self.is_api(path) and path.startswith("/login")
+
+    # 依照驗證結果決定回應，回傳None時繼續處理請求
+    def verify_response(self,path:str,verify_login_result:bool):
+        if not self.check_prefix_in_list(path) :
+            if not verify_login_result and not self.is_api(path):
                 return redirect("/login")
-            elif not verify_login_result and self.is_api(request.path):
+            elif not verify_login_result and self.is_api(path):
                 result = {"code":0,"message":"Required login token"}
                 return HttpResponse(json.dumps(result))
-        else:
-            if verify_login_result and not self.is_api(request.path) and request.path.startswith("/login"):
-                return redirect("/")
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        elif verify_login_result:
+            # 已經登入時從登入頁面跳轉到首頁
+            return redirect("/")
+        return None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.need_verify(request.path):
+            # 其他不需要登入的頁面與API不需要驗證Token
+            TokenCache.shared().record_skip()
+            return self.get_response(request)
+        response = self.verify_response(request.path, self.login.check_login_from_request(request))
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    # ASGI 的非同步處理，以非同步Redis客戶端驗證Token
+    async def __acall__(self, request):
+        if not self.need_verify(request.path):
+            TokenCache.shared().record_skip()
+            return await self.get_response(request)
+        response = self.verify_response(request.path, await self.login.acheck_login_from_request(request))
+        if response is None:
+            response = await self.get_response(request)
+        return response
@@ -0,0 +1,53 @@
+import asyncio
+from django.core.exceptions import MiddlewareNotUsed
+from app_core.models.RequestProfiler import RequestProfiler
+
+class ProfilingMiddleware:
+    """效能分析中間層
+    依照 PROFILING_SAMPLE_EVERY 每N個請求分析一個，
+    或者分析帶有正確簽章 X-Profile 標頭的請求，
+    結果依照請求對應的路由存放在 PROFILING_DIR 之下(見 RequestProfiler)，
+    回應的 X-Profile-Id 標頭為結果的請求編號。
+    兩者都未設定時不載入，不影響請求。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not RequestProfiler.enabled():
+            raise MiddlewareNotUsed("未設定 PROFILING_SAMPLE_EVERY 或 PROFILING_SECRET")
+        self.get_response = get_response
+        # 在ASGI下 get_response 為協程函數，中間層也以協程處理請求
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    # 需要分析時開始分析，回傳None時不分析
+    def start(self, request):
+        if not RequestProfiler.should_profile(request.path, request.headers.get(RequestProfiler.HEADER)):
+            return None
+        return RequestProfiler.start(RequestProfiler.route(request.path_info), RequestProfiler.request_id(request.headers.get(RequestProfiler.REQUEST_ID_HEADER)))
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = self.start(request)
+        if profile is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            RequestProfiler.stop(profile)
+        response[RequestProfiler.PROFILE_ID_HEADER] = profile.request_id
+        return response
+
+    async def __acall__(self, request):
+        profile = self.start(request)
+        if profile is None:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            RequestProfiler.stop(profile)
+        response[RequestProfiler.PROFILE_ID_HEADER] = profile.request_id
+        return response
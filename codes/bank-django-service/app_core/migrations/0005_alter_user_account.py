@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0004_schemaversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='account',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.16 on 2026-10-18 14:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0005_alter_user_account'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transfer_id', models.CharField(db_index=True, max_length=32)),
+                ('user_id', models.IntegerField()),
+                ('amount', models.IntegerField()),
+                ('balance', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='currency',
+            name='user_id',
+            field=models.IntegerField(unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['user_id', 'created_at'], name='app_core_le_user_id_e73b54_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['created_at'], name='app_core_le_created_e74c03_idx'),
+        ),
+    ]
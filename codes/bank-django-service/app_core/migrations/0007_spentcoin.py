@@ -0,0 +1,21 @@
+# Generated by Django 3.2.16 on 2026-10-18 14:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0006_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpentCoin',
+            fields=[
+                ('coin_hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('spent_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_core', '0007_spentcoin'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='currency',
+            name='balance',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='amount',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='balance',
+            field=models.BigIntegerField(),
+        ),
+    ]
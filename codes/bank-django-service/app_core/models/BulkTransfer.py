@@ -0,0 +1,139 @@
+import hmac
+import json
+import os
+from django.db import DatabaseError
+from .Ledger import Ledger
+
+class BulkTransfer:
+    """批次轉帳
+
+    結算工作一次送出大量轉帳，請求內容為 NDJSON，每一行為一筆轉帳:
+        {"sender":轉出的使用者ID, "receiver":轉入的使用者ID, "amount":金額}
+    回應也是 NDJSON，依照請求的順序每筆轉帳一行，index 為第幾筆(從0開始，略過空行):
+        {"index":0, "code":1, "transfer_id":轉帳ID}
+        {"index":1, "code":0, "message":錯誤訊息}
+
+    請求逐行讀取，每 chunk_size 筆在記憶體中檢查後，以一個資料庫交易寫入(Ledger.apply_transfers)。
+    API 的回應在執行緒中組合完成後才送出(Django 3.2 的ASGI只能在事件迴圈中同步迭代串流回應，
+    不能在其中存取資料庫)，所以每個請求的轉帳筆數有上限，超過時不處理任何一筆。
+
+    部分失敗的處理:
+        1. 每一筆轉帳各自成功或失敗，格式錯誤、帳戶不存在、餘額不足只影響該筆。
+        2. 依照順序處理，後面的轉帳可以使用前面轉入的餘額。
+        3. 同一段(chunk_size 筆)在同一個交易中寫入，資料庫錯誤(重試後)時該段全部失敗且沒有寫入，
+           之前的段已經提交不會復原，之後的段繼續處理。
+        4. 重新送出時會重複轉帳，請只重送失敗的轉帳。
+
+    設定可以由環境變數指定:
+        SETTLEMENT_KEY: 結算金鑰，請求的 X-Settlement-Key 標頭必須相同，未設定時停用批次轉帳。
+        BULK_TRANSFER_CHUNK_SIZE: 每個資料庫交易的轉帳筆數，預設1000。
+        BULK_TRANSFER_MAX_TRANSFERS: 每個請求最多的轉帳筆數，預設100000，0時不限制。
+    """
+    CONTENT_TYPE = "application/x-ndjson"
+
+    def __init__(self, chunk_size:int = None, max_transfers:int = None):
+        if chunk_size is None:
+            chunk_size = int(os.environ.get('BULK_TRANSFER_CHUNK_SIZE', 1000))
+        if chunk_size < 1:
+            raise Exception("每段的轉帳筆數必須大於0。")
+        if max_transfers is None:
+            max_transfers = int(os.environ.get('BULK_TRANSFER_MAX_TRANSFERS', 100000))
+        self.chunk_size = chunk_size
+        self.max_transfers = max_transfers
+        self.succeeded = 0
+        self.failed = 0
+
+    @classmethod
+    def check_key(cls, key:str) ->bool:
+        """檢查結算金鑰，未設定 SETTLEMENT_KEY 時一律失敗"""
+        settlement_key = os.environ.get('SETTLEMENT_KEY')
+        if not settlement_key or key is None:
+            return False
+        return hmac.compare_digest(settlement_key.encode('utf-8'), key.encode('utf-8'))
+
+    @classmethod
+    def parse(cls, line:bytes) ->tuple:
+        """解析一行轉帳
+
+        Returns:
+            (sender_id, receiver_id, amount)，金額在 Ledger.validate 中檢查。
+
+        Raises:
+            Exception: 格式錯誤。
+        """
+        try:
+            data = json.loads(line)
+            transfer = (data["sender"], data["receiver"], data["amount"])
+        except (ValueError, TypeError, KeyError):
+            raise Exception("格式錯誤。")
+        for user_id in transfer[:2]:
+            if not isinstance(user_id, int) or isinstance(user_id, bool):
+                raise Exception("使用者ID必須為整數。")
+        return transfer
+
+    def read(self, lines) ->list:
+        """讀取全部的非空行，超過 max_transfers 筆時拋出錯誤
+
+        Raises:
+            Exception: 轉帳筆數超過上限。
+        """
+        result = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if len(result) >= self.max_transfers:
+                raise Exception("每次批次轉帳最多%d筆，這次的轉帳都沒有處理。" % self.max_transfers)
+            result.append(line)
+        return result
+
+    def process(self, lines):
+        """處理批次轉帳
+
+        有筆數上限時先讀取全部的行，超過上限時在寫入任何一筆之前拋出錯誤。
+
+        Args:
+            lines: 可以逐行讀取的請求內容，例如 HttpRequest 或者 bytes 的 list。
+
+        Returns:
+            iterator，每筆轉帳結果的一行 NDJSON(bytes)。
+
+        Raises:
+            Exception: 轉帳筆數超過上限(第一次迭代時)。
+        """
+        if self.max_transfers > 0:
+            lines = self.read(lines)
+        chunk = []
+        index = 0
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                chunk.append(self.parse(line))
+            except Exception as e:
+                chunk.append(e)
+            if len(chunk) >= self.chunk_size:
+                yield from self.apply(chunk, index)
+                index += len(chunk)
+                chunk = []
+        if chunk:
+            yield from self.apply(chunk, index)
+
+    def apply(self, chunk:list, start_index:int):
+        transfers = [item for item in chunk if not isinstance(item, Exception)]
+        try:
+            results = iter(Ledger.apply_transfers(transfers))
+        except DatabaseError as e:
+            message = "資料庫錯誤，這一段沒有寫入: %s" % e
+            results = iter([{"code":0, "message":message}] * len(transfers))
+        for offset, item in enumerate(chunk):
+            if isinstance(item, Exception):
+                result = {"code":0, "message":str(item)}
+            else:
+                result = next(results)
+            if result["code"] == 1:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            yield json.dumps(dict(index=start_index + offset, **result)).encode('utf-8') + b"\n"
@@ -6,5 +6,7 @@ class Currency(models.Model):
     尚未完成
     撰寫: 蕭維均
     """
-    user_id = models.IntegerField()
-    balance = models.IntegerField()
\ No newline at end of file
+    # 每個使用者一筆餘額，轉帳時以唯一索引鎖定該列(沒有索引時 SELECT ... FOR UPDATE 會鎖定掃描到的所有列)
+    user_id = models.IntegerField(unique=True)
+    # 64位元整數，與帳本分錄的餘額相同
+    balance = models.BigIntegerField()
@@ -0,0 +1,97 @@
+import threading
+import time
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from .Instrumentation import Instrumentation
+
+class DatabaseConnection:
+    """資料庫連線的健康檢查與統計
+
+    持續連線(CONN_MAX_AGE > 0)時，連線可能已經被資料庫或網路中斷，
+    Django 4.1 以 CONN_HEALTH_CHECKS 在每個請求第一次使用連線時檢查，Django 3.2 沒有這個設定，
+    所以在 request_started 時將 DATABASES 中設定 CONN_HEALTH_CHECKS 的連線標記為需要檢查，
+    與 Django 4.1 相同，在請求中第一次建立 cursor(_cursor)時才檢查，無法使用時關閉並且重新建立連線，
+    不會在請求中途才發現連線中斷，不使用資料庫的請求(盲簽章、檢查登入、指標)也不會多一次往返。
+    不包裝 ensure_connection，因為 request_finished 的 close_old_connections 會經由 get_autocommit 呼叫它。
+    在交易中的連線無法更換，不檢查。
+
+    建立連線時加入 execute_wrapper，以 Instrumentation 記錄每個查詢的耗時，
+    並且以 health_check 包裝該連線物件的 _cursor。
+
+    在 AppCoreConfig.ready 中呼叫 connect_signals 啟用。
+    """
+    lock = threading.Lock()
+    created = 0
+    health_checks = 0
+    health_check_failures = 0
+
+    @classmethod
+    def connect_signals(cls):
+        # 在 close_old_connections(關閉超過 CONN_MAX_AGE 的連線)之後執行
+        request_started.connect(cls.request_health_check, dispatch_uid="app_core.DatabaseConnection.health_check")
+        connection_created.connect(cls.on_connection_created, dispatch_uid="app_core.DatabaseConnection.created")
+
+    @classmethod
+    def request_health_check(cls, **kwargs):
+        """請求開始時將重複使用的連線標記為需要檢查，第一次使用時才檢查"""
+        for connection in connections.all():
+            if connection.connection is not None and connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+                connection.health_check_needed = True
+
+    @classmethod
+    def health_check(cls, connection):
+        """檢查標記過的連線是否可以使用，無法使用時關閉"""
+        if not getattr(connection, 'health_check_needed', False):
+            return
+        connection.health_check_needed = False
+        if connection.connection is None or connection.in_atomic_block:
+            return
+        usable = connection.is_usable()
+        with cls.lock:
+            cls.health_checks += 1
+            cls.health_check_failures += 0 if usable else 1
+        if not usable:
+            connection.close()
+
+    @classmethod
+    def on_connection_created(cls, sender, connection, **kwargs):
+        with cls.lock:
+            cls.created += 1
+        # execute_wrappers 與 _cursor 屬於 Django 的連線物件，重新連線後仍然存在，不重複加入
+        if cls.execute_wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(cls.execute_wrapper)
+        if not getattr(connection, 'health_check_installed', False):
+            connection.health_check_installed = True
+            cursor = connection._cursor
+            def checked_cursor(*args, **kwargs):
+                cls.health_check(connection)
+                return cursor(*args, **kwargs)
+            connection._cursor = checked_cursor
+
+    @classmethod
+    def execute_wrapper(cls, execute, sql, params, many, context):
+        """記錄查詢的耗時，以SQL的第一個關鍵字(SELECT、INSERT等)分類"""
+        if not Instrumentation.sampled():
+            return execute(sql, params, many, context)
+        start_time = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            operation = sql.split(None, 1)[0].upper() if sql else ""
+            Instrumentation.observe("cbdc_database_query_seconds", time.perf_counter() - start_time, operation=operation, vendor=context["connection"].vendor)
+
+    @classmethod
+    def metrics(cls) ->dict:
+        """連線的統計數據
+
+        Returns:
+            dict，created 為建立連線的次數，health_checks 為請求中第一次使用重複使用的連線時檢查的次數，
+            health_check_failures 為檢查後發現無法使用而關閉的次數。
+        """
+        with cls.lock:
+            return {
+                "created":cls.created,
+                "health_checks":cls.health_checks,
+                "health_check_failures":cls.health_check_failures,
+            }
@@ -0,0 +1,280 @@
+import asyncio
+import bisect
+import functools
+import glob
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+class Histogram:
+    """累計每個區間的次數、總和與次數，對應 Prometheus 的 histogram
+
+    Attributes:
+        buckets: tuple，區間的上限(秒)，由小到大。
+        counts: list，落在每個區間的次數，最後一個為超過所有上限(+Inf)的次數。
+    """
+    def __init__(self, buckets:tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value:float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Timer:
+    """計時的 context manager，沒有被取樣時不計時"""
+    __slots__ = ("name", "labels", "start_time")
+
+    def __init__(self, name:str, labels:dict):
+        self.name = name
+        self.labels = labels
+        self.start_time = None
+
+    def __enter__(self):
+        if Instrumentation.sampled():
+            self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.start_time is not None:
+            Instrumentation.observe(self.name, time.perf_counter() - self.start_time, **self.labels)
+        return False
+
+class Instrumentation:
+    """熱點路徑的耗時統計
+
+    以 timed(裝飾器)或 timer(context manager)記錄耗時的直方圖，
+    由 /api/metrics 以 Prometheus 的文字格式輸出。
+    統計先記錄在目前的程序中，gunicorn 的每個 worker 與 ProtocolExecutor 的子程序各自統計，
+    每次抓取只會連到其中一個 worker，所以設定 METRICS_DIR 時每個程序定期將自己的統計寫入該目錄的
+    程序編號-隨機值.json(整份取代)，render 合併目錄中所有程序的檔案，任一 worker 回應的都是全部程序的總和。
+    結束的程序的檔案保留，累計的次數不會減少，目錄由 init.py 在啟動時清空。
+    子程序的統計最多延遲 METRICS_FLUSH_INTERVAL 秒，處理抓取的 worker 在輸出前先寫入自己的統計。
+    未設定 METRICS_DIR 時(runserver、測試)只輸出目前程序的統計。
+
+    設定可以由環境變數指定:
+        METRICS_SAMPLE_RATE: 取樣比例，0 ~ 1，預設1(每次呼叫都記錄)，
+                             0時停止記錄，被裝飾的函數只多一次比較就直接呼叫原本的函數。
+                             小於1時直方圖的次數為取樣的次數，實際次數約為 次數 / 取樣比例。
+        METRICS_DIR: 合併多個程序統計的目錄，預設不合併。
+        METRICS_FLUSH_INTERVAL: 每個程序寫入統計的間隔(秒)，預設5。
+
+    使用方法:
+        @Instrumentation.timed("cbdc_yi_seconds", operation="encrypt")
+        def encrypt(...): ...
+
+        with Instrumentation.timer("cbdc_redis_command_seconds", command="GET"):
+            ...
+    """
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    # 區間的上限(秒)，從0.1毫秒的Redis指令到數秒的鑰匙生成
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    DESCRIPTIONS = {
+        "cbdc_yi_seconds":"Yi同態加密的運算耗時(秒)",
+        "cbdc_zero_knowledge_proof_verify_seconds":"簽署者驗證零知識證明的耗時(秒)",
+        "cbdc_blind_signature_step_seconds":"部分盲簽章每個步驟處理方法的耗時(秒)",
+        "cbdc_login_seconds":"Login 方法的耗時(秒)",
+        "cbdc_redis_command_seconds":"Redis 指令的耗時(秒)",
+        "cbdc_database_query_seconds":"資料庫查詢的耗時(秒)",
+    }
+
+    sample_rate = float(os.environ.get('METRICS_SAMPLE_RATE', 1))
+    directory = os.environ.get('METRICS_DIR') or None
+    flush_interval = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+    # {(名稱, ((標籤, 值), ...)): Histogram}
+    histograms = dict()
+    lock = threading.Lock()
+    # fork 之後的子程序重新統計，不重複計算父程序的統計
+    pid = os.getpid()
+    # 上次寫入後是否有新的統計
+    dirty = False
+    flusher = None
+    flush_lock = threading.Lock()
+    snapshot_file = None
+
+    @classmethod
+    def sampled(cls) ->bool:
+        """這次呼叫是否記錄"""
+        sample_rate = cls.sample_rate
+        if sample_rate <= 0:
+            return False
+        return sample_rate >= 1 or random.random() < sample_rate
+
+    @classmethod
+    def key(cls, name:str, labels:dict) ->tuple:
+        return (name, tuple(sorted(labels.items())))
+
+    @classmethod
+    def observe(cls, name:str, seconds:float, **labels):
+        """記錄一次耗時，不檢查取樣"""
+        cls.observe_key(cls.key(name, labels), seconds)
+
+    @classmethod
+    def observe_key(cls, key:tuple, seconds:float):
+        if cls.pid != os.getpid():
+            cls.after_fork()
+        with cls.lock:
+            histogram = cls.histograms.get(key)
+            if histogram is None:
+                histogram = cls.histograms[key] = Histogram(cls.BUCKETS)
+            histogram.observe(seconds)
+            cls.dirty = True
+            if cls.directory and cls.flusher is None:
+                cls.flusher = threading.Thread(target=cls.flush_loop, name="Instrumentation", daemon=True)
+                cls.flusher.start()
+
+    @classmethod
+    def after_fork(cls):
+        """fork 之後的子程序(ProtocolExecutor、gunicorn worker)捨棄父程序的統計與鎖，重新統計"""
+        cls.lock = threading.Lock()
+        cls.flush_lock = threading.Lock()
+        cls.histograms = dict()
+        cls.dirty = False
+        cls.flusher = None
+        cls.snapshot_file = None
+        cls.pid = os.getpid()
+
+    @classmethod
+    def timer(cls, name:str, **labels) ->Timer:
+        """計時的 context manager"""
+        return Timer(name, labels)
+
+    @classmethod
+    def timed(cls, name:str, **labels):
+        """計時的裝飾器，可以裝飾一般函數與協程函數
+
+        標籤在裝飾時就決定，停止記錄時只比較一次取樣比例，不呼叫其他函數。
+        """
+        key = cls.key(name, labels)
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    sample_rate = cls.sample_rate
+                    if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+                        return await func(*args, **kwargs)
+                    start_time = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        cls.observe_key(key, time.perf_counter() - start_time)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                sample_rate = cls.sample_rate
+                if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+                    return func(*args, **kwargs)
+                start_time = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    cls.observe_key(key, time.perf_counter() - start_time)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def reset(cls):
+        """清除目前程序的統計"""
+        with cls.lock:
+            cls.histograms.clear()
+            cls.dirty = True
+
+    @classmethod
+    def snapshot(cls) ->list:
+        """目前程序的統計，每個元素為 (名稱, 標籤, 每個區間的次數, 總和, 次數)"""
+        with cls.lock:
+            return [(name, labels, list(histogram.counts), histogram.sum, histogram.count) for (name, labels), histogram in cls.histograms.items()]
+
+    @classmethod
+    def flush(cls):
+        """將目前程序的統計寫入 METRICS_DIR，沒有新的統計時不寫入"""
+        if not cls.directory:
+            return
+        if cls.pid != os.getpid():
+            cls.after_fork()
+        with cls.flush_lock:
+            with cls.lock:
+                if not cls.dirty:
+                    return
+                cls.dirty = False
+            snapshot = cls.snapshot()
+            if cls.snapshot_file is None:
+                cls.snapshot_file = os.path.join(cls.directory, "%d-%s.json" % (cls.pid, uuid.uuid4().hex[:8]))
+            temporary_file = cls.snapshot_file + ".tmp"
+            try:
+                os.makedirs(cls.directory, exist_ok=True)
+                with open(temporary_file, "w", encoding="utf-8") as output_file:
+                    json.dump(snapshot, output_file)
+                # 整份取代，render 不會讀到寫到一半的檔案
+                os.replace(temporary_file, cls.snapshot_file)
+            except OSError as e:
+                cls.dirty = True
+                print("[耗時統計] 無法寫入 %s: %s" % (cls.snapshot_file, e), file=sys.stderr, flush=True)
+
+    @classmethod
+    def flush_loop(cls):
+        """定期寫入統計的執行緒"""
+        while True:
+            time.sleep(cls.flush_interval)
+            cls.flush()
+
+    @classmethod
+    def collect(cls) ->list:
+        """合併 METRICS_DIR 中所有程序的統計，未設定時為目前程序的統計"""
+        if not cls.directory:
+            return cls.snapshot()
+        cls.flush()
+        merged = dict()
+        for path in glob.glob(os.path.join(cls.directory, "*.json")):
+            try:
+                with open(path, encoding="utf-8") as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            except (OSError, ValueError):
+                continue
+            for name, labels, counts, total, count in snapshot:
+                # JSON 沒有 tuple，標籤的值在輸出時都會轉成字串
+                key = (name, tuple((label, str(value)) for label, value in labels))
+                if key not in merged:
+                    merged[key] = [[0] * len(counts), 0.0, 0]
+                histogram = merged[key]
+                histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+                histogram[1] += total
+                histogram[2] += count
+        return [(name, labels, counts, total, count) for (name, labels), (counts, total, count) in merged.items()]
+
+    @classmethod
+    def format_labels(cls, labels:tuple) ->str:
+        return ",".join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in labels)
+
+    @classmethod
+    def render(cls) ->str:
+        """以 Prometheus 的文字格式輸出所有直方圖，設定 METRICS_DIR 時為所有程序的總和"""
+        snapshot = cls.collect()
+        lines = [
+            "# HELP cbdc_metrics_sample_rate 耗時統計的取樣比例",
+            "# TYPE cbdc_metrics_sample_rate gauge",
+            "cbdc_metrics_sample_rate %s" % repr(float(cls.sample_rate)),
+        ]
+        current_name = None
+        for name, labels, counts, total, count in sorted(snapshot, key=lambda item: (item[0], str(item[1]))):
+            if name != current_name:
+                current_name = name
+                if name in cls.DESCRIPTIONS:
+                    lines.append("# HELP %s %s" % (name, cls.DESCRIPTIONS[name]))
+                lines.append("# TYPE %s histogram" % name)
+            cumulative = 0
+            for bucket, bucket_count in zip(cls.BUCKETS + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = bucket if isinstance(bucket, str) else "%g" % bucket
+                lines.append("%s_bucket{%s} %d" % (name, cls.format_labels(labels + (("le", le),)), cumulative))
+            lines.append("%s_sum{%s} %s" % (name, cls.format_labels(labels), repr(total)))
+            lines.append("%s_count{%s} %d" % (name, cls.format_labels(labels), count))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,188 @@
+import random
+import time
+import uuid
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+from .Currency import Currency
+from .LedgerEntry import LedgerEntry
+
+class Ledger:
+    """帳本
+
+    轉帳在同一個資料庫交易中鎖定雙方的餘額、更新餘額並且寫入帳本分錄(LedgerEntry)，
+    同時進行的轉帳不會遺失更新，失敗時不會留下部分的結果。
+
+    鎖定順序固定為 user_id 由小到大，A轉給B與B轉給A同時進行時，
+    兩者都先鎖定較小的 user_id，後到的交易只會等待，不會各自持有一列而互相等待(死結)。
+    等待鎖定逾時或者資料庫仍然判定死結時(OperationalError)，以隨機的退避時間重試 RETRIES 次，
+    在呼叫者的交易中轉帳時不重試，由呼叫者處理。
+    """
+    RETRIES = 3
+    # 第一次重試前最長的等待秒數，每次加倍
+    RETRY_DELAY = 0.01
+    # bulk_update 與 bulk_create 每個查詢的筆數
+    BATCH_SIZE = 1000
+    # 金額與餘額的上限，BigIntegerField 的最大值
+    MAX_BALANCE = 2**63 - 1
+
+    @classmethod
+    def validate(cls, sender_id:int, receiver_id:int, amount:int):
+        """檢查轉帳參數
+
+        Raises:
+            Exception: 金額不是正整數或超過上限，或者轉出與轉入為同一個使用者。
+        """
+        if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+            raise Exception("轉帳金額必須為正整數。")
+        if amount > cls.MAX_BALANCE:
+            raise Exception("轉帳金額超過上限。")
+        if sender_id == receiver_id:
+            raise Exception("不能轉帳給自己。")
+
+    @classmethod
+    def transfer(cls, sender_id:int, receiver_id:int, amount:int) ->str:
+        """轉帳
+
+        Args:
+            sender_id: int，轉出的使用者ID。
+            receiver_id: int，轉入的使用者ID。
+            amount: int，金額。
+
+        Returns:
+            str，轉帳ID，對應兩筆帳本分錄的 transfer_id。
+
+        Raises:
+            Exception: 參數錯誤、帳戶不存在、餘額不足或者轉入後的餘額超過上限。
+            OperationalError: 重試後仍然無法取得鎖定。
+        """
+        cls.validate(sender_id, receiver_id, amount)
+        return cls.retry(cls.apply_transfer, sender_id, receiver_id, amount)
+
+    @classmethod
+    def retry(cls, func, *args):
+        """執行資料庫交易，OperationalError 時以隨機的退避時間重試"""
+        for attempt in range(cls.RETRIES + 1):
+            try:
+                return func(*args)
+            except OperationalError:
+                if attempt == cls.RETRIES or connection.in_atomic_block:
+                    raise
+                time.sleep(random.uniform(0, cls.RETRY_DELAY * 2 ** attempt))
+
+    @classmethod
+    def apply_transfer(cls, sender_id:int, receiver_id:int, amount:int) ->str:
+        """在一個資料庫交易中鎖定餘額、更新餘額並且寫入帳本分錄，參數與回傳值同 transfer"""
+        transfer_id = uuid.uuid4().hex
+        with transaction.atomic():
+            accounts = {currency.user_id:currency for currency in Currency.objects.select_for_update()
+                .filter(user_id__in=(sender_id, receiver_id)).order_by('user_id')}
+            if sender_id not in accounts or receiver_id not in accounts:
+                raise Exception("帳戶不存在。")
+            sender = accounts[sender_id]
+            receiver = accounts[receiver_id]
+            if sender.balance < amount:
+                raise Exception("餘額不足。")
+            if receiver.balance > cls.MAX_BALANCE - amount:
+                raise Exception("轉入後的餘額超過上限。")
+            # 一次更新兩列，以 F() 在資料庫中計算
+            Currency.objects.filter(pk__in=(sender.pk, receiver.pk)).update(balance=Case(
+                When(pk=sender.pk, then=F('balance') - amount),
+                When(pk=receiver.pk, then=F('balance') + amount),
+            ))
+            created_at = timezone.now()
+            LedgerEntry.objects.bulk_create([
+                LedgerEntry(transfer_id=transfer_id, user_id=sender_id, amount=-amount, balance=sender.balance - amount, created_at=created_at),
+                LedgerEntry(transfer_id=transfer_id, user_id=receiver_id, amount=amount, balance=receiver.balance + amount, created_at=created_at),
+            ])
+        return transfer_id
+
+    @classmethod
+    def apply_transfers(cls, transfers:list) ->list:
+        """在一個資料庫交易中依序處理多筆轉帳
+
+        一次鎖定所有相關的餘額(依照 user_id 順序)，在記憶體中依序檢查與計算，
+        最後以 bulk_update 與 bulk_create 寫入，每一批只需要固定次數的查詢。
+        每一筆轉帳各自成功或失敗，後面的轉帳可以使用前面轉入的餘額。
+
+        Args:
+            transfers: list，(sender_id, receiver_id, amount)。
+
+        Returns:
+            list，與 transfers 順序相同的結果，
+            成功為 {"code":1, "transfer_id":轉帳ID}，失敗為 {"code":0, "message":錯誤訊息}。
+
+        Raises:
+            OperationalError: 重試後仍然無法取得鎖定，整批都沒有寫入。
+        """
+        results = [None] * len(transfers)
+        valid = []
+        for index, (sender_id, receiver_id, amount) in enumerate(transfers):
+            try:
+                cls.validate(sender_id, receiver_id, amount)
+                valid.append(index)
+            except Exception as e:
+                results[index] = {"code":0, "message":str(e)}
+        if not valid:
+            return results
+        user_ids = sorted({user_id for index in valid for user_id in transfers[index][:2]})
+
+        def apply():
+            applied = list(results)
+            with transaction.atomic():
+                accounts = {currency.user_id:currency for currency in Currency.objects.select_for_update()
+                    .filter(user_id__in=user_ids).order_by('user_id')}
+                changed = dict()
+                entries = []
+                created_at = timezone.now()
+                for index in valid:
+                    sender_id, receiver_id, amount = transfers[index]
+                    if sender_id not in accounts or receiver_id not in accounts:
+                        applied[index] = {"code":0, "message":"帳戶不存在。"}
+                        continue
+                    sender = accounts[sender_id]
+                    receiver = accounts[receiver_id]
+                    if sender.balance < amount:
+                        applied[index] = {"code":0, "message":"餘額不足。"}
+                        continue
+                    if receiver.balance > cls.MAX_BALANCE - amount:
+                        applied[index] = {"code":0, "message":"轉入後的餘額超過上限。"}
+                        continue
+                    # 已經鎖定，直接寫入計算後的餘額
+                    sender.balance -= amount
+                    receiver.balance += amount
+                    changed[sender_id] = sender
+                    changed[receiver_id] = receiver
+                    transfer_id = uuid.uuid4().hex
+                    entries.append(LedgerEntry(transfer_id=transfer_id, user_id=sender_id, amount=-amount, balance=sender.balance, created_at=created_at))
+                    entries.append(LedgerEntry(transfer_id=transfer_id, user_id=receiver_id, amount=amount, balance=receiver.balance, created_at=created_at))
+                    applied[index] = {"code":1, "transfer_id":transfer_id}
+                Currency.objects.bulk_update([changed[user_id] for user_id in sorted(changed)], ['balance'], batch_size=cls.BATCH_SIZE)
+                LedgerEntry.objects.bulk_create(entries, batch_size=cls.BATCH_SIZE)
+            return applied
+        return cls.retry(apply)
+
+    @classmethod
+    def balance(cls, user_id:int) ->int:
+        """查詢餘額，帳戶不存在時回傳None"""
+        return Currency.objects.filter(user_id=user_id).values_list('balance', flat=True).first()
+
+    @classmethod
+    def history(cls, user_id:int, start=None, end=None, limit:int = 100) ->list:
+        """查詢使用者的帳本分錄，由新到舊
+
+        Args:
+            user_id: int，使用者ID。
+            start: datetime，開始時間(包含)，None表示不限制。
+            end: datetime，結束時間(不包含)，None表示不限制。
+            limit: int，最多回傳的筆數。
+
+        Returns:
+            list，LedgerEntry。
+        """
+        entries = LedgerEntry.objects.filter(user_id=user_id)
+        if start is not None:
+            entries = entries.filter(created_at__gte=start)
+        if end is not None:
+            entries = entries.filter(created_at__lt=end)
+        return list(entries.order_by('-created_at', '-id')[:limit])
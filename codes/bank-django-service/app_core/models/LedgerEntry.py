@@ -0,0 +1,43 @@
+from django.db import models
+from django.utils import timezone
+
+class LedgerEntryQuerySet(models.QuerySet):
+    """帳本分錄的查詢，不能批次修改或刪除"""
+    def update(self, **kwargs):
+        raise Exception("帳本分錄不能修改。")
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        raise Exception("帳本分錄不能修改。")
+
+    def delete(self):
+        raise Exception("帳本分錄不能刪除。")
+
+# 帳本分錄資料表
+class LedgerEntry(models.Model):
+    """帳本分錄資料表
+    每筆轉帳寫入兩筆分錄，轉出的金額為負數、轉入為正數，balance 為該筆分錄後的餘額。
+    只新增不修改，實例的 save、delete 與查詢的 update、bulk_update、delete 都會拋出錯誤。
+    以 (user_id, created_at) 的索引查詢使用者的交易紀錄，以 created_at 的索引查詢時間區間。
+    金額與餘額為64位元整數，上限見 Ledger.MAX_BALANCE。
+    """
+    transfer_id = models.CharField(max_length=32, db_index=True)
+    user_id = models.IntegerField()
+    amount = models.BigIntegerField()
+    balance = models.BigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = LedgerEntryQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise Exception("帳本分錄不能修改。")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise Exception("帳本分錄不能刪除。")
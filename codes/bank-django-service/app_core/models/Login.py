@@ -1,6 +1,10 @@
 from tokenize import Token
 from .User import User
-import hashlib
+from .RedisConnection import RedisConnection
+from .TokenCache import TokenCache
+from .PasswordHashing import PasswordHashing
+from .Instrumentation import Instrumentation
+from asgiref.sync import sync_to_async
 import json 
 import redis
 import os
@@ -10,49 +14,163 @@ class Login():
     """登入類別
     撰寫: 蕭維均
     """
+    # Token 有效秒數，5分鐘超時
+    TOKEN_EXPIRE_SECONDS = 300
+
+    # 在使用者索引(db1)執行，KEYS[1]: 帳號，ARGV: 新的Token、使用者資料、有效秒數、Token索引與使用者索引的資料庫編號
+    # 帳號已經有Token且Token仍然存在時回傳原本的Token；
+    # 否則將帳號指向新的Token(SET EX)，並且切換到Token索引寫入使用者資料(SET EX NX)，回傳新的Token。
+    # 腳本中的 SELECT 只影響腳本本身，不會改變連線的資料庫。
+    SET_TOKEN_SCRIPT = """
+local existing = redis.call('GET', KEYS[1])
+if existing then
+    redis.call('SELECT', ARGV[4])
+    if redis.call('EXISTS', existing) == 1 then
+        return existing
+    end
+    redis.call('SELECT', ARGV[5])
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SELECT', ARGV[4])
+redis.call('SET', ARGV[1], ARGV[2], 'EX', ARGV[3], 'NX')
+return ARGV[1]
+"""
+    set_token_script = None
+    async_set_token_script = None
+
     def check_account(self, account:str):
-        user_exist =  User.objects.filter(account__contains=account).count()
-        return True if user_exist == 1 else False
+        return User.objects.filter(account=account).exists()
 
     def check_password(self,account:str ,password:str):
-        password = password.encode('utf-8')
-        password_hash = hashlib.sha256(password).hexdigest()
-        result = User.objects.filter(account = account, password_hash = password_hash).count()
-        return True if result == 1 else False
+        return self.authenticate(account, password)
+
+    def get_password_hash(self, account:str):
+        """以帳號的唯一索引查詢密碼雜湊，帳號不存在時回傳None"""
+        return User.objects.filter(account=account).values_list('password_hash', flat=True).first()
+
+    def update_password_hash(self, account:str, password_hash:str):
+        User.objects.filter(account=account).update(password_hash=password_hash)
+
+    @Instrumentation.timed("cbdc_login_seconds", method="authenticate")
+    def authenticate(self, account:str, password:str):
+        """驗證帳號密碼
 
+        查詢一次取得密碼雜湊，在 PasswordHashing 的執行緒池中驗證，帳號不存在與密碼錯誤的結果相同。
+        舊版 SHA-256 或者迭代次數不同的密碼，驗證成功後以目前的設定重新雜湊並且儲存。
+        """
+        valid, new_password_hash = PasswordHashing.shared().verify(password, self.get_password_hash(account))
+        if valid and new_password_hash is not None:
+            self.update_password_hash(account, new_password_hash)
+        return valid
+
+    @Instrumentation.timed("cbdc_login_seconds", method="aauthenticate")
+    async def aauthenticate(self, account:str, password:str):
+        """authenticate 的非同步版本，資料庫查詢與雜湊都不會阻塞事件迴圈"""
+        password_hash = await sync_to_async(self.get_password_hash)(account)
+        valid, new_password_hash = await PasswordHashing.shared().averify(password, password_hash)
+        if valid and new_password_hash is not None:
+            await sync_to_async(self.update_password_hash)(account, new_password_hash)
+        return valid
+
+    @Instrumentation.timed("cbdc_login_seconds", method="setUserToken")
     def setUserToken(self,account:str):
+        """建立使用者的登入Token，已經登入時回傳原本的Token
+
+        帳號(db1)與Token(db0)的寫入由Lua腳本在Redis中一次完成，只需要一次往返，
+        同一帳號同時登入時也只會建立一個Token。
+        """
         # 生成Token 
         token = uuid.uuid4().hex
         json_data = json.dumps({'account':account})
-        
+
         # Redis 連線物件
-        redis_connection_token_index = redis.Redis(host=os.environ['REDIS_IP'], port=6379, db=0, password=os.environ['REDIS_PASSWORD'])
-        redis_connection_user_index = redis.Redis(host=os.environ['REDIS_IP'], port=6379, db=1, password=os.environ['REDIS_PASSWORD'])
+        redis_connection_user_index = RedisConnection.get(RedisConnection.USER_INDEX)
 
-        # 檢查使用者是否在已經登入的用戶表中，終止後續程序，回傳Token
-        if redis_connection_user_index.exists(account):
-            return redis_connection_user_index.get(account).decode("utf-8") 
+        # 使用者已經登入時回傳原本的Token，否則以新的Token登入
+        token = self.get_set_token_script(redis_connection_user_index)(
+            keys=[account],
+            args=[token, json_data, self.TOKEN_EXPIRE_SECONDS, RedisConnection.TOKEN_INDEX, RedisConnection.USER_INDEX],
+            client=redis_connection_user_index,
+        )
+        return token.decode("utf-8")
 
-        # 將使用者加入已經登入的使用者表單
-        redis_connection_user_index.set(account,token)
-        redis_connection_user_index.expire(account,300)
+    @classmethod
+    def get_set_token_script(cls, redis_connection):
+        """取得登入腳本，腳本以 EVALSHA 執行，Redis 沒有快取腳本時自動改用 EVAL"""
+        if cls.set_token_script is None:
+            cls.set_token_script = redis_connection.register_script(cls.SET_TOKEN_SCRIPT)
+        return cls.set_token_script
 
-        # 用 uuid 作為使用者的Token
-        redis_connection_token_index.set(token,json_data)
-        redis_connection_token_index.expire(token,300) # 300 秒，5分鐘超時。
+    @classmethod
+    def get_async_set_token_script(cls, redis_connection):
+        """取得非同步客戶端使用的登入腳本"""
+        if cls.async_set_token_script is None:
+            cls.async_set_token_script = redis_connection.register_script(cls.SET_TOKEN_SCRIPT)
+        return cls.async_set_token_script
 
-        return token
+    @Instrumentation.timed("cbdc_login_seconds", method="asetUserToken")
+    async def asetUserToken(self,account:str):
+        """setUserToken 的非同步版本"""
+        token = uuid.uuid4().hex
+        json_data = json.dumps({'account':account})
+        redis_connection_user_index = RedisConnection.get_async(RedisConnection.USER_INDEX)
+        token = await self.get_async_set_token_script(redis_connection_user_index)(
+            keys=[account],
+            args=[token, json_data, self.TOKEN_EXPIRE_SECONDS, RedisConnection.TOKEN_INDEX, RedisConnection.USER_INDEX],
+            client=redis_connection_user_index,
+        )
+        return token.decode("utf-8")
+
+    # 取得請求的參數
+    def get_request_data(self, request):
+        # 無論GET或者POST都接收，之後依照需求修改
+        if request.method == 'GET':
+            return request.GET
+        elif request.method == 'POST':
+            return request.POST
+        return None
+
+    # 取得請求的Token，若無token則回傳None
+    def get_request_token(self, request):
+        data = self.get_request_data(request)
+        # 同時相容token存在於cookie或者request中。
+        if "token" in data:
+            return data["token"]
+        elif "token" in request.COOKIES:
+            return request.COOKIES["token"]
+        return None
 
     # 登入方法
+    @Instrumentation.timed("cbdc_login_seconds", method="login")
     def login(self, request):
-        data = None
+        data = self.get_request_data(request)
         result =dict()
 
-        # 無論GET或者POST都接收，之後依照需求修改
-        if request.method == 'GET':
-            data = request.GET
-        elif request.method == 'POST':
-            data = request.POST
+        # 檢查 Requests 參數是否正確
+        try:
+            account = data['account']
+            password = data["password"]
+        except:
+            result = {'code':0, 'message':'Login format wrong.'}
+            result = json.dumps(result)
+            return result
+
+        # 檢查帳號密碼是否正確
+        if self.authenticate(account, password):
+            result = {'code':1, 'message':'Login success.'}
+            uuid_token = self.setUserToken(account)
+            result["token"] = uuid_token
+        else:
+            result = {'code':0, 'message':'Login fail.'}
+
+        result = json.dumps(result)
+        return result
+
+    # 登入方法(非同步)，資料庫查詢在執行緒中執行，不會阻塞事件迴圈
+    @Instrumentation.timed("cbdc_login_seconds", method="alogin")
+    async def alogin(self, request):
+        data = self.get_request_data(request)
+        result =dict()
 
         # 檢查 Requests 參數是否正確
         try:
@@ -63,14 +181,11 @@ class Login():
             result = json.dumps(result)
             return result
 
-        # 檢查帳號密碼是否存在 
-        if self.check_account(account):
-            if self.check_password(account, password):
-                result = {'code':1, 'message':'Login success.'}
-                uuid_token = self.setUserToken(account)
-                result["token"] = uuid_token
-            else:
-                result = {'code':0, 'message':'Login fail.'}
+        # 檢查帳號密碼是否正確
+        if await self.aauthenticate(account, password):
+            result = {'code':1, 'message':'Login success.'}
+            uuid_token = await self.asetUserToken(account)
+            result["token"] = uuid_token
         else:
             result = {'code':0, 'message':'Login fail.'}
 
@@ -78,29 +193,34 @@ class Login():
         return result
 
     # 檢查是否登入
+    @Instrumentation.timed("cbdc_login_seconds", method="check_login")
     def check_login(self, request):
-        data = None
-        result =dict()
-        token = None
+        token = self.get_request_token(request)
+        if token is None:# 若無token 進行回應
+            result = {'code':0,'message':'Missing token'}
+            result = json.dumps(result)
+            return result
 
-        # 無論GET或者POST都接收，之後依照需求修改
-        if request.method == 'GET':
-            data = request.GET
-        elif request.method == 'POST':
-            data = request.POST
+        # 檢查 Redis 中是否存在該Token
+        if self.login_verify(token):
+            result = {'code':1,'message':'Login success.'}
+        else:
+            result = {'code':0,'message':'Login fail.'}
 
-        # 檢查Token 是否正確，同時相容token存在於cookie或者request中。
-        if "token" in data:
-            token = data["token"]
-        elif "token" in request.COOKIES:
-            token = request.COOKIES["token"]
-        elif token == None:# 若無token 進行回應
+        result = json.dumps(result)
+        return result
+
+    # 檢查是否登入(非同步)
+    @Instrumentation.timed("cbdc_login_seconds", method="acheck_login")
+    async def acheck_login(self, request):
+        token = self.get_request_token(request)
+        if token is None:# 若無token 進行回應
             result = {'code':0,'message':'Missing token'}
             result = json.dumps(result)
             return result
 
         # 檢查 Redis 中是否存在該Token
-        if self.login_verify(token):
+        if await self.alogin_verify(token):
             result = {'code':1,'message':'Login success.'}
         else:
             result = {'code':0,'message':'Login fail.'}
@@ -110,34 +230,42 @@ class Login():
 
     # 檢查是否登入
     def check_login_from_request(self, request):
-        data = None
-        result =dict()
-        token = None
-
-        # 無論GET或者POST都接收，之後依照需求修改
-        if request.method == 'GET':
-            data = request.GET
-        elif request.method == 'POST':
-            data = request.POST
-
-        # 檢查Token 是否正確，同時相容token存在於cookie或者request中。
-        if "token" in data:
-            token = data["token"]
-        elif "token" in request.COOKIES:
-            token = request.COOKIES["token"]
-        elif token == None:# 若無token 進行回應
+        token = self.get_request_token(request)
+        if token is None:
             return False
-
         # 檢查 Redis 中是否存在該Token
-        if self.login_verify(token):
-            return True
-        else:
+        return self.login_verify(token)
+
+    # 檢查是否登入(非同步)
+    async def acheck_login_from_request(self, request):
+        token = self.get_request_token(request)
+        if token is None:
             return False
+        return await self.alogin_verify(token)
 
     # 檢查是否登入(用於非API)的驗證
+    @Instrumentation.timed("cbdc_login_seconds", method="login_verify")
     def login_verify(self,token):
-        redis_connection = redis.Redis(host=os.environ['REDIS_IP'], port=6379, db=0, password=os.environ['REDIS_PASSWORD'])
+        # 短時間內確認過的Token不需要再查詢Redis
+        token_cache = TokenCache.shared()
+        if token_cache.get(token):
+            return True
+        redis_connection = RedisConnection.get(RedisConnection.TOKEN_INDEX)
         if redis_connection.exists(token):
+            token_cache.put(token)
             return True
         else:
-            return False
\ No newline at end of file
+            return False
+
+    # 檢查是否登入(非同步)
+    @Instrumentation.timed("cbdc_login_seconds", method="alogin_verify")
+    async def alogin_verify(self,token):
+        token_cache = TokenCache.shared()
+        if token_cache.get(token):
+            return True
+        redis_connection = RedisConnection.get_async(RedisConnection.TOKEN_INDEX)
+        if await redis_connection.exists(token):
+            token_cache.put(token)
+            return True
+        else:
+            return False
@@ -0,0 +1,130 @@
+"""同時多重冪次運算
+
+計算 Π bases[i]^exponents[i] mod modulus，
+所有底數共用同一串平方運算(Shamir's trick)，
+每個底數各自以滑動視窗(sliding window)處理指數，只預先計算奇數次方。
+
+例如 Yi 加密的 g^m * r^N mod N^2，原本需要兩次完整的冪次運算再相乘，
+改用本模組只需要一串長度為 max(m, N) 位元數的平方運算。
+
+共用平方運算是在Python迴圈中進行，每次平方的成本比 gmpy2.powmod 內部的平方運算高，
+因此 multi_powmod 會先估計成本，只有在共用平方運算省下的次數足夠多時(例如批次驗證的40個底數)才交錯計算，
+否則(例如加密時只有g, r兩個底數)直接將各底數的 gmpy2.powmod 相乘。
+"""
+import gmpy2
+
+# 每次平方或乘法的相對成本，以 python manage.py benchmark multi_exponentiation 量測校正
+POWMOD_STEP_COST = 3 # gmpy2.powmod 內部
+LOOP_STEP_COST = 4 # Python 迴圈中的 gmpy2.mul 與 gmpy2.mod
+
+def window_size(bits:int) ->int:
+    """依照指數位元數選擇滑動視窗大小"""
+    if bits <= 24:
+        return 1
+    if bits <= 80:
+        return 3
+    if bits <= 240:
+        return 4
+    if bits <= 672:
+        return 5
+    return 6
+
+def sliding_windows(exponent:int, window:int) ->list:
+    """將指數拆成滑動視窗
+
+    Args:
+        exponent: int，非負整數指數。
+        window: int，視窗大小(位元)。
+
+    Returns:
+        windows: list，[(位置, 奇數值), ...]，exponent = Σ 奇數值 * 2^位置。
+    """
+    windows = []
+    position = 0
+    while exponent:
+        if exponent & 1:
+            value = exponent & ((1 << window) - 1)
+            # 視窗內的值是奇數，直接從目前位置取window個位元
+            windows.append((position, value))
+            exponent >>= window
+            position += window
+        else:
+            exponent >>= 1
+            position += 1
+    return windows
+
+def separate_cost(exponents:list) ->int:
+    """估計各底數分別以 gmpy2.powmod 計算的成本"""
+    cost = 0
+    for exponent in exponents:
+        bits = int(exponent).bit_length()
+        cost += POWMOD_STEP_COST * (bits + bits // (window_size(bits) + 1) + 1)
+    return cost
+
+def interleave_cost(exponents:list) ->int:
+    """估計共用平方運算交錯計算的成本"""
+    top = 0
+    steps = 0
+    for exponent in exponents:
+        bits = int(exponent).bit_length()
+        window = window_size(bits)
+        top = max(top, bits)
+        # 預計算奇數次方與每個視窗的乘法
+        steps += (1 << (window - 1)) + bits // (window + 1)
+    return LOOP_STEP_COST * (top + steps)
+
+def multi_powmod(bases:list, exponents:list, modulus:int, interleave:bool = None):
+    """同時計算多個底數的冪次乘積
+
+    Args:
+        bases: list，底數。
+        exponents: list，非負整數指數，數量與底數相同。
+        modulus: int，模數。
+        interleave: bool，是否交錯計算，預設依照成本估計決定。
+
+    Returns:
+        gmpy2.mpz，Π bases[i]^exponents[i] mod modulus。
+
+    Raises:
+        Exception: 底數與指數數量不同，或者指數為負數。
+    """
+    if len(bases) != len(exponents):
+        raise Exception("底數與指數的數量必須相同。")
+    modulus = gmpy2.mpz(modulus)
+    if interleave is None:
+        interleave = interleave_cost(exponents) < separate_cost(exponents)
+    if not interleave:
+        result = gmpy2.mpz(1) % modulus
+        for base, exponent in zip(bases, exponents):
+            if exponent < 0:
+                raise Exception("指數必須為非負整數。")
+            result = gmpy2.mod(gmpy2.mul(result, gmpy2.powmod(base, exponent, modulus)), modulus)
+        return result
+    # 每個位置需要乘上的預計算值
+    multipliers = dict()
+    top = 0
+    for base, exponent in zip(bases, exponents):
+        exponent = int(exponent)
+        if exponent < 0:
+            raise Exception("指數必須為非負整數。")
+        if exponent == 0:
+            continue
+        base = gmpy2.mod(gmpy2.mpz(base), modulus)
+        window = window_size(exponent.bit_length())
+        # 預計算奇數次方 base^1, base^3, ..., base^(2^window - 1)
+        odd_powers = [base]
+        if window > 1:
+            base_square = gmpy2.mod(gmpy2.mul(base, base), modulus)
+            for i in range(1, 1 << (window - 1)):
+                odd_powers.append(gmpy2.mod(gmpy2.mul(odd_powers[-1], base_square), modulus))
+        for position, value in sliding_windows(exponent, window):
+            multipliers.setdefault(position, []).append(odd_powers[value >> 1])
+            top = max(top, position)
+    # 由最高位往下，所有底數共用平方運算
+    result = gmpy2.mpz(1) % modulus
+    for position in range(top, -1, -1):
+        result = gmpy2.mod(gmpy2.mul(result, result), modulus)
+        if position in multipliers:
+            for multiplier in multipliers[position]:
+                result = gmpy2.mod(gmpy2.mul(result, multiplier), modulus)
+    return result
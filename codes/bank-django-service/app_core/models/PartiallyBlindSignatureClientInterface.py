@@ -9,16 +9,21 @@ import ellipticcurve
 from ellipticcurve.privateKey import PrivateKey, PublicKey
 import gmpy2
 import random
-from math import gcd
-from copy import deepcopy
 from .YiModifiedPaillierEncryptionPy import YiModifiedPaillierEncryptionPy
+from .YiFixedBasePrecomputation import YiFixedBasePrecomputation
+from .MultiExponentiation import multi_powmod
+from .YiKeyPairPool import YiKeyPairPool
+from .RandomUnitSampler import RandomUnitSampler
+from .ProtocolExecutor import ProtocolExecutor
+from .ProtocolMessageCodec import ProtocolMessageCodec
+from .ProtocolSchema import ProtocolSchema
 """
 Note
 =================
 signer寄送-1
 
-K1x: int，ECDSA 公鑰
-K1y: int，ECDSA 公鑰
+K1x: int，這次簽章的 K1 = k1 * G
+K1y: int，這次簽章的 K1 = k1 * G
 b_list: 一串0/1，20個。
 =================
 user寄送-2
@@ -31,24 +36,42 @@ ZeroKnowledgeProofC2List: List，20個C2'的零知識證明參數(x,r')或者(x'
 
 N: Yi的公鑰1
 g: Yi的公鑰2
+
+info: str，雙方共識的公開訊息，I = H(info)
+F_list: F1 ~ Fn，F_i = Enc(l_i * I mod q, l_i)
 =================
 signer寄送-3
 
-i_list: 20個，1~40之間的數字。
-C: int，簽章。
+i_list: 20個，0~39之間不重複的數字。
 =================
 user寄送-4
 
-L: List，被選擇的l list，除了l_j
+L: List，沒有被選擇的 l_j(j 不在 i_list 中)，依照索引排序
 =================
 signer寄送-5
 
 C: int，簽章。
+簽章 σ = (t, s, R)，s = k2^-1 * Dec(C) mod q，R = Σ l_i mod q，i 屬於 i_list
 =================
 """
+def zero_know_proof_encrypt_job(job:tuple)->list:
+    """
+    在執行器中加密一段零知識證明的C'
+    job 為 (N, g, q, [(x, r'), ...])，同一段共用一個固定底數預計算表
+    """
+    N, g, q, pairs = job
+    fixed_base = YiFixedBasePrecomputation(g, N, gmpy2.mpz(q).bit_length())
+    return [fixed_base.encrypt(x, rp) for x, rp in pairs]
+
 class PartiallyBlindSignatureClientInterface:
-    def __init__(self):
+    def __init__(self, keypair_pool:YiKeyPairPool = None, executor:ProtocolExecutor = None):
         self.n = 40 # 決定隨機數l_list的數字數量
+
+        # Yi的鑰匙池，若為None則同步生成鑰匙
+        self.keypair_pool = keypair_pool
+
+        # 平行生成零知識證明的執行器，若為None則依序生成
+        self.executor = executor
         
         # Yi的公私鑰匙
         # 私鑰
@@ -57,16 +80,21 @@ class PartiallyBlindSignatureClientInterface:
         # 公鑰
         self.N = None
         self.g = None
+        # 公鑰(N, g)的固定底數預計算表，同一組公鑰的所有加密共用
+        self.fixed_base = None
 
         # 二進位序列
         self.b_list = None
 
         # 訊息相關與Hash
         self.message_hash = None # 訊息的SHA256轉換成整數
+        self.info = None # 雙方共識的公開訊息
         self.I = None # 雙方共識訊息info的hash
 
         # 簽章
         self.t = None # 用來簽署簽署者的公鑰的數值
+        self.C = None # 簽署者的簽章
+        self.signature = None # 解密後的簽章 {"t", "s", "R"}
         
         # 加密混淆用隨機數
         self.r1 = None
@@ -75,6 +103,9 @@ class PartiallyBlindSignatureClientInterface:
         # 私鑰
         self.k2 = None
 
+        # Z_{N^2}^* 的取樣器，用於生成r
+        self.r_sampler = None
+
         # 密文
         self.C1 = None
         self.C2 = None
@@ -98,6 +129,8 @@ class PartiallyBlindSignatureClientInterface:
         # 列表
         self.l_list = None # 由n個小於phi(N^2)並且與N互質的整數組成。
         self.LengthOfL = 40 # L 列表長度
+        self.F_list = None # F_i = Enc(l_i * I mod q, l_i)
+        self.i_list = None # 簽署者選擇的索引，簽章使用這些 l_i
 
     def set_K1(self, K1_x, K1_y):
         """設置點K1
@@ -127,78 +160,113 @@ class PartiallyBlindSignatureClientInterface:
         return self.message_hash
 
     def generate_I(self, info:str):
+        self.info = info
         self.I = self.hash_H(info)
         return self.I
 
     def generate_r(self):
-        N = self.N
-        r = 0
-        r = self.find_random_co_prime(pow(N,2))
+        r = self.generate_r_list(1)[0]
         self.r = gmpy2.mpz(r)
         return r
 
+    def generate_r_list(self, count:int)->list:
+        """一次生成count個與N^2互質的隨機數r"""
+        # N^2 的質因數為 p, q, k
+        N_power_2 = pow(self.N,2)
+        if (self.r_sampler is None) or (self.r_sampler.modulus != N_power_2):
+            self.r_sampler = RandomUnitSampler(N_power_2, [self.p, self.q, self.k])
+        return self.r_sampler.sample_many(count)
+
     def generate_t(self):
-        Kx = gmpy2.mpz(self.K1.x)
+        # t 為 K = k2 * K1 的x座標，簽章驗證時 u * G + v * Q 會得到 K
+        Kx = gmpy2.mpz(self.K.x)
         self.t = gmpy2.mod(Kx, self.q)
         return int(self.t)
 
     def find_random_co_prime(self, n:int):
-        result = random.randrange(deepcopy(n)) #尋找極限以下的隨機數
-        while gcd(n,result) != 1: # 當與n不互質時
-            result += 1 # 往下個數值進行線性搜索。
-            if result > n : # 若結果不小心大於目標
-                result = random.randrange(deepcopy(n)) #重新尋找隨機數
-        return result
+        return RandomUnitSampler(n).sample()
 
     def generate_l_list(self):
         phi_N_square = pow(gmpy2.mul(gmpy2.mul(self.p-1, self.q-1), self.k-1), 2) # phi(N^2)，N平方的歐拉函數
-        l_list = []
-        for i in range(self.LengthOfL):
-            l_list.append(self.find_random_co_prime(phi_N_square))
-        return l_list
+        # phi_N_square 的質因數都整除 p-1, q-1, k-1 其中之一
+        sampler = RandomUnitSampler(phi_N_square, [self.p-1, self.q-1, self.k-1])
+        return sampler.sample_many(self.LengthOfL)
 
     def encrypt(self, m:int, N:int, g:int ,r:int, q:int):
+        # 若已經為該組公鑰建立預計算表，則查表計算 g^m
+        if (self.fixed_base is not None) and self.fixed_base.matches(N, g):
+            return self.fixed_base.encrypt(m, r)
         N, g, r, m= gmpy2.mpz(N), gmpy2.mpz(g), gmpy2.mpz(r), gmpy2.mpz(m)
         N_power_2 = pow(N,2)
         # 此處將算式改為 C = [(g^m mod N^2) * (r^N mod N^2)] mod N^2 ，防止數值過大導致的記憶體占滿，或者速度緩慢。
-        C = gmpy2.mod(gmpy2.powmod(g, m, N_power_2) * gmpy2.powmod(r, N, N_power_2), N_power_2)
+        # g^m * r^N 以同時多重冪次運算計算
+        C = multi_powmod([g, r], [m, N], N_power_2)
         return int(C)
 
-    def step1_input(self, input:str):
-        input_object = json.loads(input)
+    def step1_input(self, input, content_type:str = None):
+        input_object = ProtocolSchema.validate(ProtocolMessageCodec.decode(input, content_type), ProtocolSchema.SIGNER_STEP1)
         self.set_K1(input_object["K1x"], input_object["K1y"])
         self.b_list = input_object["b_list"]
 
     def generate_keypairs_parameters(self):
-        # 生成Yi的公私鑰
-        Yi = YiModifiedPaillierEncryptionPy()
-        Yi.generate_keypairs(self.q)
-        self.p = Yi.p 
-        self.k = Yi.k
-        self.N = Yi.N
-        self.g = Yi.g
+        # 生成Yi的公私鑰，有鑰匙池時直接從鑰匙池取出
+        if self.keypair_pool is not None:
+            p, k, N, g = self.keypair_pool.acquire()
+            self.p, self.k, self.N, self.g = gmpy2.mpz(p), gmpy2.mpz(k), gmpy2.mpz(N), gmpy2.mpz(g)
+        else:
+            Yi = YiModifiedPaillierEncryptionPy()
+            Yi.generate_keypairs(self.q)
+            self.p = Yi.p 
+            self.k = Yi.k
+            self.N = Yi.N
+            self.g = Yi.g
+        self.fixed_base = YiFixedBasePrecomputation(self.g, self.N, gmpy2.mpz(self.q).bit_length())
         self.r1 = self.generate_r()
         self.r2 = self.generate_r()
         self.k2 = self.find_random_co_prime(self.q)
-        self.t = self.generate_t()
         self.K = ellipticcurve.math.Math.multiply(self.K1, int(self.k2), self.curve_N, self.curve_A, self.curve_P)
+        self.t = self.generate_t()
         self.C1 = self.encrypt(self.message_hash, self.N, self.g, self.r1, self.q)
         self.C2 = self.encrypt(self.t, self.N, self.g, self.r2, self.q)
         self.l_list = self.generate_l_list()
 
-    def generate_zero_know_proof_parameter_set(self,info:int,r:int,b:int)->dict:
+    def generate_F_list(self)->list:
+        """生成 F_i = Enc(l_i * I mod q, l_i)
+
+        F_i 以 l_i 作為加密的隨機數，簽署者可以用公開的 l_j 重新計算 F_j 驗證。
+        """
+        if self.I is None:
+            raise Exception("請先以 generate_I 設置公開訊息info。")
+        self.F_list = [self.fixed_base.encrypt(gmpy2.mod(gmpy2.mul(l, self.I), self.q), l) for l in self.l_list]
+        return self.F_list
+
+    def generate_zero_know_proof_parameter_set(self,info:int,r:int,b:int,rp:int=None)->dict:
         """
         生成零知識證明參數
         如果是C1的話info 就是 Hash(m)
         如果是C2的話info就是Hash(info)
+        rp 為預先生成的r'，若為None則當場生成
+        """
+        temp = self.generate_zero_know_proof_randomness(info, r, rp)
+        Cp = self.encrypt(temp['x'], self.N, self.g, temp['rp'], self.q)
+        return self.zero_know_proof_parameter_set_result(temp, b, Cp)
+
+    def generate_zero_know_proof_randomness(self,info:int,r:int,rp:int=None)->dict:
+        """
+        生成一組零知識證明參數的隨機數x, r'，以及x', r''
         """
-        result = dict()
         temp = dict()
         temp['x'] = random.randrange(self.q)
-        temp['rp'] = self.generate_r()
+        temp['rp'] = self.generate_r() if rp is None else gmpy2.mpz(rp)
         temp['xp'] = gmpy2.mod(gmpy2.add(info, temp['x']), self.q)
         temp['rpp'] = self.rpp = gmpy2.mod(gmpy2.mul(r, temp['rp'] ), pow(self.N,2))
+        return temp
 
+    def zero_know_proof_parameter_set_result(self,temp:dict,b:int,Cp:int)->dict:
+        """
+        依照b選擇要公開的參數，b為0時公開(x,r')，b為1時公開(x',r'')
+        """
+        result = dict()
         if b == 0:
             result['x'] = int(temp['x'])
             result['rp'] = int(temp['rp'])
@@ -206,33 +274,123 @@ class PartiallyBlindSignatureClientInterface:
             result['xp'] = int(temp['xp'])
             result['rpp'] = int(temp['rpp'])
 
-        result['Cp'] = self.encrypt(temp['x'], self.N, self.g, temp['rp'], self.q)
+        result['Cp'] = Cp
 
         return result
 
-    def generate_zero_know_proof_parameter_sets(self):
+    def generate_zero_know_proof_parameter_sets(self, executor:ProtocolExecutor = None):
         """
         生成多組C1,C2的零知識證明參數
+
+        所有隨機數在目前的程序中依序生成，只有加密C'分散到執行器，
+        所以平行與依序執行的結果相同，順序也與回合相同。
+        executor 預設使用 self.executor，為None時依序執行。
         """
+        if executor is None:
+            executor = self.executor
         result = dict()
 
         C1_zero_know_proof_parameter_sets = []
         C2_zero_know_proof_parameter_sets = []
 
+        # 一次生成所有回合需要的r'
+        rp_list = self.generate_r_list(2 * self.NumberOfZeroKnowledgeProofRound)
+
+        # 依序生成每回合C1, C2的隨機數
+        temps = []
+        for i in range(self.NumberOfZeroKnowledgeProofRound):
+            temps.append(self.generate_zero_know_proof_randomness(self.message_hash,self.r1,rp_list[2*i]))
+            temps.append(self.generate_zero_know_proof_randomness(self.t,self.r2,rp_list[2*i+1]))
+
+        # 加密所有的C'
+        if executor is None:
+            Cp_list = [self.encrypt(temp['x'], self.N, self.g, temp['rp'], self.q) for temp in temps]
+        else:
+            pairs = [(int(temp['x']), int(temp['rp'])) for temp in temps]
+            jobs = [(int(self.N), int(self.g), int(self.q), chunk) for chunk in executor.split(pairs)]
+            Cp_list = []
+            for chunk_result in executor.map(zero_know_proof_encrypt_job, jobs):
+                Cp_list.extend(chunk_result)
+
         for i in range(self.NumberOfZeroKnowledgeProofRound):
             b = self.b_list[i]
-            C1_zero_know_proof_parameter_sets.append(self.generate_zero_know_proof_parameter_set(self.message_hash,self.r1,b))
-            C2_zero_know_proof_parameter_sets.append(self.generate_zero_know_proof_parameter_set(self.t,self.r2,b))
+            C1_zero_know_proof_parameter_sets.append(self.zero_know_proof_parameter_set_result(temps[2*i],b,Cp_list[2*i]))
+            C2_zero_know_proof_parameter_sets.append(self.zero_know_proof_parameter_set_result(temps[2*i+1],b,Cp_list[2*i+1]))
 
         result['ZeroKnowledgeProofC1List'] = C1_zero_know_proof_parameter_sets
         result['ZeroKnowledgeProofC2List'] = C2_zero_know_proof_parameter_sets
 
         return result
 
-    def step1_output(self):
+    def step1_output(self, content_type:str = ProtocolMessageCodec.CONTENT_TYPE_JSON):
         result = self.generate_zero_know_proof_parameter_sets()
         result['N'] = int(self.N)
         result['g'] = int(self.g)
         result['C1'] = int(self.C1)
         result['C2'] = int(self.C2)
-        return json.dumps(result)
+        result['info'] = self.info
+        result['F_list'] = [int(F) for F in self.generate_F_list()]
+        return ProtocolMessageCodec.encode(result, content_type)
+
+    def step2_input(self, input, content_type:str = None):
+        input_object = ProtocolSchema.validate(ProtocolMessageCodec.decode(input, content_type), ProtocolSchema.SIGNER_STEP3)
+        i_list = input_object["i_list"]
+        if (len(set(i_list)) != len(i_list)) or any(i >= self.LengthOfL for i in i_list):
+            raise Exception("簽署者選擇的i_list錯誤。")
+        self.i_list = sorted(i_list)
+
+    def step2_output(self, content_type:str = ProtocolMessageCodec.CONTENT_TYPE_JSON):
+        i_set = set(self.i_list)
+        L = [int(self.l_list[j]) for j in range(self.LengthOfL) if j not in i_set]
+        return ProtocolMessageCodec.encode({"L":L}, content_type)
+
+    def step3_input(self, input, content_type:str = None):
+        """解密簽署者的簽章C，得到簽章 σ = (t, s, R)
+
+        Dec(C) = k1^-1 * (H(m) + t * d + R * I) mod q，
+        s = k2^-1 * Dec(C) mod q，R = Σ l_i mod q。
+
+        Returns:
+            signature: dict，{"t":t, "s":s, "R":R}。
+        """
+        input_object = ProtocolSchema.validate(ProtocolMessageCodec.decode(input, content_type), ProtocolSchema.SIGNER_STEP5)
+        self.C = input_object["C"]
+        Yi = YiModifiedPaillierEncryptionPy()
+        # 以 p, q, k 的CRT解密
+        D = Yi.decrypt(self.C, self.p, self.k, self.q, self.N)
+        s = gmpy2.mod(gmpy2.mul(gmpy2.invert(self.k2, self.q), D), self.q)
+        R = gmpy2.mod(sum(self.l_list[i] for i in self.i_list), self.q)
+        self.signature = {"t":int(self.t), "s":int(s), "R":int(R)}
+        return self.signature
+
+    def verify_signature(self, Qx:int, Qy:int, signature:dict = None, message_hash:int = None, I:int = None)->bool:
+        """驗證部分盲簽章
+
+        u = s^-1 * (H(m) + R * I) mod q，v = s^-1 * t mod q，
+        (u * G + v * Q) 的x座標 mod q 等於 t 時簽章正確。
+
+        Args:
+            Qx: int，簽署者 ECDSA 公鑰的x座標。
+            Qy: int，簽署者 ECDSA 公鑰的y座標。
+            signature: dict，{"t", "s", "R"}，預設為 self.signature。
+            message_hash: int，H(m)，預設為 self.message_hash。
+            I: int，H(info)，預設為 self.I。
+
+        Returns:
+            bool，簽章是否正確。
+        """
+        signature = self.signature if signature is None else signature
+        message_hash = self.message_hash if message_hash is None else message_hash
+        I = self.I if I is None else I
+        t, s, R = signature["t"], signature["s"], signature["R"]
+        if not (0 < t < self.q and 0 < s < self.q):
+            return False
+        s_inverse = gmpy2.invert(s, self.q)
+        u = int(gmpy2.mod(gmpy2.mul(s_inverse, message_hash + gmpy2.mul(R, I)), self.q))
+        v = int(gmpy2.mod(gmpy2.mul(s_inverse, t), self.q))
+        G = ellipticcurve.point.Point(self.curve_Gx, self.curve_Gy)
+        Q = ellipticcurve.point.Point(Qx, Qy)
+        uG = ellipticcurve.math.Math.multiply(G, u, self.curve_N, self.curve_A, self.curve_P)
+        vQ = ellipticcurve.math.Math.multiply(Q, v, self.curve_N, self.curve_A, self.curve_P)
+        K = ellipticcurve.math.Math.add(uG, vQ, self.curve_A, self.curve_P)
+        return K.x % self.q == t
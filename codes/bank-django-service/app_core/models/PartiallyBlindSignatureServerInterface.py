@@ -2,19 +2,28 @@ import hashlib
 import pprint
 import json
 import os
+import threading
+import time
 import redis
 import ellipticcurve
 from ellipticcurve.privateKey import PrivateKey, PublicKey
 import gmpy2
 import random
 from .YiModifiedPaillierEncryptionPy import YiModifiedPaillierEncryptionPy
+from .MultiExponentiation import multi_powmod
+from .RandomUnitSampler import RandomUnitSampler
+from .ProtocolExecutor import ProtocolExecutor
+from .ProtocolMessageCodec import ProtocolMessageCodec
+from .ProtocolSession import ProtocolSession
+from .ProtocolSchema import ProtocolSchema
+from .Instrumentation import Instrumentation
 """
 Note
 =================
 signer寄送-1
 
-K1x: int，ECDSA 公鑰
-K1y: int，ECDSA 公鑰
+K1x: int，這次簽章的 K1 = k1 * G，k1 為每個協定狀態各自的隨機數
+K1y: int，這次簽章的 K1 = k1 * G
 b_list: 一串0/1，20個。
 =================
 user寄送-2
@@ -28,24 +37,116 @@ ZeroKnowledgeProofC2List: List，20個C2'的零知識證明參數(x,r')或者(x'
 N: Yi的公鑰1
 g: Yi的公鑰2
 
-F1 ~ Fn: 加密的公開訊息Hash
+info: str，雙方共識的公開訊息，I = H(info)
+F_list: F1 ~ Fn，F_i = Enc(l_i * I mod q, l_i)
 =================
 signer寄送-3
 
-i_list: 20個，1~40之間的數字。
-C: int，簽章。
+i_list: 20個，0~39之間不重複的數字。
 =================
 user寄送-4
 
-L: List，被選擇的l list，除了l_j
+L: List，沒有被選擇的 l_j(j 不在 i_list 中)，依照索引排序
 =================
 signer寄送-5
 
-C: int，簽章。
+C: int，簽章，C = (C1 * C2^d * Π F_i)^(k1^-1 mod q) * r^N mod N^2，i 屬於 i_list
 =================
 """
+# b_list、i_list、k1 與簽章重新隨機化的 r 使用作業系統的隨機數，使用者不能由先前的輸出預測
+secure_random = random.SystemRandom()
+
+def hash_H(message:str)->int:
+    """Hash函數H()，SHA256轉換成整數，與使用者端相同"""
+    return int(hashlib.sha256(bytes(message, 'utf-8')).hexdigest(), 16)
+
+def zero_knowledge_proof_round_equations(N:int, C1:int, C2:int, b:int, C1_parameter_set:dict, C2_parameter_set:dict)->list:
+    """取得零知識證明單一回合的加密等式 Enc(m, r) == C
+
+    b為0時: Enc(x, r') == C'
+    b為1時: Enc(x', r'') == C * C' mod N^2
+
+    Returns:
+        equations: list，[(m, r, C), ...]，C1、C2各一條。
+    """
+    equations = []
+    N_power_2 = pow(N,2)
+    for C, parameter_set in ((C1, C1_parameter_set), (C2, C2_parameter_set)):
+        if b == 0:
+            equations.append((parameter_set['x'], parameter_set['rp'], parameter_set['Cp']))
+        elif b == 1:
+            equations.append((parameter_set['xp'], parameter_set['rpp'], gmpy2.mod(gmpy2.mul(C, parameter_set['Cp']), N_power_2)))
+    return equations
+
+def zero_knowledge_proof_verify_rounds(job:tuple)->list:
+    """驗證一段零知識證明的回合
+
+    可以直接呼叫，也可以交給 ProtocolExecutor 在子程序中執行。
+    批次驗證通過時直接回傳，失敗時才逐回合以 Yi.encrypt 驗證，找出錯誤的回合。
+
+    Args:
+        job: tuple，(N, g, q, C1, C2, batch, security_bits, early_exit, rounds)，
+             rounds 為 [(回合編號, b, C1的參數, C2的參數), ...]。
+
+    Returns:
+        failures: list，驗證失敗的回合編號。early_exit 時只回傳第一個失敗的回合。
+    """
+    N, g, q, C1, C2, batch, security_bits, early_exit, rounds = job
+    Yi = YiModifiedPaillierEncryptionPy()
+    # 同一組公鑰需要加密多次，先建立固定底數預計算表
+    Yi.enable_fixed_base(N, g, q)
+    equations = [zero_knowledge_proof_round_equations(N, C1, C2, b, C1_parameter_set, C2_parameter_set) for i, b, C1_parameter_set, C2_parameter_set in rounds]
+    # 批次驗證這一段的全部回合
+    if batch:
+        if Yi.batch_verify([equation for round_equations in equations for equation in round_equations], N, g, q, security_bits):
+            return []
+    # 逐回合驗證，批次驗證不接受的 m 為0、m 大於 q 或 r 為0時 encrypt 會拋出錯誤，視為這個回合失敗
+    failures = []
+    for (i, b, C1_parameter_set, C2_parameter_set), round_equations in zip(rounds, equations):
+        for m, r, C in round_equations:
+            try:
+                valid = Yi.encrypt(m, N, g, r, q) == C
+            except Exception:
+                valid = False
+            if not valid:
+                failures.append(i)
+                break
+        if failures and early_exit:
+            break
+    return failures
+
+class ProtocolStep:
+    """協定的一個步驟
+
+    Attributes:
+        input_schema: 使用者輸入的格式(ProtocolSchema)，為None時這個步驟不需要輸入。
+        handler: str，處理這個步驟的方法名稱，輸入解碼後的訊息，回傳輸出的訊息。
+        output_schema: 輸出的格式(ProtocolSchema)。
+    """
+    def __init__(self, input_schema, handler:str, output_schema):
+        self.input_schema = input_schema
+        self.handler = handler
+        self.output_schema = output_schema
+
 class PartiallyBlindSignatureServerInterface:
-    def __init__(self, token:str):
+    # 每個步驟的輸入格式、處理方法與輸出格式，步驟為Redis中的 step
+    STEPS = {
+        1: ProtocolStep(None, "step1_output", ProtocolSchema.SIGNER_STEP1),
+        2: ProtocolStep(ProtocolSchema.USER_STEP2, "step2_challenge", ProtocolSchema.SIGNER_STEP3),
+        3: ProtocolStep(ProtocolSchema.USER_STEP4, "step3_sign", ProtocolSchema.SIGNER_STEP5),
+    }
+
+    # 零知識證明次數
+    NumberOfZeroKnowledgeProofRound = 20
+    # User端的L長度
+    LengthOfL = 40
+    LengthOfi = 20
+
+    # 統計數據，{步驟: {"count":次數, "failures":失敗次數, "seconds":處理秒數, "total_seconds":含解碼、編碼與Redis的秒數}}
+    statistics = dict()
+    statistics_lock = threading.Lock()
+
+    def __init__(self, token:str, executor:ProtocolExecutor = None):
         # 逾期時間(秒)
         self.expiretime = 300
         # 從環境變數取得ECDSA鑰匙
@@ -53,121 +154,277 @@ class PartiallyBlindSignatureServerInterface:
         self.ECDSA_PRIVATEKEY = os.environ['ECDSA_PRIVATEKEY']
         # 從ECDSA PUBLICKEY取得X,Y軸
         publicKey = PublicKey.fromPem(self.ECDSA_PUBLICKEY)
-        self.K1x = publicKey.point.x
-        self.K1y = publicKey.point.y
+        self.curve = publicKey.curve
         self.q = publicKey.curve.N
-        # 零知識證明次數
-        self.NumberOfZeroKnowledgeProofRound = 20
-        # User端的L長度
-        self.LengthOfL = 40
-        self.LengthOfi = 20
-        # Redis 連線
-        self.redis_connection = redis.Redis(host=os.environ['REDIS_IP'], port=6379, db=0, password=os.environ['REDIS_PASSWORD'])
+        # 零知識證明批次驗證，以及批次驗證隨機小指數的位元數
+        self.ZeroKnowledgeProofBatchVerify = True
+        self.ZeroKnowledgeProofBatchSecurityBits = 64
+        # 零知識證明驗證發現錯誤時是否立即停止，False時為完整稽核模式
+        self.ZeroKnowledgeProofEarlyExit = True
+        # 零知識證明驗證失敗的回合
+        self.zero_knowledge_proof_failed_round = None
+        self.zero_knowledge_proof_failed_rounds = []
+        # 平行驗證的執行器，若為None則在目前執行緒驗證
+        self.executor = executor
+        # 協定狀態，存放在Redis hash
+        self.session = ProtocolSession(token, self.expiretime)
         # 檢查使用者當前進行到的步驟
         self.status = dict()
+        # 這個步驟改變、前進時需要寫入的欄位
+        self.changed_status = dict()
         self.create_or_load_status(token)
 
-    # 生成隨機二進位序列
+    # 生成隨機二進位序列，使用者不能預測
     def generate_b_list(self):
-        b_list = [ random.randrange(2) for i in range(self.NumberOfZeroKnowledgeProofRound) ]
+        b_list = [ secure_random.randrange(2) for i in range(self.NumberOfZeroKnowledgeProofRound) ]
         return b_list
 
-    # 生成隨機選擇0-40之間的數值不重複
+    # 從 0 ~ LengthOfL-1 中隨機選擇 LengthOfi 個不重複的數值
     def generate_i_list(self):
-        i_list = []
-        for i in range(self.LengthOfi):
-            temp_number = random.randrange(self.LengthOfL+1)
-            if temp_number not in i_list:
-                i_list.append(temp_number)
-        i_list.sort()
-        return i_list
+        return sorted(secure_random.sample(range(self.LengthOfL), self.LengthOfi))
+
+    # 生成這次簽章的 k1，每個協定狀態不同，重複使用時兩份簽章就可以算出私鑰
+    def generate_k1(self):
+        return secure_random.randrange(1, self.q)
 
     # 創建新的認證狀態，或者載入舊的
     def create_or_load_status(self,token):
-        status = json.loads(self.redis_connection.get(token))
-        if 'step' in status:
-            self.status = status
-        else:
-            status['step'] = 1
-            status['i_list'] = self.generate_i_list()
-            status['b_list'] = self.generate_b_list()
-            self.redis_connection.set(token, json.dumps(status))
-            self.redis_connection.expire(token, self.expiretime)
-            self.status = status
+        self.status = self.session.load({'i_list':self.generate_i_list(), 'b_list':self.generate_b_list(), 'k1':self.generate_k1()})
+
+    # 更新狀態的欄位，前進到下個步驟時寫入
+    def update_status(self, **fields):
+        self.status.update(fields)
+        self.changed_status.update(fields)
 
     # 儲存並且前進到下個步驟
     def save_and_next_step(self,token):
+        """只寫入這個步驟改變的欄位，並且前進到下個步驟
+
+        Raises:
+            Exception: 同一個步驟已經被其他請求處理(重複送出)。
+        """
+        self.session.advance(self.status['step'], self.changed_status)
         self.status['step'] += 1
-        self.redis_connection.set(token,json.dumps(self.status))
-        self.redis_connection.expire(token, self.expiretime)
-
-    # 取得使用者輸入
-    def input(self,input):
-        if self.status["step"] == 1:
-            raise Exception("第一步驟，從簽署者輸出公鑰，不需要輸入任何東西。")
-        elif self.status["step"] == 2:
-            input = json.loads(input)
-            self.status["C1"] = input["C1"]
-            self.status["C2"] = input["C2"]
-            self.status["N"] = input["N"]
-            self.status["g"] = input["g"]
-            self.zero_knowledge_proof_vefify(input)
-        elif self.status["step"] == 3:
-            pass
-        elif self.status["step"] == 4:
-            pass
-
-    # 取得輸出
-    def output(self):
-        if self.status["step"] == 1:
-            return json.dumps({"K1x":self.K1x, "K1y":self.K1y, "b_list":self.status["b_list"]})
+        self.changed_status = dict()
 
-    # 零知識證明驗證
-    def zero_knowledge_proof_vefify(self, input:dict):
-        result = True
+    @classmethod
+    def record(cls, step:int, seconds:float, total_seconds:float = None, failed:bool = False):
+        with cls.statistics_lock:
+            statistics = cls.statistics.setdefault(step, {"count":0, "failures":0, "seconds":0.0, "total_seconds":0.0, "total_count":0})
+            statistics["count"] += 1
+            statistics["failures"] += 1 if failed else 0
+            statistics["seconds"] += seconds
+            if total_seconds is not None:
+                statistics["total_seconds"] += total_seconds
+                statistics["total_count"] += 1
+
+    @classmethod
+    def metrics(cls) ->dict:
+        """每個步驟的次數與平均耗時
+
+        Returns:
+            dict，{"step_步驟": {"count", "failures", "mean_seconds", "mean_total_seconds"}}，
+            mean_seconds 為步驟處理方法(密碼學運算)的耗時，
+            mean_total_seconds 為 process 的耗時，包含解碼、格式檢查、編碼與Redis。
+        """
+        with cls.statistics_lock:
+            return {"step_%d" % step:{
+                "count":statistics["count"],
+                "failures":statistics["failures"],
+                "mean_seconds":statistics["seconds"] / statistics["count"],
+                "mean_total_seconds":statistics["total_seconds"] / statistics["total_count"] if statistics["total_count"] else None,
+            } for step, statistics in sorted(cls.statistics.items())}
+
+    # 取得目前的步驟
+    def current_step(self)->ProtocolStep:
+        step = self.STEPS.get(self.status["step"])
+        if step is None:
+            raise Exception("部分盲簽章已經完成，請重新登入。")
+        return step
+
+    # 執行目前步驟的處理方法
+    def handle(self, message:dict = None)->dict:
+        """執行目前步驟的處理方法，並且記錄耗時
+
+        Args:
+            message: dict，已經解碼並且符合格式的輸入，不需要輸入的步驟為None。
+
+        Returns:
+            dict，這個步驟的輸出。
+        """
+        step = self.current_step()
+        start_time = time.perf_counter()
+        try:
+            output = getattr(self, step.handler)(message)
+        except Exception:
+            self.record(self.status["step"], time.perf_counter() - start_time, failed=True)
+            raise
+        seconds = time.perf_counter() - start_time
+        self.record(self.status["step"], seconds)
+        if Instrumentation.sampled():
+            Instrumentation.observe("cbdc_blind_signature_step_seconds", seconds, step=self.status["step"])
+        return output
+
+    # 取得使用者輸入，content_type 為None時由內容判斷JSON或二進位格式
+    def input(self,input,content_type:str = None):
+        step = self.current_step()
+        if step.input_schema is None:
+            raise Exception("第%d步驟，從簽署者輸出，不需要輸入任何東西。" % self.status["step"])
+        message = ProtocolSchema.validate(ProtocolMessageCodec.decode(input, content_type), step.input_schema)
+        return self.handle(message)
+
+    # 取得不需要輸入的步驟的輸出
+    def output(self, content_type:str = ProtocolMessageCodec.CONTENT_TYPE_JSON):
+        step = self.current_step()
+        if step.input_schema is not None:
+            raise Exception("第%d步驟需要使用者的輸入。" % self.status["step"])
+        return ProtocolMessageCodec.encode(self.handle(), content_type)
+
+    # 處理目前步驟的請求
+    def process(self, token:str, input = None, content_type:str = None, accept:str = None)->tuple:
+        """處理目前步驟的請求，成功時儲存並且前進到下個步驟
+
+        依照 STEPS 檢查輸入的格式並且呼叫該步驟的處理方法。
+
+        Args:
+            token: str，使用者的登入Token。
+            input: str 或 bytes，使用者的輸入，第一步驟不需要。
+            content_type: str，輸入的格式，若為None則由內容判斷。
+            accept: str，HTTP Accept 標頭，用於決定輸出的格式。
+
+        Returns:
+            (output, response_content_type): 輸出的內容與格式。
+        """
+        start_time = time.perf_counter()
+        step_number = self.status["step"]
+        response_content_type = ProtocolMessageCodec.negotiate(accept)
+        if self.current_step().input_schema is None:
+            output = self.output(response_content_type)
+        else:
+            output = ProtocolMessageCodec.encode(self.input(input, content_type), response_content_type)
+        self.save_and_next_step(token)
+        with self.statistics_lock:
+            self.statistics[step_number]["total_seconds"] += time.perf_counter() - start_time
+            self.statistics[step_number]["total_count"] += 1
+        return output, response_content_type
+
+    # 第一步驟: 輸出 K1 = k1 * G 與 b_list
+    def step1_output(self, message:dict = None)->dict:
+        K1 = ellipticcurve.math.Math.multiply(self.curve.G, self.status["k1"], self.curve.N, self.curve.A, self.curve.P)
+        return {"K1x":K1.x, "K1y":K1.y, "b_list":self.status["b_list"]}
+
+    # 第二步驟: 驗證零知識證明，通過後輸出 i_list
+    def step2_challenge(self, message:dict)->dict:
+        for name in ("ZeroKnowledgeProofC1List", "ZeroKnowledgeProofC2List"):
+            if len(message[name]) != self.NumberOfZeroKnowledgeProofRound:
+                raise Exception("零知識證明必須有%d回合。" % self.NumberOfZeroKnowledgeProofRound)
+        if len(message["F_list"]) != self.LengthOfL:
+            raise Exception("F_list 必須有%d個。" % self.LengthOfL)
+        self.update_status(C1=message["C1"], C2=message["C2"], N=message["N"], g=message["g"],
+            F_list=message["F_list"], I=hash_H(message["info"]))
+        if not self.zero_knowledge_proof_vefify(message):
+            raise Exception("零知識證明驗證失敗。")
+        return {"code":1, "step":self.status["step"] + 1, "i_list":self.status["i_list"]}
+
+    # 第三步驟: 驗證公開的 l_j 與 F_j，通過後輸出簽章 C
+    def step3_sign(self, message:dict)->dict:
+        self.revealed_l_verify(message["L"])
+        return {"code":1, "step":self.status["step"] + 1, "C":self.sign()}
+
+    # 驗證使用者公開的 l_j
+    def revealed_l_verify(self, L:list):
+        """驗證沒有被選擇的 F_j = Enc(l_j * I mod q, l_j)
+
+        使用者在選擇 i_list 之前就送出全部的 F，公開的一半正確時，
+        被選擇的一半(簽章使用的 F_i)錯誤而沒有被發現的機率約為 1/C(40,20)。
+        先以小指數批次驗證全部等式，失敗時才逐一驗證，找出錯誤的 l_j。
+
+        Args:
+            L: list，沒有被選擇的 l_j，依照索引排序。
+
+        Raises:
+            Exception: 數量錯誤或者 l_j 與 F_j 不符。
+        """
+        i_set = set(self.status["i_list"])
+        revealed = [j for j in range(self.LengthOfL) if j not in i_set]
+        if len(L) != len(revealed):
+            raise Exception("公開的l必須有%d個。" % len(revealed))
+        N, g, I = self.status["N"], self.status["g"], self.status["I"]
+        equations = [(gmpy2.mod(gmpy2.mul(l, I), self.q), l, self.status["F_list"][j]) for j, l in zip(revealed, L)]
         Yi = YiModifiedPaillierEncryptionPy()
-        # 零知識證明，重複驗證40次
-        for i in range(self.NumberOfZeroKnowledgeProofRound):
-            b = self.status["b_list"][i]
-            ZeroKnowledgeProofC1List = input["ZeroKnowledgeProofC1List"]
-            ZeroKnowledgeProofC2List = input["ZeroKnowledgeProofC2List"]
-            C1p = ZeroKnowledgeProofC1List[i]['Cp']
-            C2p = ZeroKnowledgeProofC2List[i]['Cp']
-            # 若該次的詢問內容為0 
-            if b == 0:
-                C1_x = ZeroKnowledgeProofC1List[i]['x']
-                C1_rp = ZeroKnowledgeProofC1List[i]['rp']
-                C1p_test = Yi.encrypt(C1_x, self.status["N"], self.status["g"],C1_rp,self.q)
-
-                C2_x = ZeroKnowledgeProofC2List[i]['x']
-                C2_rp = ZeroKnowledgeProofC2List[i]['rp']
-                C2p_test = Yi.encrypt(C2_x, self.status["N"], self.status["g"],C2_rp,self.q)
-
-                if C1p_test != C1p:
-                    result = False
-                    break
-
-                if C2p_test != C2p:
-                    result = False
-                    break
-            # 若該次的詢問內容為1
-            elif b == 1:
-                C1_xp = ZeroKnowledgeProofC1List[i]['xp']
-                C1_rpp = ZeroKnowledgeProofC1List[i]['rpp']
-                C1C1p_mod_q = gmpy2.mod(gmpy2.mul(self.status['C1'], C1p), pow(self.status['N'],2))
-                C1C1p_test = Yi.encrypt(C1_xp, self.status["N"],self.status["g"],C1_rpp,self.q)
-                
-                C2_xp = ZeroKnowledgeProofC2List[i]['xp']
-                C2_rpp = ZeroKnowledgeProofC2List[i]['rpp']
-                C2C2p_mod_q = gmpy2.mod(gmpy2.mul(self.status['C2'], C2p), pow(self.status['N'],2))
-                C2C2p_test = Yi.encrypt(C2_xp, self.status["N"],self.status["g"],C2_rpp,self.q)
-
-                if C1C1p_mod_q != C1C1p_test:
-                    result = False
-                    break
-            
-                if C2C2p_mod_q != C2C2p_test:
-                    result = False
-                    break
-        return result
+        if Yi.batch_verify(equations, N, g, self.q, self.ZeroKnowledgeProofBatchSecurityBits):
+            return
+        for j, (m, l, F) in zip(revealed, equations):
+            try:
+                valid = Yi.encrypt(m, N, g, l, self.q) == F
+            except Exception:
+                valid = False
+            if not valid:
+                raise Exception("第%d個公開的l與F不符。" % j)
+
+    # 計算簽章
+    def sign(self)->int:
+        """C = (C1 * C2^d * Π F_i)^(k1^-1 mod q) * r^N mod N^2
+
+        C2^d 與 Π F_i 以同時多重冪次運算一起計算，r^N 用於重新隨機化密文。
+
+        Returns:
+            C: int，使用者解密後得到 k1^-1 * (H(m) + t * d + R * I) mod q。
+        """
+        N = gmpy2.mpz(self.status["N"])
+        N_power_2 = pow(N, 2)
+        d = PrivateKey.fromPem(self.ECDSA_PRIVATEKEY).secret
+        F_list = [self.status["F_list"][i] for i in self.status["i_list"]]
+        base = multi_powmod([self.status["C1"], self.status["C2"]] + F_list, [1, d] + [1] * len(F_list), N_power_2)
+        k1_inverse = gmpy2.invert(self.status["k1"], self.q)
+        r = RandomUnitSampler(N_power_2, rng=secure_random).sample()
+        return int(multi_powmod([base, r], [k1_inverse, N], N_power_2))
+
+    # 零知識證明驗證
+    @Instrumentation.timed("cbdc_zero_knowledge_proof_verify_seconds")
+    def zero_knowledge_proof_vefify(self, input:dict, batch:bool = None, executor:ProtocolExecutor = None, early_exit:bool = None):
+        """零知識證明驗證
+
+        預設先以小指數批次驗證一次檢查全部40條等式，
+        批次驗證失敗時才逐回合驗證，找出錯誤的回合。
+        有執行器時，回合會切成多段分散到執行器，每段各自批次驗證。
+
+        Args:
+            input: dict，使用者第二步驟的輸入。
+            batch: bool，是否使用批次驗證，預設依照 self.ZeroKnowledgeProofBatchVerify。
+            executor: ProtocolExecutor，平行驗證的執行器，預設依照 self.executor，為None時在目前執行緒驗證。
+            early_exit: bool，True時發現錯誤的回合就回傳，段內其餘的回合不再逐回合驗證，
+                        有執行器時不等待其他段，但其他子程序中已經開始的段仍會執行完畢；
+                        False時(完整稽核)驗證全部回合，預設依照 self.ZeroKnowledgeProofEarlyExit。
+
+        Returns:
+            result: bool，驗證是否通過。
+            驗證失敗的回合記錄於 self.zero_knowledge_proof_failed_rounds，第一個記錄於 self.zero_knowledge_proof_failed_round。
+        """
+        if batch is None:
+            batch = self.ZeroKnowledgeProofBatchVerify
+        if executor is None:
+            executor = self.executor
+        if early_exit is None:
+            early_exit = self.ZeroKnowledgeProofEarlyExit
+        rounds = self.zero_knowledge_proof_rounds(input)
+        parameters = (self.status["N"], self.status["g"], self.q, self.status["C1"], self.status["C2"], batch, self.ZeroKnowledgeProofBatchSecurityBits, early_exit)
+        if executor is None:
+            failures = zero_knowledge_proof_verify_rounds(parameters + (rounds,))
+        else:
+            jobs = [parameters + (chunk,) for chunk in executor.split(rounds)]
+            failures = executor.find_failures(zero_knowledge_proof_verify_rounds, jobs, early_exit)
+        self.zero_knowledge_proof_failed_rounds = failures
+        self.zero_knowledge_proof_failed_round = failures[0] if failures else None
+        return len(failures) == 0
+
+    # 取得零知識證明每回合的參數
+    def zero_knowledge_proof_rounds(self, input:dict)->list:
+        """取得零知識證明每回合的參數
 
+        Returns:
+            rounds: list，[(回合編號, b, C1的參數, C2的參數), ...]。
+        """
+        ZeroKnowledgeProofC1List = input["ZeroKnowledgeProofC1List"]
+        ZeroKnowledgeProofC2List = input["ZeroKnowledgeProofC2List"]
+        return [(i, self.status["b_list"][i], ZeroKnowledgeProofC1List[i], ZeroKnowledgeProofC2List[i]) for i in range(self.NumberOfZeroKnowledgeProofRound)]
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.hashers import BasePasswordHasher, PBKDF2PasswordHasher, check_password, make_password, mask_hash
+from django.utils.crypto import constant_time_compare
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """可以設定迭代次數的 PBKDF2-SHA256
+
+    演算法名稱與Django的 pbkdf2_sha256 相同，迭代次數記錄在雜湊中，
+    調整 PASSWORD_HASH_ITERATIONS 後，舊的雜湊仍然可以驗證，並且會在登入時以新的迭代次數重新雜湊。
+    """
+    iterations = int(os.environ.get('PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations))
+
+class UnsaltedSHA256PasswordHasher(BasePasswordHasher):
+    """舊版沒有加鹽的 SHA-256
+
+    資料庫中舊的密碼雜湊只有 SHA-256 的16進位字串，驗證時加上 unsalted_sha256$$ 前綴，
+    驗證成功後由 PasswordHashing 重新以目前的演算法雜湊。
+    """
+    algorithm = "unsalted_sha256"
+
+    def salt(self):
+        return ''
+
+    def encode(self, password, salt):
+        assert salt == ''
+        return 'unsalted_sha256$$%s' % hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+    def decode(self, encoded):
+        assert encoded.startswith('unsalted_sha256$$')
+        return {
+            'algorithm':self.algorithm,
+            'hash':encoded[len('unsalted_sha256$$'):],
+            'salt':None,
+        }
+
+    def verify(self, password, encoded):
+        return constant_time_compare(encoded, self.encode(password, ''))
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {
+            'algorithm':decoded['algorithm'],
+            'hash':mask_hash(decoded['hash']),
+        }
+
+    def harden_runtime(self, password, encoded):
+        pass
+
+class PasswordHashing:
+    """密碼雜湊
+
+    以Django的 hasher(settings.PASSWORD_HASHERS)雜湊與驗證密碼，
+    PBKDF2 是刻意耗時的運算，所以在有上限的執行緒池中執行(hashlib 運算時會釋放GIL，會同時使用多個核心)，
+    同時進行的雜湊數量不會超過執行緒數量，不會佔滿處理其他請求的執行緒。
+    執行緒池屬於每個程序，init.py 啟動多個 gunicorn worker 時以 PASSWORD_HASH_WORKERS 將核心分給每個 worker，
+    所有 worker 同時進行的雜湊總數約為CPU核心數，不會佔滿CPU。
+
+    設定可以由環境變數指定:
+        PASSWORD_HASH_ITERATIONS: PBKDF2 迭代次數，預設與Django相同。
+        PASSWORD_HASH_WORKERS: 每個程序雜湊的執行緒數量，預設為CPU核心數(init.py 設定為 max(1, CPU核心數 / worker數量))。
+
+    Attributes:
+        max_workers: int，執行緒數量。
+    """
+    LEGACY_PREFIX = "unsalted_sha256$$"
+    # 延遲統計保留的樣本數
+    SAMPLES = 1024
+
+    shared_hashing = None
+    shared_hashing_lock = threading.Lock()
+
+    def __init__(self, max_workers:int = None):
+        if max_workers is None:
+            max_workers = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+        if max_workers < 1:
+            raise Exception("執行緒數量必須大於0。")
+        self.max_workers = max_workers
+        self.executor = None
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.verifications = 0
+        self.failures = 0
+        self.rehashes = 0
+        self.hash_seconds = deque(maxlen=self.SAMPLES)
+        self.wait_seconds = deque(maxlen=self.SAMPLES)
+
+    @classmethod
+    def shared(cls):
+        """取得目前程序共用的密碼雜湊"""
+        with cls.shared_hashing_lock:
+            if cls.shared_hashing is None:
+                cls.shared_hashing = cls()
+        return cls.shared_hashing
+
+    def get_executor(self) ->ThreadPoolExecutor:
+        # fork 之後的子程序不能沿用父程序的執行緒池
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self.executor
+
+    def make(self, password:str) ->str:
+        """以目前的演算法雜湊密碼"""
+        return self.get_executor().submit(make_password, password).result()
+
+    def check(self, password:str, encoded:str, submit_time:float = None) ->tuple:
+        """驗證密碼，在執行緒池中執行
+
+        Args:
+            password: str，密碼。
+            encoded: str，資料庫中的密碼雜湊，舊版為 SHA-256 的16進位字串，None表示帳號不存在。
+            submit_time: float，送出的時間(time.perf_counter)，用於統計等待時間。
+
+        Returns:
+            (valid, new_encoded): 密碼是否正確，以及需要更新時的新雜湊(不需要時為None)。
+        """
+        start_time = time.perf_counter()
+        new_encoded = []
+        if encoded is None:
+            # 帳號不存在時仍然雜湊一次，避免由回應時間判斷帳號是否存在
+            make_password(password)
+            valid = False
+        else:
+            if '$' not in encoded:
+                encoded = self.LEGACY_PREFIX + encoded
+            valid = check_password(password, encoded, setter=lambda raw_password: new_encoded.append(make_password(raw_password)))
+        end_time = time.perf_counter()
+        with self.lock:
+            self.verifications += 1
+            self.failures += 0 if valid else 1
+            self.rehashes += 1 if new_encoded else 0
+            self.hash_seconds.append(end_time - start_time)
+            if submit_time is not None:
+                self.wait_seconds.append(start_time - submit_time)
+        return valid, (new_encoded[0] if new_encoded else None)
+
+    def verify(self, password:str, encoded:str) ->tuple:
+        """在執行緒池中驗證密碼並且等待結果，回傳值與 check 相同"""
+        return self.get_executor().submit(self.check, password, encoded, time.perf_counter()).result()
+
+    async def averify(self, password:str, encoded:str) ->tuple:
+        """verify 的非同步版本，等待時不會阻塞事件迴圈"""
+        future = self.get_executor().submit(self.check, password, encoded, time.perf_counter())
+        return await asyncio.wrap_future(future)
+
+    def metrics(self) ->dict:
+        """驗證次數與每次登入的雜湊延遲(最近 SAMPLES 次)
+
+        Returns:
+            dict，hash 為雜湊本身的秒數，wait 為在執行緒池中排隊的秒數，
+            各自包含 mean、p50、p95、max。
+        """
+        with self.lock:
+            result = {
+                "verifications":self.verifications,
+                "failures":self.failures,
+                "rehashes":self.rehashes,
+                "max_workers":self.max_workers,
+                "iterations":ConfigurablePBKDF2PasswordHasher.iterations,
+            }
+            for name, samples in (("hash", sorted(self.hash_seconds)), ("wait", sorted(self.wait_seconds))):
+                if samples:
+                    result[name] = {
+                        "mean":sum(samples) / len(samples),
+                        "p50":samples[len(samples) // 2],
+                        "p95":samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                        "max":samples[-1],
+                    }
+            return result
+
+    def shutdown(self, wait:bool = True):
+        """關閉執行緒池"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
@@ -0,0 +1,149 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+class ProtocolExecutor:
+    """盲簽章協定的平行運算執行器
+
+    將零知識證明等互相獨立的回合分散到多個子程序或執行緒，結果的順序與輸入相同。
+    gmpy2 運算時不會釋放GIL，需要多核心加速時請使用 process。
+    process 即使只有一個子程序(init.py 的預設: 每個 worker max(1, CPU核心數 / worker數量) 個)、只有一個job，
+    也交給子程序執行，運算不會在目前程序中持有GIL而阻塞同一個 worker 的事件迴圈與其他請求。
+
+    設定可以由環境變數指定:
+        PROTOCOL_EXECUTOR_KIND: serial、thread 或 process，預設 process。
+        PROTOCOL_EXECUTOR_WORKERS: 子程序或執行緒數量，預設為CPU核心數。
+
+    Attributes:
+        kind: str，serial(在目前執行緒依序執行)、thread 或 process。
+        max_workers: int，子程序或執行緒數量。
+    """
+    KINDS = ("serial", "thread", "process")
+    # 每個程序共用的執行器
+    shared_executor = None
+    shared_executor_lock = threading.Lock()
+
+    def __init__(self, kind:str = None, max_workers:int = None):
+        if kind is None:
+            kind = os.environ.get('PROTOCOL_EXECUTOR_KIND', 'process')
+        if kind not in self.KINDS:
+            raise Exception("執行器種類必須為 serial、thread 或 process。")
+        if max_workers is None:
+            max_workers = int(os.environ.get('PROTOCOL_EXECUTOR_WORKERS', os.cpu_count() or 1))
+        if max_workers < 1:
+            raise Exception("子程序或執行緒數量必須大於0。")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    @classmethod
+    def shared(cls):
+        """取得目前程序共用的執行器，設定由環境變數決定"""
+        with cls.shared_executor_lock:
+            if cls.shared_executor is None:
+                cls.shared_executor = cls()
+        return cls.shared_executor
+
+    def get_executor(self):
+        # 同時有多個請求第一次使用時只建立一個執行器
+        with self.lock:
+            # fork 之後的子程序不能沿用父程序的執行器
+            if self.executor is not None and self.pid != os.getpid():
+                self.executor = None
+            if self.executor is None:
+                self.pid = os.getpid()
+                if self.kind == "thread":
+                    self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self.executor
+
+    def split(self, items:list, chunks:int = None) ->list:
+        """將items依序切成chunks段連續的子序列，預設每個子程序或執行緒一段
+
+        每段都有固定的額外成本(例如零知識證明每段約3.5毫秒的預計算表與批次驗證)，
+        所以預設不切成比子程序更多段，代價是 find_failures 提早結束時沒有尚未開始的段可以取消。
+        """
+        if chunks is None:
+            chunks = self.max_workers
+        chunks = max(1, min(chunks, len(items)))
+        size, remainder = divmod(len(items), chunks)
+        result = []
+        start = 0
+        for i in range(chunks):
+            end = start + size + (1 if i < remainder else 0)
+            result.append(items[start:end])
+            start = end
+        return result
+
+    def inline(self, jobs:list) ->bool:
+        """是否在目前執行緒直接執行
+
+        serial 都直接執行；thread 只有一個job時交給執行緒也無法同時運算(GIL)，直接執行；
+        process 只要有job就交給子程序，目的不只是平行運算，也讓目前程序不被運算佔住GIL。
+        """
+        if self.kind == "process":
+            return not jobs
+        return self.kind == "serial" or len(jobs) <= 1
+
+    def map(self, func, jobs:list) ->list:
+        """平行執行 func(job)
+
+        Args:
+            func: 模組層級的函數(process 模式需要可以被pickle)。
+            jobs: list，每個元素為 func 的參數。
+
+        Returns:
+            results: list，順序與jobs相同。
+        """
+        if self.inline(jobs):
+            return [func(job) for job in jobs]
+        return list(self.get_executor().map(func, jobs))
+
+    def find_failures(self, func, jobs:list, early_exit:bool = True) ->list:
+        """平行執行檢查，收集失敗的項目
+
+        func(job) 回傳該job中失敗項目的list(通常為回合編號)，全部通過時回傳空list。
+
+        Args:
+            func: 模組層級的函數(process 模式需要可以被pickle)。
+            jobs: list，每個元素為 func 的參數。
+            early_exit: bool，True時任一job回報失敗就取消其他尚未開始的job並立即回傳，
+                        已經開始的job無法中斷，會在背景執行完畢後被忽略，
+                        所以只縮短等待時間，job數量不多於子程序數量時(split的預設)不會減少運算量。
+                        False時(完整稽核)執行全部job並回傳所有失敗項目。
+
+        Returns:
+            failures: list，失敗的項目，由小到大排序。early_exit 時只包含最先回報的job的失敗項目。
+        """
+        if self.inline(jobs):
+            failures = []
+            for job in jobs:
+                failures.extend(func(job))
+                if failures and early_exit:
+                    break
+            return sorted(failures)
+        executor = self.get_executor()
+        pending = set(executor.submit(func, job) for job in jobs)
+        failures = []
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    failures.extend(future.result())
+                if failures and early_exit:
+                    break
+        finally:
+            # 取消尚未開始的job，已經在執行中的job無法中斷，結果會被忽略
+            for future in pending:
+                future.cancel()
+        return sorted(failures)
+
+    def shutdown(self, wait:bool = True):
+        """關閉子程序或執行緒"""
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,225 @@
+import json
+
+class ProtocolMessageCodec:
+    """盲簽章協定訊息的編碼與解碼
+
+    協定訊息中有許多數千位元的大整數，JSON以十進位文字表示時體積大，解析也慢。
+    二進位格式以長度前綴的 big-endian 位元組表示整數，JSON 則保留作為相容格式，
+    兩者以 Content-Type 協商。
+
+    二進位格式(版本1):
+        開頭: b"CBDC" + 版本(1位元組)
+        之後為一個值，每個值以1位元組的型別開頭:
+            0x00 None
+            0x01 False
+            0x02 True
+            0x03 非負整數: 長度(varint) + big-endian 位元組
+            0x04 負整數: 絕對值的長度(varint) + big-endian 位元組
+            0x05 字串: 長度(varint) + UTF-8 位元組
+            0x06 list: 數量(varint) + 每個值
+            0x07 dict: 數量(varint) + 每組(字串鍵, 值)，鍵不含型別位元組
+        varint 為每位元組7位元、最高位元表示後面還有位元組的無號整數(LEB128)。
+    """
+    CONTENT_TYPE_JSON = "application/json"
+    CONTENT_TYPE_BINARY = "application/x-cbdc-protocol"
+
+    MAGIC = b"CBDC"
+    VERSION = 1
+
+    TYPE_NONE = 0x00
+    TYPE_FALSE = 0x01
+    TYPE_TRUE = 0x02
+    TYPE_INT = 0x03
+    TYPE_NEGATIVE_INT = 0x04
+    TYPE_STR = 0x05
+    TYPE_LIST = 0x06
+    TYPE_DICT = 0x07
+
+    @classmethod
+    def negotiate(cls, accept:str = None) ->str:
+        """依照 HTTP Accept 標頭選擇回應的格式，沒有明確接受二進位格式時使用JSON"""
+        if accept:
+            for media_range in accept.split(","):
+                parameters = [parameter.strip() for parameter in media_range.split(";")]
+                if parameters[0] != cls.CONTENT_TYPE_BINARY:
+                    continue
+                # q=0 表示不接受
+                quality = 1.0
+                for parameter in parameters[1:]:
+                    name, _, value = parameter.partition("=")
+                    if name.strip() == "q":
+                        try:
+                            quality = float(value)
+                        except ValueError:
+                            quality = 0.0
+                if quality > 0:
+                    return cls.CONTENT_TYPE_BINARY
+        return cls.CONTENT_TYPE_JSON
+
+    @classmethod
+    def encode(cls, message, content_type:str = CONTENT_TYPE_JSON):
+        """編碼協定訊息
+
+        Args:
+            message: 由 dict, list, int, str, bool, None 組成的訊息，gmpy2.mpz 視為整數。
+            content_type: str，CONTENT_TYPE_JSON 或 CONTENT_TYPE_BINARY。
+
+        Returns:
+            JSON 時回傳 str，二進位時回傳 bytes。
+        """
+        if content_type == cls.CONTENT_TYPE_BINARY:
+            buffer = bytearray(cls.MAGIC)
+            buffer.append(cls.VERSION)
+            cls.encode_value(message, buffer)
+            return bytes(buffer)
+        if content_type == cls.CONTENT_TYPE_JSON:
+            return json.dumps(message)
+        raise Exception("不支援的訊息格式: %s" % content_type)
+
+    @classmethod
+    def decode(cls, data, content_type:str = None):
+        """解碼協定訊息
+
+        Args:
+            data: str 或 bytes。
+            content_type: str，若為None則由開頭是否為 b"CBDC" 判斷格式。
+
+        Returns:
+            解碼後的訊息。
+        """
+        if content_type is None:
+            is_binary = isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:len(cls.MAGIC)]) == cls.MAGIC
+            content_type = cls.CONTENT_TYPE_BINARY if is_binary else cls.CONTENT_TYPE_JSON
+        else:
+            content_type = content_type.split(";")[0].strip()
+        if content_type == cls.CONTENT_TYPE_JSON:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                data = bytes(data).decode("utf-8")
+            return json.loads(data)
+        if content_type != cls.CONTENT_TYPE_BINARY:
+            raise Exception("不支援的訊息格式: %s" % content_type)
+        data = bytes(data)
+        if data[:len(cls.MAGIC)] != cls.MAGIC:
+            raise Exception("二進位訊息開頭錯誤。")
+        if len(data) <= len(cls.MAGIC) or data[len(cls.MAGIC)] != cls.VERSION:
+            raise Exception("不支援的二進位訊息版本。")
+        message, offset = cls.decode_value(data, len(cls.MAGIC) + 1)
+        if offset != len(data):
+            raise Exception("二進位訊息結尾有多餘的資料。")
+        return message
+
+    @classmethod
+    def encode_varint(cls, value:int, buffer:bytearray):
+        while value >= 0x80:
+            buffer.append((value & 0x7f) | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    @classmethod
+    def decode_varint(cls, data:bytes, offset:int) ->tuple:
+        value = 0
+        shift = 0
+        while True:
+            if offset >= len(data):
+                raise Exception("二進位訊息長度不足。")
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value, offset
+            shift += 7
+
+    @classmethod
+    def encode_value(cls, value, buffer:bytearray):
+        if value is None:
+            buffer.append(cls.TYPE_NONE)
+        elif value is True:
+            buffer.append(cls.TYPE_TRUE)
+        elif value is False:
+            buffer.append(cls.TYPE_FALSE)
+        elif isinstance(value, str):
+            buffer.append(cls.TYPE_STR)
+            cls.encode_bytes(value.encode("utf-8"), buffer)
+        elif isinstance(value, (list, tuple)):
+            buffer.append(cls.TYPE_LIST)
+            cls.encode_varint(len(value), buffer)
+            for item in value:
+                cls.encode_value(item, buffer)
+        elif isinstance(value, dict):
+            buffer.append(cls.TYPE_DICT)
+            cls.encode_varint(len(value), buffer)
+            for key, item in value.items():
+                if not isinstance(key, str):
+                    raise Exception("dict 的鍵必須是字串。")
+                cls.encode_bytes(key.encode("utf-8"), buffer)
+                cls.encode_value(item, buffer)
+        else:
+            # int 與 gmpy2.mpz
+            try:
+                value = int(value)
+            except TypeError:
+                raise Exception("無法編碼的型別: %s" % type(value).__name__)
+            if value < 0:
+                buffer.append(cls.TYPE_NEGATIVE_INT)
+                value = -value
+            else:
+                buffer.append(cls.TYPE_INT)
+            cls.encode_bytes(value.to_bytes((value.bit_length() + 7) // 8, "big"), buffer)
+
+    @classmethod
+    def encode_bytes(cls, value:bytes, buffer:bytearray):
+        cls.encode_varint(len(value), buffer)
+        buffer.extend(value)
+
+    @classmethod
+    def decode_bytes(cls, data:bytes, offset:int) ->tuple:
+        # 長度小於128時只有1位元組，不需要進入varint迴圈
+        if offset < len(data) and data[offset] < 0x80:
+            length = data[offset]
+            offset += 1
+        else:
+            length, offset = cls.decode_varint(data, offset)
+        end = offset + length
+        if end > len(data):
+            raise Exception("二進位訊息長度不足。")
+        return data[offset:end], end
+
+    @classmethod
+    def decode_value(cls, data:bytes, offset:int) ->tuple:
+        if offset >= len(data):
+            raise Exception("二進位訊息長度不足。")
+        value_type = data[offset]
+        offset += 1
+        if value_type == cls.TYPE_INT:
+            value, offset = cls.decode_bytes(data, offset)
+            return int.from_bytes(value, "big"), offset
+        if value_type == cls.TYPE_DICT:
+            count, offset = cls.decode_varint(data, offset)
+            result = dict()
+            decode_bytes = cls.decode_bytes
+            decode_value = cls.decode_value
+            for i in range(count):
+                key, offset = decode_bytes(data, offset)
+                result[key.decode("utf-8")], offset = decode_value(data, offset)
+            return result, offset
+        if value_type == cls.TYPE_LIST:
+            count, offset = cls.decode_varint(data, offset)
+            result = []
+            decode_value = cls.decode_value
+            for i in range(count):
+                item, offset = decode_value(data, offset)
+                result.append(item)
+            return result, offset
+        if value_type == cls.TYPE_NEGATIVE_INT:
+            value, offset = cls.decode_bytes(data, offset)
+            return -int.from_bytes(value, "big"), offset
+        if value_type == cls.TYPE_STR:
+            value, offset = cls.decode_bytes(data, offset)
+            return value.decode("utf-8"), offset
+        if value_type == cls.TYPE_NONE:
+            return None, offset
+        if value_type == cls.TYPE_FALSE:
+            return False, offset
+        if value_type == cls.TYPE_TRUE:
+            return True, offset
+        raise Exception("未知的二進位訊息型別: %d" % value_type)
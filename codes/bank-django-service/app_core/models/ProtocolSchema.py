@@ -0,0 +1,79 @@
+class ProtocolSchema:
+    """部分盲簽章協定訊息的格式
+
+    每個訊息的格式以Python的資料結構描述:
+        int: 非負整數(不接受bool)。
+        str: 字串。
+        [格式]: 每個元素都符合該格式的list。
+        {名稱: 格式}: 剛好包含這些欄位的dict。
+        (格式, 格式, ...): 符合其中一種格式。
+
+    簽署者與使用者使用同一份格式，簽署者驗證使用者的輸入，使用者驗證簽署者的輸出。
+    數量(例如零知識證明回合數)與數值範圍由各步驟自行檢查。
+    """
+    # 零知識證明單一回合公開的參數，b為0時公開(x, r')，b為1時公開(x', r'')
+    ZERO_KNOWLEDGE_PROOF_ROUND = ({"x":int, "rp":int, "Cp":int}, {"xp":int, "rpp":int, "Cp":int})
+
+    # 簽署者寄送-1: 這次簽章的 K1 = k1 * G 與 b_list
+    SIGNER_STEP1 = {"K1x":int, "K1y":int, "b_list":[int]}
+    # 使用者寄送-2: 加密的訊息、零知識證明、Yi公鑰、公開訊息 info 與 F_1 ~ F_n
+    USER_STEP2 = {
+        "C1":int,
+        "C2":int,
+        "N":int,
+        "g":int,
+        "ZeroKnowledgeProofC1List":[ZERO_KNOWLEDGE_PROOF_ROUND],
+        "ZeroKnowledgeProofC2List":[ZERO_KNOWLEDGE_PROOF_ROUND],
+        "info":str,
+        "F_list":[int],
+    }
+    # 簽署者寄送-3: 零知識證明通過，以及選擇的 i_list
+    SIGNER_STEP3 = {"code":int, "step":int, "i_list":[int]}
+    # 使用者寄送-4: 沒有被選擇的 l_j，依照索引排序
+    USER_STEP4 = {"L":[int]}
+    # 簽署者寄送-5: 簽章 C
+    SIGNER_STEP5 = {"code":int, "step":int, "C":int}
+
+    @classmethod
+    def validate(cls, value, schema, path:str = "訊息"):
+        """檢查訊息是否符合格式
+
+        Args:
+            value: 解碼後的訊息。
+            schema: 訊息的格式。
+            path: str，錯誤訊息中的欄位位置。
+
+        Returns:
+            value: 原本的訊息。
+
+        Raises:
+            Exception: 訊息不符合格式。
+        """
+        if schema is int:
+            if type(value) is not int or value < 0:
+                raise Exception("協定訊息格式錯誤，%s 必須是非負整數。" % path)
+        elif schema is str:
+            if not isinstance(value, str):
+                raise Exception("協定訊息格式錯誤，%s 必須是字串。" % path)
+        elif isinstance(schema, list):
+            if not isinstance(value, list):
+                raise Exception("協定訊息格式錯誤，%s 必須是陣列。" % path)
+            for i, item in enumerate(value):
+                cls.validate(item, schema[0], "%s[%d]" % (path, i))
+        elif isinstance(schema, dict):
+            if not isinstance(value, dict):
+                raise Exception("協定訊息格式錯誤，%s 必須是物件。" % path)
+            if set(value) != set(schema):
+                raise Exception("協定訊息格式錯誤，%s 的欄位必須是 %s。" % (path, ", ".join(sorted(schema))))
+            for name, field_schema in schema.items():
+                cls.validate(value[name], field_schema, "%s.%s" % (path, name))
+        elif isinstance(schema, tuple):
+            for alternative in schema:
+                try:
+                    return cls.validate(value, alternative, path)
+                except Exception:
+                    pass
+            raise Exception("協定訊息格式錯誤，%s 不符合任何一種格式。" % path)
+        else:
+            raise Exception("不支援的訊息格式: %r" % (schema,))
+        return value
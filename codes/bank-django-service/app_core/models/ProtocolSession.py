@@ -0,0 +1,166 @@
+import threading
+import time
+from .ProtocolMessageCodec import ProtocolMessageCodec
+from .RedisConnection import RedisConnection
+
+class ProtocolSession:
+    """盲簽章協定的狀態
+
+    每個登入Token的協定狀態存放在 db0 的 Redis hash(protocol_session:Token)，每個欄位分開存放:
+        step: 目前的步驟，十進位字串，以Lua腳本比較後前進(compare-and-set)。
+        其他欄位: 以 ProtocolMessageCodec 的二進位格式編碼(型別 + 長度 + big-endian 位元組)，
+                  數千位元的大整數不需要轉成十進位文字。
+    每個步驟只寫入改變的欄位，讀取、前進、更新期限都只需要一次Redis往返。
+    同一個步驟重複送出(例如重送或者同時送出兩次)時，只有第一個請求可以前進，其他請求失敗。
+
+    狀態的期限與登入Token相同，每次前進時一起延長。
+
+    Attributes:
+        key: str，狀態的Redis鍵。
+    """
+    KEY_PREFIX = "protocol_session:"
+    EXPIRE_SECONDS = 300
+
+    # Redis 的 Lua 5.1 為 unpack，Lua 5.2 之後(例如 fakeredis)為 table.unpack
+    # Token 不存在時回傳nil，狀態不存在時以 ARGV[2:] 建立，回傳全部欄位
+    LOAD_SCRIPT = """
+local unpack = unpack or table.unpack
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return nil
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return redis.call('HGETALL', KEYS[1])
+"""
+    # step 與 ARGV[2] 相同時寫入 ARGV[3:] 的欄位並且前進，否則回傳0
+    ADVANCE_SCRIPT = """
+local unpack = unpack or table.unpack
+if redis.call('HGET', KEYS[1], 'step') ~= ARGV[2] then
+    return 0
+end
+if #ARGV > 2 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+end
+redis.call('HSET', KEYS[1], 'step', tonumber(ARGV[2]) + 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return 1
+"""
+
+    scripts = None
+    scripts_lock = threading.Lock()
+    # 統計數據，{操作: {"count":次數, "bytes_written":寫入位元組, "bytes_read":讀取位元組, "seconds":秒數}}
+    statistics = dict()
+    statistics_lock = threading.Lock()
+
+    def __init__(self, token:str, expire_seconds:int = None):
+        if token is None:
+            raise Exception("缺少登入Token。")
+        self.token = token
+        self.key = self.KEY_PREFIX + token
+        self.expire_seconds = expire_seconds or self.EXPIRE_SECONDS
+        self.redis_connection = RedisConnection.get(RedisConnection.TOKEN_INDEX)
+
+    @classmethod
+    def get_scripts(cls, redis_connection) ->tuple:
+        with cls.scripts_lock:
+            if cls.scripts is None:
+                cls.scripts = (redis_connection.register_script(cls.LOAD_SCRIPT), redis_connection.register_script(cls.ADVANCE_SCRIPT))
+            return cls.scripts
+
+    @classmethod
+    def encode_fields(cls, fields:dict) ->list:
+        """欄位編碼為 [名稱, 值, 名稱, 值, ...]"""
+        arguments = []
+        for name, value in fields.items():
+            if name == 'step':
+                raise Exception("step 只能由 advance 改變。")
+            buffer = bytearray()
+            ProtocolMessageCodec.encode_value(value, buffer)
+            arguments.extend((name, bytes(buffer)))
+        return arguments
+
+    @classmethod
+    def decode_fields(cls, values:list) ->dict:
+        """HGETALL 的 [名稱, 值, ...] 解碼為 dict"""
+        fields = dict()
+        for i in range(0, len(values), 2):
+            name = values[i].decode('utf-8')
+            if name == 'step':
+                fields[name] = int(values[i + 1])
+            else:
+                fields[name], offset = ProtocolMessageCodec.decode_value(values[i + 1], 0)
+        return fields
+
+    @classmethod
+    def record(cls, operation:str, bytes_written:int, bytes_read:int, seconds:float):
+        with cls.statistics_lock:
+            statistics = cls.statistics.setdefault(operation, {"count":0, "bytes_written":0, "bytes_read":0, "seconds":0.0})
+            statistics["count"] += 1
+            statistics["bytes_written"] += bytes_written
+            statistics["bytes_read"] += bytes_read
+            statistics["seconds"] += seconds
+
+    @classmethod
+    def metrics(cls) ->dict:
+        """每個操作的平均Redis位元組與延遲
+
+        Returns:
+            dict，{操作: {"count", "bytes_written", "bytes_read", "mean_seconds"}}，
+            操作為 load，以及前進時的 advance_步驟(例如 advance_2 為第2步驟前進到第3步驟)。
+            位元組數為送出與收到的欄位名稱與值，不含Redis協定本身。
+        """
+        with cls.statistics_lock:
+            return {operation:{
+                "count":statistics["count"],
+                "bytes_written":statistics["bytes_written"] / statistics["count"],
+                "bytes_read":statistics["bytes_read"] / statistics["count"],
+                "mean_seconds":statistics["seconds"] / statistics["count"],
+            } for operation, statistics in cls.statistics.items()}
+
+    def load(self, initial:dict) ->dict:
+        """載入狀態，不存在時以 initial 建立第一步驟的狀態
+
+        Args:
+            initial: dict，建立狀態時的欄位，step 會設為1。
+
+        Returns:
+            dict，全部欄位。
+
+        Raises:
+            Exception: 登入Token已經不存在。
+        """
+        load_script, advance_script = self.get_scripts(self.redis_connection)
+        arguments = ['step', b'1'] + self.encode_fields(initial)
+        start_time = time.perf_counter()
+        values = load_script(keys=[self.key, self.token], args=[self.expire_seconds] + arguments, client=self.redis_connection)
+        seconds = time.perf_counter() - start_time
+        if values is None:
+            raise Exception("登入已經逾時，請重新登入。")
+        self.record("load", sum(len(argument) for argument in arguments), sum(len(value) for value in values), seconds)
+        return self.decode_fields(values)
+
+    def advance(self, step:int, fields:dict = None):
+        """寫入改變的欄位，並且從 step 前進到下一個步驟
+
+        Args:
+            step: int，目前的步驟，Redis中的步驟不同時(已經被其他請求前進)不寫入。
+            fields: dict，改變的欄位。
+
+        Raises:
+            Exception: 步驟已經被其他請求處理。
+        """
+        load_script, advance_script = self.get_scripts(self.redis_connection)
+        arguments = self.encode_fields(fields or dict())
+        start_time = time.perf_counter()
+        advanced = advance_script(keys=[self.key, self.token], args=[self.expire_seconds, step] + arguments, client=self.redis_connection)
+        seconds = time.perf_counter() - start_time
+        if not advanced:
+            raise Exception("第%d步驟已經處理過，請勿重複送出。" % step)
+        self.record("advance_%d" % step, sum(len(argument) for argument in arguments), 0, seconds)
+
+    def delete(self):
+        """刪除狀態"""
+        self.redis_connection.delete(self.key)
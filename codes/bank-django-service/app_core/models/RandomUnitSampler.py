@@ -0,0 +1,117 @@
+import random
+import gmpy2
+from math import gcd
+
+class RandomUnitSampler:
+    """隨機單位元素取樣器
+
+    從 [1, modulus) 中取樣與modulus互質的整數，也就是 Z_modulus^* 的元素。
+    利用已知的modulus因數分解判斷是否互質，不需要每次都對整個modulus計算gcd:
+        質數因數只需要取餘數檢查。
+        合數因數先去除小質數，小質數取餘數檢查，剩下的部分再計算gcd(位元數遠小於modulus)。
+        若2整除modulus，直接只取樣奇數，避免一半的候選值被拒絕。
+
+    例如:
+        N^2 的因數為 [p, q, k]。
+        phi = ((p-1)(q-1)(k-1))^2 的因數為 [p-1, q-1, k-1]。
+
+    Attributes:
+        modulus: int，模數。
+        small_primes: list，整除modulus的小質數。
+        primes: list，整除modulus的其他已知質數。
+        cofactors: list，去除小質數後仍為合數的因數。
+        rng: 隨機數來源，需要 randrange 與 getrandbits，預設為 random 模組(Mersenne Twister)，
+             簽署者等不能被預測的用途請使用 random.SystemRandom()。
+    """
+    # 試除用的小質數
+    SMALL_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97)
+
+    def __init__(self, modulus:int, factors:list = None, rng = random):
+        """
+        Args:
+            modulus: int，模數，必須大於1。
+            factors: list，modulus的因數，modulus的每個質因數都必須整除其中一個因數，預設為[modulus]。
+            rng: 隨機數來源，預設為 random 模組。
+        """
+        self.rng = rng
+        self.modulus = int(modulus)
+        if self.modulus < 2:
+            raise Exception("模數必須大於1。")
+        if factors is None:
+            factors = [self.modulus]
+        small_primes = set()
+        self.primes = []
+        self.cofactors = []
+        for factor in factors:
+            factor = int(factor)
+            for small_prime in self.SMALL_PRIMES:
+                if factor % small_prime == 0:
+                    small_primes.add(small_prime)
+                    while factor % small_prime == 0:
+                        factor //= small_prime
+            if factor == 1:
+                continue
+            if gmpy2.is_prime(factor):
+                self.primes.append(factor)
+            else:
+                self.cofactors.append(factor)
+        self.small_primes = sorted(small_primes)
+        # 只取樣奇數時，候選值為 2*v+1，v 屬於 [0, modulus//2)
+        self.odd_only = 2 in small_primes
+        if self.odd_only:
+            self.small_primes.remove(2)
+            self.span = self.modulus // 2
+        else:
+            self.span = self.modulus - 1
+        # 批次取樣時每個候選值使用的隨機位元數，多出的64位元讓取餘數的偏差可以忽略
+        self.width = self.span.bit_length() + 64
+
+    def is_unit(self, x:int) ->bool:
+        """檢查x是否與modulus互質"""
+        if self.odd_only and x % 2 == 0:
+            return False
+        for small_prime in self.small_primes:
+            if x % small_prime == 0:
+                return False
+        for prime in self.primes:
+            if x % prime == 0:
+                return False
+        for cofactor in self.cofactors:
+            if gcd(x, cofactor) != 1:
+                return False
+        return True
+
+    def candidate(self, v:int) ->int:
+        """將 [0, span) 的隨機數轉換成 [1, modulus) 的候選值"""
+        if self.odd_only:
+            return 2 * v + 1
+        return v + 1
+
+    def sample(self) ->int:
+        """取樣一個與modulus互質的隨機數"""
+        while True:
+            x = self.candidate(self.rng.randrange(self.span))
+            if self.is_unit(x):
+                return x
+
+    def sample_many(self, count:int) ->list:
+        """一次取樣count個與modulus互質的隨機數
+
+        一次取得 count * width 位元的隨機數再切開，不需要逐一呼叫 rng.randrange。
+
+        Args:
+            count: int，數量。
+
+        Returns:
+            units: list，count個與modulus互質的隨機數。
+        """
+        units = []
+        mask = (1 << self.width) - 1
+        while len(units) < count:
+            need = count - len(units)
+            block = self.rng.getrandbits(need * self.width)
+            for i in range(need):
+                x = self.candidate(((block >> (i * self.width)) & mask) % self.span)
+                if self.is_unit(x):
+                    units.append(x)
+        return units
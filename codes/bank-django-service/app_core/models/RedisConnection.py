@@ -0,0 +1,174 @@
+import asyncio
+import os
+import threading
+import weakref
+import time
+import redis
+import redis.asyncio
+from .Instrumentation import Instrumentation
+
+class CountingConnectionPool(redis.BlockingConnectionPool):
+    """會統計連線取用與建立次數的連線池"""
+    def __init__(self, *args, **kwargs):
+        self.checkouts = 0
+        self.created = 0
+        super().__init__(*args, **kwargs)
+
+    def make_connection(self):
+        self.created += 1
+        return super().make_connection()
+
+    def get_connection(self, command_name, *keys, **options):
+        self.checkouts += 1
+        return super().get_connection(command_name, *keys, **options)
+
+class InstrumentedRedis(redis.Redis):
+    """記錄每個指令耗時的Redis客戶端(Instrumentation)"""
+    def execute_command(self, *args, **options):
+        if not Instrumentation.sampled():
+            return super().execute_command(*args, **options)
+        start_time = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            Instrumentation.observe("cbdc_redis_command_seconds", time.perf_counter() - start_time,
+                command=str(args[0]).upper(), db=self.connection_pool.connection_kwargs.get("db", 0))
+
+class InstrumentedAsyncRedis(redis.asyncio.Redis):
+    """記錄每個指令耗時的非同步Redis客戶端(Instrumentation)"""
+    async def execute_command(self, *args, **options):
+        if not Instrumentation.sampled():
+            return await super().execute_command(*args, **options)
+        start_time = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            Instrumentation.observe("cbdc_redis_command_seconds", time.perf_counter() - start_time,
+                command=str(args[0]).upper(), db=self.connection_pool.connection_kwargs.get("db", 0))
+
+class RedisConnection:
+    """Redis 連線
+
+    整個程序共用的Redis連線，每個邏輯資料庫一個連線池，
+    不需要每次呼叫都建立新的 redis.Redis 與TCP連線。
+
+        db0(TOKEN_INDEX): Token 索引，Token 對應使用者資料，protocol_session:Token 為盲簽章的狀態(ProtocolSession)。
+        db1(USER_INDEX): 使用者索引，帳號對應Token。
+        db2(SPENT_COIN_INDEX): 已使用貨幣的布隆過濾器(SpentCoinRegistry)。
+
+    設定可以由環境變數指定:
+        REDIS_IP、REDIS_PASSWORD: Redis 的位址與密碼。
+        REDIS_PORT: 預設6379。
+        REDIS_MAX_CONNECTIONS: 每個連線池的最大連線數，預設50。
+        REDIS_POOL_TIMEOUT: 連線池滿時等待可用連線的秒數，預設5。
+        REDIS_SOCKET_TIMEOUT、REDIS_SOCKET_CONNECT_TIMEOUT: 讀寫與建立連線的逾時秒數，預設5。
+
+    非同步(ASGI)的請求使用 get_async 取得 redis.asyncio 的客戶端，設定與同步客戶端相同。
+
+    使用方法:
+        redis_connection = RedisConnection.get(RedisConnection.TOKEN_INDEX)
+        redis_connection = RedisConnection.get_async(RedisConnection.TOKEN_INDEX)
+    """
+    TOKEN_INDEX = 0
+    USER_INDEX = 1
+    SPENT_COIN_INDEX = 2
+    # 訂閱用的客戶端檢查連線的間隔(秒)
+    LISTENER_HEALTH_CHECK_INTERVAL = 30
+
+    pools = dict()
+    clients = dict()
+    # 事件迴圈: {db: 非同步客戶端}
+    async_clients = weakref.WeakKeyDictionary()
+    lock = threading.Lock()
+
+    @classmethod
+    def connection_kwargs(cls, db:int) ->dict:
+        """連線池的設定"""
+        return {
+            "host":os.environ['REDIS_IP'],
+            "port":int(os.environ.get('REDIS_PORT', 6379)),
+            "db":db,
+            "password":os.environ['REDIS_PASSWORD'],
+            "max_connections":int(os.environ.get('REDIS_MAX_CONNECTIONS', 50)),
+            "timeout":float(os.environ.get('REDIS_POOL_TIMEOUT', 5)),
+            "socket_timeout":float(os.environ.get('REDIS_SOCKET_TIMEOUT', 5)),
+            "socket_connect_timeout":float(os.environ.get('REDIS_SOCKET_CONNECT_TIMEOUT', 5)),
+        }
+
+    @classmethod
+    def get_pool(cls, db:int) ->CountingConnectionPool:
+        """取得該資料庫的連線池，第一次取得時建立"""
+        pool = cls.pools.get(db)
+        if pool is None:
+            with cls.lock:
+                pool = cls.pools.get(db)
+                if pool is None:
+                    pool = CountingConnectionPool(**cls.connection_kwargs(db))
+                    cls.pools[db] = pool
+        return pool
+
+    @classmethod
+    def get(cls, db:int) ->redis.Redis:
+        """取得該資料庫共用的Redis客戶端，客戶端可以在多個執行緒之間共用"""
+        client = cls.clients.get(db)
+        if client is None:
+            pool = cls.get_pool(db)
+            with cls.lock:
+                client = cls.clients.get(db)
+                if client is None:
+                    client = InstrumentedRedis(connection_pool=pool)
+                    cls.clients[db] = client
+        return client
+
+    @classmethod
+    def get_listener(cls, db:int) ->redis.Redis:
+        """建立訂閱(pubsub)專用的Redis客戶端
+
+        不使用共用的連線池，讀取沒有逾時，閒置的頻道不會因為 REDIS_SOCKET_TIMEOUT 被視為中斷，
+        以 TCP keepalive 與每 LISTENER_HEALTH_CHECK_INTERVAL 秒一次的 PING 偵測中斷。
+        使用完畢後請呼叫 close()。
+        """
+        kwargs = cls.connection_kwargs(db)
+        del kwargs["max_connections"], kwargs["timeout"]
+        kwargs.update(socket_timeout=None, socket_keepalive=True, health_check_interval=cls.LISTENER_HEALTH_CHECK_INTERVAL)
+        return redis.Redis(**kwargs)
+
+    @classmethod
+    def get_async(cls, db:int) ->redis.asyncio.Redis:
+        """取得該資料庫在目前事件迴圈共用的非同步Redis客戶端
+
+        redis.asyncio 的連線只能在建立它的事件迴圈中使用，所以每個事件迴圈各自建立連線池，
+        ASGI伺服器的每個worker只有一個事件迴圈，實際上仍然是整個程序共用。
+        必須在協程中呼叫。
+        """
+        loop = asyncio.get_event_loop()
+        clients = cls.async_clients.get(loop)
+        if clients is None:
+            # 移除已經關閉的事件迴圈(例如WSGI下 async_to_sync 每次建立的事件迴圈)的客戶端
+            for closed_loop in [key for key in list(cls.async_clients.keys()) if key.is_closed()]:
+                cls.async_clients.pop(closed_loop, None)
+            clients = cls.async_clients.setdefault(loop, dict())
+        client = clients.get(db)
+        if client is None:
+            pool = redis.asyncio.BlockingConnectionPool(**cls.connection_kwargs(db))
+            client = clients.setdefault(db, InstrumentedAsyncRedis(connection_pool=pool))
+        return client
+
+    @classmethod
+    def metrics(cls) ->dict:
+        """各資料庫連線池的統計數據
+
+        Returns:
+            dict，{db: {"checkouts":取用連線次數, "created":建立連線次數, "reuse_ratio":重複使用已建立連線的比例, "max_connections":最大連線數}}。
+        """
+        result = dict()
+        for db, pool in list(cls.pools.items()):
+            checkouts = pool.checkouts
+            created = pool.created
+            result[db] = {
+                "checkouts":checkouts,
+                "created":created,
+                "reuse_ratio":1 - created / checkouts if checkouts else 0.0,
+                "max_connections":pool.max_connections,
+            }
+        return result
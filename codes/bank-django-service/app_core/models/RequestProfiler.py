@@ -0,0 +1,274 @@
+import collections
+import itertools
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from asgiref.local import Local
+from django.core import signing
+from django.urls import Resolver404, resolve
+
+class RequestProfile:
+    """一個請求的取樣結果
+
+    Attributes:
+        path: str，請求對應的路由(RequestProfiler.route)。
+        request_id: str，請求編號。
+        stacks: Counter，{折疊後的堆疊: 取樣次數}。
+        samples: int，取樣次數。
+    """
+    def __init__(self, path:str, request_id:str):
+        self.path = path
+        self.request_id = request_id
+        self.request_thread = threading.get_ident()
+        # {執行緒: 正在執行的工作數}，請求的執行緒與 run_in_thread 交給執行緒的工作
+        self.threads = {self.request_thread:1}
+        self.lock = threading.Lock()
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.start_time = time.perf_counter()
+        self.seconds = None
+
+    def enter_thread(self):
+        ident = threading.get_ident()
+        with self.lock:
+            self.threads[ident] = self.threads.get(ident, 0) + 1
+
+    def exit_thread(self):
+        ident = threading.get_ident()
+        with self.lock:
+            if self.threads[ident] <= 1:
+                del self.threads[ident]
+            else:
+                self.threads[ident] -= 1
+
+    def wrap(self, func):
+        """回傳在其他執行緒中執行時也會被取樣的函數"""
+        def wrapper(*args, **kwargs):
+            self.enter_thread()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.exit_thread()
+        return wrapper
+
+    def sample(self, frames:dict):
+        """記錄一次取樣，frames 為 sys._current_frames() 的結果"""
+        with self.lock:
+            threads = tuple(self.threads)
+        for ident in threads:
+            frame = frames.get(ident)
+            if frame is not None:
+                root = "request" if ident == self.request_thread else "worker"
+                self.stacks[root + ";" + RequestProfiler.collapse(frame)] += 1
+        self.samples += 1
+
+    def collapsed(self) ->str:
+        """折疊堆疊格式(flamegraph.pl、speedscope)，每行為 堆疊 次數"""
+        return "".join("%s %d\n" % (stack, count) for stack, count in sorted(self.stacks.items()))
+
+class RequestProfiler:
+    """以取樣方式分析個別請求的效能
+
+    取樣執行緒每隔固定時間以 sys._current_frames() 記錄被分析請求的堆疊，
+    包含處理請求的執行緒與 run_in_thread 交給執行緒池的工作(盲簽章步驟、批次轉帳)，
+    結果以折疊堆疊的格式存放在 目錄/路由/請求編號.collapsed，可以直接轉成火焰圖。
+    目錄以URL設定中的路由區分，不是客戶端送出的路徑，沒有對應路由的請求(404)都放在 unmatched，
+    每個路由最多保留 PROFILING_MAX_FILES 個結果，超過時刪除最舊的，
+    任意路徑的請求不會建立新的目錄，取樣模式長時間執行也不會佔滿磁碟。
+    在ASGI下處理請求的執行緒為事件迴圈，取樣時也會記錄到同時處理的其他請求與等待中的事件迴圈；
+    交給 ProtocolExecutor 子程序的零知識證明驗證只會記錄到執行緒等待結果。
+    取樣執行緒需要取得GIL，gmpy2 運算時不釋放GIL，實際間隔約為 sys.getswitchinterval()(5毫秒)，
+    單一請求只有數個到數十個取樣，請合併同一路徑的多個結果，例如 cat 目錄/api_login/*.collapsed | flamegraph.pl。
+
+    設定可以由環境變數指定，兩者都未設定時 ProfilingMiddleware 不會載入:
+        PROFILING_SAMPLE_EVERY: 每N個請求分析一個，0時不依照次數分析，預設0。
+        PROFILING_SECRET: 設定時，帶有 X-Profile 標頭並且簽章正確的請求會被分析，
+                          標頭由 python manage.py sign_profile_request 路徑 產生。
+        PROFILING_SIGNATURE_MAX_AGE: X-Profile 簽章的有效秒數，預設300。
+        PROFILING_INTERVAL: 取樣間隔(秒)，預設0.001。
+        PROFILING_DIR: 存放結果的目錄，預設為暫存目錄下的 cbdc-profiles。
+        PROFILING_MAX_FILES: 每個路由保留的結果數量，預設100。
+
+    使用方法:
+        profile = RequestProfiler.start(RequestProfiler.route("/api/blind_signature"), request_id)
+        ... (run_in_thread 會以 RequestProfiler.wrap_current 包裝工作)
+        file_path = RequestProfiler.stop(profile)
+    """
+    HEADER = "X-Profile"
+    REQUEST_ID_HEADER = "X-Request-ID"
+    PROFILE_ID_HEADER = "X-Profile-Id"
+    SALT = "app_core.RequestProfiler"
+    REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+    # 沒有對應路由的請求
+    UNMATCHED = "unmatched"
+
+    sample_every = int(os.environ.get('PROFILING_SAMPLE_EVERY', 0))
+    secret = os.environ.get('PROFILING_SECRET')
+    max_age = int(os.environ.get('PROFILING_SIGNATURE_MAX_AGE', 300))
+    interval = float(os.environ.get('PROFILING_INTERVAL', 0.001))
+    directory = os.environ.get('PROFILING_DIR', os.path.join(tempfile.gettempdir(), "cbdc-profiles"))
+    max_files = int(os.environ.get('PROFILING_MAX_FILES', 100))
+
+    # 目前請求的分析，在 async_to_sync、sync_to_async 之間與協程中都可以取得
+    local = Local()
+    counter = itertools.count(1)
+    active = set()
+    lock = threading.Lock()
+    wake = threading.Event()
+    sampler = None
+    # {程式碼物件: 堆疊中的名稱}
+    labels = dict()
+
+    @classmethod
+    def enabled(cls) ->bool:
+        return cls.sample_every > 0 or bool(cls.secret)
+
+    @classmethod
+    def signer(cls) ->signing.TimestampSigner:
+        if not cls.secret:
+            raise Exception("未設定 PROFILING_SECRET，無法簽署效能分析標頭。")
+        return signing.TimestampSigner(key=cls.secret, salt=cls.SALT)
+
+    @classmethod
+    def sign(cls, path:str) ->str:
+        """產生分析 path 的 X-Profile 標頭"""
+        return cls.signer().sign(path)
+
+    @classmethod
+    def should_profile(cls, path:str, header:str = None) ->bool:
+        """是否分析這個請求，簽章錯誤或過期的標頭視為沒有標頭"""
+        if header and cls.secret:
+            try:
+                if cls.signer().unsign(header, max_age=cls.max_age) == path:
+                    return True
+            except signing.BadSignature:
+                pass
+        return cls.sample_every > 0 and next(cls.counter) % cls.sample_every == 0
+
+    @classmethod
+    def request_id(cls, header:str = None) ->str:
+        """沿用格式正確的 X-Request-ID，否則產生新的編號"""
+        if header and cls.REQUEST_ID_PATTERN.match(header):
+            return header
+        return uuid.uuid4().hex
+
+    @classmethod
+    def route(cls, path:str) ->str:
+        """path 在URL設定中對應的路由，例如 /api/login，沒有對應的路由時為 UNMATCHED"""
+        try:
+            return "/" + resolve(path).route
+        except Resolver404:
+            return cls.UNMATCHED
+
+    @classmethod
+    def current(cls) ->RequestProfile:
+        return getattr(cls.local, "profile", None)
+
+    @classmethod
+    def wrap_current(cls, func):
+        """目前的請求正在被分析時，回傳在其他執行緒中也會被取樣的函數"""
+        profile = cls.current()
+        if profile is None:
+            return func
+        return profile.wrap(func)
+
+    @classmethod
+    def start(cls, path:str, request_id:str) ->RequestProfile:
+        """開始分析目前的請求，path 為存放結果的路由(route)"""
+        profile = RequestProfile(path, request_id)
+        cls.local.profile = profile
+        with cls.lock:
+            cls.active.add(profile)
+            if cls.sampler is None:
+                cls.sampler = threading.Thread(target=cls.sample_loop, name="RequestProfiler", daemon=True)
+                cls.sampler.start()
+            cls.wake.set()
+        return profile
+
+    @classmethod
+    def stop(cls, profile:RequestProfile, save:bool = True) ->str:
+        """停止分析並且儲存結果
+
+        Returns:
+            結果的檔案路徑，save 為 False 或者無法寫入時為None。
+        """
+        with cls.lock:
+            cls.active.discard(profile)
+        profile.seconds = time.perf_counter() - profile.start_time
+        if getattr(cls.local, "profile", None) is profile:
+            del cls.local.profile
+        if not save:
+            return None
+        try:
+            return cls.save(profile)
+        except OSError as e:
+            # 分析結果無法寫入不影響請求
+            print("[效能分析] 無法儲存 %s 的結果: %s" % (profile.request_id, e), file=sys.stderr, flush=True)
+            return None
+
+    @classmethod
+    def file_path(cls, path:str, request_id:str) ->str:
+        directory = re.sub(r"[^A-Za-z0-9_.-]+", "_", path.strip("/")).strip(".") or "root"
+        return os.path.join(cls.directory, directory, request_id + ".collapsed")
+
+    @classmethod
+    def save(cls, profile:RequestProfile) ->str:
+        file_path = cls.file_path(profile.path, profile.request_id)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as output_file:
+            output_file.write(profile.collapsed())
+        cls.prune(os.path.dirname(file_path))
+        return file_path
+
+    @classmethod
+    def prune(cls, directory:str):
+        """只保留 directory 中最新的 max_files 個結果"""
+        file_paths = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".collapsed"):
+                try:
+                    file_paths.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+        file_paths.sort()
+        for mtime, file_path in file_paths[:max(0, len(file_paths) - cls.max_files)]:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                # 同時儲存的其他請求已經刪除
+                pass
+
+    @classmethod
+    def collapse(cls, frame) ->str:
+        """由最外層到 frame 的堆疊，以分號分隔每層的 函數 (檔案:行數)"""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            label = cls.labels.get(code)
+            if label is None:
+                filename = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+                label = cls.labels[code] = "%s (%s:%d)" % (code.co_name, filename, code.co_firstlineno)
+            names.append(label)
+            frame = frame.f_back
+        names.reverse()
+        return ";".join(names)
+
+    @classmethod
+    def sample_loop(cls):
+        """取樣執行緒，沒有被分析的請求時等待"""
+        while True:
+            cls.wake.wait()
+            with cls.lock:
+                profiles = tuple(cls.active)
+                if not profiles:
+                    cls.wake.clear()
+                    continue
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.sample(frames)
+            del frames
+            time.sleep(cls.interval)
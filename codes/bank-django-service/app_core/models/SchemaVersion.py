@@ -0,0 +1,11 @@
+from django.db import models
+
+# 資料庫結構版本資料表
+class SchemaVersion(models.Model):
+    """資料庫結構版本資料表
+    記錄上次啟動時 migrations 與 fixtures 的雜湊，
+    init.py 啟動時雜湊相同就略過 migrate 與 loaddata。
+    """
+    name = models.CharField(max_length=100, unique=True)
+    schema_hash = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,12 @@
+from django.db import models
+from django.utils import timezone
+
+# 已使用貨幣資料表
+class SpentCoin(models.Model):
+    """已使用貨幣資料表
+    coin_hash 為貨幣序號或簽章的 SHA-256(16進位)，作為主鍵，同一個貨幣只能寫入一次，
+    由資料庫的唯一性決定是否重複使用，SpentCoinRegistry 的布隆過濾器只用於加速查詢。
+    """
+    coin_hash = models.CharField(max_length=64, primary_key=True)
+    # 重建布隆過濾器時補上重建期間寫入的貨幣
+    spent_at = models.DateTimeField(default=timezone.now, db_index=True)
@@ -0,0 +1,245 @@
+import hashlib
+import math
+import os
+import threading
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .RedisConnection import RedisConnection
+from .SpentCoin import SpentCoin
+
+class SpentCoinRegistry:
+    """已使用貨幣的登記
+
+    付款時必須拒絕已經使用過的貨幣(序號或簽章)，SpentCoin 資料表的主鍵保證同一個貨幣只能登記一次，
+    前面以Redis的布隆過濾器(位元陣列)加速查詢:
+        過濾器回報不存在時一定沒有使用過，不需要查詢資料庫，這是付款時最常見的情況。
+        過濾器回報存在時可能是誤判，再以主鍵查詢資料庫確認。
+
+    過濾器放在Redis中，多個worker程序共用，spend 先寫入過濾器再寫入資料庫，
+    過濾器不會漏掉已經寫入資料庫的貨幣。Redis 重新啟動或者容量設定改變後過濾器不存在，
+    此時 is_spent 一律查詢資料庫，直到以 rebuild(manage.py rebuild_spent_coin_filter)重建。
+
+    設定可以由環境變數指定:
+        SPENT_COIN_FILTER_CAPACITY: 預期的貨幣數量，預設10,000,000。
+        SPENT_COIN_FILTER_ERROR_RATE: 達到預期數量時的誤判率，預設0.01。
+    位元數與雜湊數量由兩者計算，Redis 字串最多 2^32 位元(512MB)。
+
+    Attributes:
+        bits: int，位元陣列的長度。
+        hashes: int，每個貨幣設定的位元數量。
+        key: str，過濾器的Redis鍵，包含 bits 與 hashes，設定改變時使用新的鍵。
+    """
+    KEY_PREFIX = "spent_coin_filter"
+    MAX_BITS = 2 ** 32
+    REBUILD_BATCH_SIZE = 10000
+    # 上傳位元陣列時每次 SETRANGE 的位元組數
+    UPLOAD_CHUNK_SIZE = 1 << 20
+    # 重建時補上開始前這段時間內寫入的貨幣(寫入過濾器與資料庫之間的時間差)
+    REBUILD_CATCH_UP = timedelta(seconds=60)
+
+    # 過濾器不存在時回傳-1，任何一個位元為0時回傳0，否則回傳1
+    CHECK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+for i = 1, #ARGV do
+    if redis.call('GETBIT', KEYS[1], ARGV[i]) == 0 then
+        return 0
+    end
+end
+return 1
+"""
+    # 只寫入已經存在的過濾器(目前的過濾器與重建中的過濾器)，不會建立不完整的過濾器
+    ADD_SCRIPT = """
+for i = 1, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        for j = 1, #ARGV do
+            redis.call('SETBIT', KEYS[i], ARGV[j], 1)
+        end
+    end
+end
+return 1
+"""
+
+    shared_registry = None
+    shared_registry_lock = threading.Lock()
+
+    def __init__(self, capacity:int = None, error_rate:float = None, model = SpentCoin, key_prefix:str = None):
+        if capacity is None:
+            capacity = int(os.environ.get('SPENT_COIN_FILTER_CAPACITY', 10000000))
+        if error_rate is None:
+            error_rate = float(os.environ.get('SPENT_COIN_FILTER_ERROR_RATE', 0.01))
+        if capacity < 1:
+            raise Exception("布隆過濾器的容量必須大於0。")
+        if not 0 < error_rate < 1:
+            raise Exception("布隆過濾器的誤判率必須介於0與1之間。")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        if self.bits > self.MAX_BITS:
+            raise Exception("布隆過濾器超過Redis字串的上限(512MB)，請降低容量或者提高誤判率。")
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.model = model
+        self.key = "%s:%d:%d" % (key_prefix or self.KEY_PREFIX, self.bits, self.hashes)
+        self.rebuild_key = self.key + ":rebuild"
+        self.redis = RedisConnection.get(RedisConnection.SPENT_COIN_INDEX)
+        self.check_script = self.redis.register_script(self.CHECK_SCRIPT)
+        self.add_script = self.redis.register_script(self.ADD_SCRIPT)
+        self.lock = threading.Lock()
+        self.checks = 0
+        self.filter_negatives = 0
+        self.database_checks = 0
+        self.false_positives = 0
+        self.spends = 0
+        self.double_spends = 0
+
+    @classmethod
+    def shared(cls):
+        """取得目前程序共用的登記"""
+        with cls.shared_registry_lock:
+            if cls.shared_registry is None:
+                cls.shared_registry = cls()
+        return cls.shared_registry
+
+    @classmethod
+    def coin_hash(cls, coin) ->str:
+        """貨幣序號或簽章(bytes 或 str)的 SHA-256"""
+        if isinstance(coin, str):
+            coin = coin.encode('utf-8')
+        return hashlib.sha256(coin).hexdigest()
+
+    def positions(self, coin_hash:str) ->list:
+        """貨幣在位元陣列中的位置，以雜湊的前後兩段做雙重雜湊"""
+        digest = bytes.fromhex(coin_hash)
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def ready(self) ->bool:
+        """過濾器是否存在"""
+        return bool(self.redis.exists(self.key))
+
+    def is_spent(self, coin) ->bool:
+        """貨幣是否已經使用過
+
+        Args:
+            coin: bytes 或 str，貨幣序號或簽章。
+        """
+        coin_hash = self.coin_hash(coin)
+        result = self.check_script(keys=[self.key], args=self.positions(coin_hash))
+        if result == 0:
+            with self.lock:
+                self.checks += 1
+                self.filter_negatives += 1
+            return False
+        spent = self.model.objects.filter(coin_hash=coin_hash).exists()
+        with self.lock:
+            self.checks += 1
+            self.database_checks += 1
+            self.false_positives += 1 if result == 1 and not spent else 0
+        return spent
+
+    def spend(self, coin) ->bool:
+        """登記貨幣已經使用
+
+        Args:
+            coin: bytes 或 str，貨幣序號或簽章。
+
+        Returns:
+            bool，第一次使用時為True，已經使用過(重複使用)時為False。
+        """
+        coin_hash = self.coin_hash(coin)
+        # 先寫入過濾器，寫入失敗(重複使用)時多出的位元只會增加誤判，不會漏掉
+        self.add_script(keys=[self.key, self.rebuild_key], args=self.positions(coin_hash))
+        try:
+            with transaction.atomic():
+                self.model.objects.create(coin_hash=coin_hash)
+        except IntegrityError:
+            with self.lock:
+                self.double_spends += 1
+            return False
+        with self.lock:
+            self.spends += 1
+        return True
+
+    def rebuild(self, batch_size:int = None, progress = None) ->int:
+        """由資料庫重建過濾器
+
+        在記憶體中建立位元陣列後上傳，與重建期間 spend 寫入重建中過濾器的位元合併(BITOP OR)，
+        最後以 RENAME 取代目前的過濾器，重建期間目前的過濾器仍然可以使用。
+
+        Args:
+            batch_size: int，每次查詢的貨幣數量。
+            progress: 每批查詢後呼叫 progress(已處理數量)，None表示不回報。
+
+        Returns:
+            int，寫入過濾器的貨幣數量。
+
+        Raises:
+            Exception: 已經有其他程序正在重建。
+        """
+        batch_size = batch_size or self.REBUILD_BATCH_SIZE
+        lock_key = self.key + ":rebuild_lock"
+        upload_key = self.key + ":upload"
+        if not self.redis.set(lock_key, os.getpid(), nx=True, ex=3600):
+            raise Exception("布隆過濾器正在重建。")
+        try:
+            start_time = timezone.now()
+            # 預先建立重建中的過濾器，重建期間 spend 也會寫入
+            self.redis.delete(self.rebuild_key, upload_key)
+            self.redis.setbit(self.rebuild_key, self.bits - 1, 0)
+            bit_array = bytearray((self.bits + 7) // 8)
+            count = 0
+            last_hash = None
+            while True:
+                queryset = self.model.objects.order_by('coin_hash')
+                if last_hash is not None:
+                    queryset = queryset.filter(coin_hash__gt=last_hash)
+                coin_hashes = list(queryset.values_list('coin_hash', flat=True)[:batch_size])
+                if not coin_hashes:
+                    break
+                for coin_hash in coin_hashes:
+                    for position in self.positions(coin_hash):
+                        # Redis 的位元順序為每個位元組由高位元開始
+                        bit_array[position >> 3] |= 0x80 >> (position & 7)
+                count += len(coin_hashes)
+                last_hash = coin_hashes[-1]
+                if progress is not None:
+                    progress(count)
+            # 寫入過濾器與資料庫之間有時間差，補上重建開始前後寫入、但掃描時已經略過的貨幣
+            for coin_hash in self.model.objects.filter(spent_at__gte=start_time - self.REBUILD_CATCH_UP).values_list('coin_hash', flat=True).iterator():
+                for position in self.positions(coin_hash):
+                    bit_array[position >> 3] |= 0x80 >> (position & 7)
+            for offset in range(0, len(bit_array), self.UPLOAD_CHUNK_SIZE):
+                self.redis.setrange(upload_key, offset, bytes(bit_array[offset:offset + self.UPLOAD_CHUNK_SIZE]))
+            self.redis.bitop('OR', self.rebuild_key, self.rebuild_key, upload_key)
+            self.redis.rename(self.rebuild_key, self.key)
+            return count
+        finally:
+            self.redis.delete(upload_key, lock_key)
+
+    def clear(self):
+        """刪除過濾器，之後 is_spent 一律查詢資料庫"""
+        self.redis.delete(self.key, self.rebuild_key)
+
+    def metrics(self) ->dict:
+        """過濾器的統計數據
+
+        Returns:
+            dict，checks 為查詢次數，filter_negatives 為過濾器直接回報未使用(不需要查詢資料庫)的次數，
+            database_checks 為查詢資料庫的次數，false_positives 為過濾器誤判的次數，
+            spends、double_spends 為登記成功與重複使用的次數。
+        """
+        with self.lock:
+            return {
+                "bits":self.bits,
+                "hashes":self.hashes,
+                "bytes":(self.bits + 7) // 8,
+                "checks":self.checks,
+                "filter_negatives":self.filter_negatives,
+                "database_checks":self.database_checks,
+                "false_positives":self.false_positives,
+                "spends":self.spends,
+                "double_spends":self.double_spends,
+            }
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import redis
+from .RedisConnection import RedisConnection
+
+class TokenCache:
+    """登入Token的程序內快取
+
+    LoginMiddleware 每個請求都要確認Token是否存在於Redis，
+    快取短時間內確認過存在的Token，減少Redis的 EXISTS 往返。
+
+    只快取存在的Token，數量有上限，超過時淘汰最久沒有使用的Token(LRU)，每個Token在TTL秒後失效。
+    背景執行緒訂閱Redis db0的鍵空間通知(del、expired)，Token被刪除或到期時立即從快取移除；
+    訂閱使用專用的連線(RedisConnection.get_listener)，閒置時不會逾時，只有連線中斷時才清空快取並且重新訂閱。
+    若Redis沒有開啟鍵空間通知或者訂閱中斷，快取最多只會比Redis晚TTL秒。
+    Redis 需要設定 notify-keyspace-events 包含 E、g、x (例如 "Egx")。
+
+    設定可以由環境變數指定:
+        TOKEN_CACHE_TTL: 快取秒數，預設5，設為0時停用快取。
+        TOKEN_CACHE_SIZE: 最多快取的Token數量，預設10000。
+
+    Args:
+        ttl: float，快取秒數，None時由環境變數決定。
+        max_size: int，最多快取的Token數量，None時由環境變數決定。
+        listen: bool，是否訂閱Redis鍵空間通知。
+
+    Attributes:
+        hits: int，快取命中次數。
+        misses: int，快取未命中而查詢Redis的次數。
+        skipped: int，不需要登入的頁面略過驗證的次數。
+        invalidations: int，因為Redis通知而移除的Token數量。
+        disconnects: int，訂閱的連線中斷而清空快取的次數。
+    """
+    # 等待通知的秒數，逾時只是沒有通知，不會重新連線
+    POLL_SECONDS = 1.0
+    # 訂閱的鍵空間事件
+    EVENTS = ("__keyevent@%d__:del", "__keyevent@%d__:expired", "__keyevent@%d__:unlink")
+
+    shared_cache = None
+    shared_cache_lock = threading.Lock()
+
+    def __init__(self, ttl:float = None, max_size:int = None, listen:bool = True):
+        self.ttl = ttl if ttl is not None else float(os.environ.get('TOKEN_CACHE_TTL', 5))
+        self.max_size = max_size if max_size is not None else int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+        self.tokens = OrderedDict() # token: 失效時間
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.invalidations = 0
+        self.disconnects = 0
+        self.listen_enabled = listen
+        # 已經訂閱鍵空間通知
+        self.subscribed = threading.Event()
+        self.listener = None
+        self.listener_pid = None
+
+    @classmethod
+    def shared(cls):
+        """取得目前程序共用的Token快取"""
+        with cls.shared_cache_lock:
+            if cls.shared_cache is None:
+                cls.shared_cache = cls()
+        return cls.shared_cache
+
+    @property
+    def enabled(self) ->bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, token:str) ->bool:
+        """Token是否在快取中且尚未失效"""
+        if not self.enabled:
+            return False
+        self.start_listener()
+        now = time.monotonic()
+        with self.lock:
+            expire_time = self.tokens.get(token)
+            if expire_time is not None and expire_time > now:
+                self.tokens.move_to_end(token)
+                self.hits += 1
+                return True
+            if expire_time is not None:
+                del self.tokens[token]
+            self.misses += 1
+            return False
+
+    def put(self, token:str):
+        """將確認存在的Token加入快取"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.tokens[token] = time.monotonic() + self.ttl
+            self.tokens.move_to_end(token)
+            while len(self.tokens) > self.max_size:
+                self.tokens.popitem(last=False)
+
+    def invalidate(self, token:str):
+        """移除Token"""
+        with self.lock:
+            if self.tokens.pop(token, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.tokens.clear()
+
+    def record_skip(self):
+        """記錄一次略過的驗證"""
+        with self.lock:
+            self.skipped += 1
+
+    def start_listener(self):
+        """啟動訂閱Redis鍵空間通知的背景執行緒，fork 之後的子程序會重新啟動"""
+        if not self.listen_enabled or self.listener_pid == os.getpid():
+            return
+        with self.lock:
+            if self.listener_pid == os.getpid():
+                return
+            self.listener_pid = os.getpid()
+            # fork 前快取的Token可能已經被刪除
+            self.tokens.clear()
+        self.listener = threading.Thread(target=self.listen, name="TokenCacheListener", daemon=True)
+        self.listener.start()
+
+    def listen(self):
+        db = RedisConnection.TOKEN_INDEX
+        while True:
+            # 專用的連線，閒置的頻道不會逾時
+            client = RedisConnection.get_listener(db)
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(*[event % db for event in self.EVENTS])
+                # 重新訂閱前可能漏掉了通知
+                self.clear()
+                self.subscribed.set()
+                while True:
+                    message = pubsub.get_message(timeout=self.POLL_SECONDS)
+                    if message is None:
+                        continue
+                    token = message["data"]
+                    if isinstance(token, bytes):
+                        token = token.decode("utf-8")
+                    self.invalidate(token)
+            except redis.RedisError:
+                # 連線中斷，中斷期間可能漏掉了通知
+                self.subscribed.clear()
+                with self.lock:
+                    self.disconnects += 1
+                self.clear()
+                time.sleep(1)
+            finally:
+                client.close()
+
+    def metrics(self) ->dict:
+        """快取的統計數據"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size":len(self.tokens),
+                "hits":self.hits,
+                "misses":self.misses,
+                "hit_ratio":self.hits / lookups if lookups else 0.0,
+                "skipped":self.skipped,
+                "saved_round_trips":self.hits + self.skipped,
+                "invalidations":self.invalidations,
+                "disconnects":self.disconnects,
+            }
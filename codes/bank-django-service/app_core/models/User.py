@@ -6,5 +6,6 @@ class User(models.Model):
     未完成
     撰寫: 蕭維均
     """
-    account = models.CharField(max_length=100)
+    # 帳號唯一，登入時以帳號的索引查詢
+    account = models.CharField(max_length=100, unique=True)
     password_hash = models.CharField(max_length=100)
\ No newline at end of file
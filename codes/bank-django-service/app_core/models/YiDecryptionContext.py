@@ -0,0 +1,70 @@
+import gmpy2
+from functools import lru_cache
+
+class YiDecryptionContext:
+    """Yi同態解密的CRT加速
+
+    持有私鑰的一方知道 N = p*q*k，可以分別在 p^2, q^2, k^2 底下運算，不需要在 N^2 底下計算完整的 C^λ，
+    其中 λ = (p-1)(q-1)(k-1)。
+
+    合法的密文 C = g^m * r^N，g = (1+N)^(p*k)，所以
+        D = C^λ = 1 + N*p*k*m*λ (mod N^2)
+    由於 N*p*k = p^2 * q * k^2，D 在 p^2 與 k^2 底下恆為1，只有 q^2 的分量帶有m:
+        D mod q^2 = 1 + q * (p^2 * k^2 * m * λ mod q)
+    因此 CRT 合併後的結果只需要 q^2 的分量，
+        m = L_q(C^λ mod q^2) * h_q mod q，L_q(x) = (x-1)/q
+    其中 h_q = (p^2 * k^2 * λ)^(-1) mod q 為 Hensel lifting 的常數，
+    指數 λ 在 q^2 底下也可以先對 Z_{q^2}^* 的階 q(q-1) 取餘數。
+
+    與 N^2 底下計算相比，模數的位元數變為1/3，指數約為2/3。
+
+    Attributes:
+        p: gmpy2.mpz，私鑰的一部分。
+        k: gmpy2.mpz，私鑰的一部分。
+        q: gmpy2.mpz，ECDSA中橢圓曲線的Order。
+        N: gmpy2.mpz，公鑰的一部分。
+        q_power_2: gmpy2.mpz，q^2。
+        exponent_q: gmpy2.mpz，λ mod q(q-1)。
+        h_q: gmpy2.mpz，(p^2 * k^2 * λ)^(-1) mod q。
+    """
+    def __init__(self, p:int, k:int, q:int, N:int):
+        if (p == 0) or (k == 0) or (q == 0) or (N == 0):
+            raise Exception("請輸入正確的私鑰對與隨機數。")
+        self.p, self.k, self.q, self.N = gmpy2.mpz(p), gmpy2.mpz(k), gmpy2.mpz(q), gmpy2.mpz(N)
+        if self.p * self.q * self.k != self.N:
+            raise Exception("N 必須等於 p*q*k。")
+        lambda_N = gmpy2.mul(gmpy2.mul(self.p-1, self.q-1), self.k-1)
+        self.q_power_2 = pow(self.q, 2)
+        self.exponent_q = gmpy2.mod(lambda_N, gmpy2.mul(self.q, self.q-1))
+        self.h_q = gmpy2.invert(gmpy2.mod(gmpy2.mul(pow(gmpy2.mul(self.p, self.k), 2), lambda_N), self.q), self.q)
+
+    def decrypt(self, C:int) ->int:
+        """解密
+
+        Args:
+            C: int，密文。
+
+        Returns:
+            m: int，明文。
+        """
+        if C == 0:
+            raise Exception("必須輸入密文")
+        D_q = gmpy2.powmod(gmpy2.mod(gmpy2.mpz(C), self.q_power_2), self.exponent_q, self.q_power_2)
+        m = gmpy2.mod(gmpy2.mul((D_q-1)//self.q, self.h_q), self.q)
+        return int(m)
+
+    def decrypt_many(self, C_list:list) ->list:
+        """批次解密
+
+        Args:
+            C_list: list，密文。
+
+        Returns:
+            m_list: list，明文，順序與密文相同。
+        """
+        return [self.decrypt(C) for C in C_list]
+
+@lru_cache(maxsize=128)
+def get_decryption_context(p:int, k:int, q:int, N:int) ->YiDecryptionContext:
+    """取得一組私鑰的解密context，相同私鑰重複使用已經計算好的常數"""
+    return YiDecryptionContext(p, k, q, N)
@@ -0,0 +1,93 @@
+import gmpy2
+
+class YiFixedBasePrecomputation:
+    """Yi同態加密的固定底數預計算表
+
+    同一組公鑰(N, g)底下的所有加密都會計算 g^m mod N^2，
+    因此預先建立視窗表 table[i][j] = g^(j * 2^(window*i)) mod N^2，
+    之後每次計算 g^m 只需要依照m的每個視窗查表相乘，不需要再做平方運算。
+
+    以 secp256k1 的 q(256位元) 與視窗大小4為例，建表需要約1024次模乘法，
+    之後每次 g^m 最多只需要64次模乘法。
+
+    Attributes:
+        N: gmpy2.mpz，公鑰的一部分。
+        g: gmpy2.mpz，公鑰的一部分。
+        N_power_2: gmpy2.mpz，N^2。
+        max_bits: int，預計算表可以處理的m最大位元數，通常為q的位元數。
+        window: int，視窗大小(位元)。
+        table: list，預計算表。
+    """
+    def __init__(self, g:int, N:int, max_bits:int, window:int = 4):
+        if (N == 0) or (g == 0):
+            raise Exception("請輸入正確的公鑰對。")
+        if window < 1:
+            raise Exception("視窗大小必須大於0。")
+        self.N = gmpy2.mpz(N)
+        self.g = gmpy2.mpz(g)
+        self.N_power_2 = pow(self.N, 2)
+        self.max_bits = int(max_bits)
+        self.window = int(window)
+        self.table = self.build_table()
+
+    def build_table(self) ->list:
+        """建立預計算表
+
+        Returns:
+            table: list，table[i][j] = g^(j * 2^(window*i)) mod N^2。
+        """
+        table = []
+        base = self.g # g^(2^(window*i))
+        rows = (self.max_bits + self.window - 1) // self.window
+        for i in range(rows):
+            row = [gmpy2.mpz(1), base]
+            for j in range(2, 1 << self.window):
+                row.append(gmpy2.mod(gmpy2.mul(row[-1], base), self.N_power_2))
+            table.append(row)
+            base = gmpy2.mod(gmpy2.mul(row[-1], base), self.N_power_2)
+        return table
+
+    def matches(self, N:int, g:int) ->bool:
+        """檢查預計算表是否屬於該組公鑰"""
+        return self.N == N and self.g == g
+
+    def powmod(self, m:int):
+        """查表計算 g^m mod N^2
+
+        超出預計算表範圍的m(負數或位元數過長)會退回使用 gmpy2.powmod。
+
+        Args:
+            m: int，指數。
+
+        Returns:
+            gmpy2.mpz，g^m mod N^2。
+        """
+        m = int(m)
+        if m < 0 or m.bit_length() > self.max_bits:
+            return gmpy2.powmod(self.g, m, self.N_power_2)
+        result = gmpy2.mpz(1)
+        mask = (1 << self.window) - 1
+        i = 0
+        while m:
+            digit = m & mask
+            if digit:
+                result = gmpy2.mod(gmpy2.mul(result, self.table[i][digit]), self.N_power_2)
+            m >>= self.window
+            i += 1
+        return result
+
+    def encrypt(self, m:int, r:int) ->int:
+        """使用預計算表進行Yi的同態加密
+
+        C = [(g^m mod N^2) * (r^N mod N^2)] mod N^2，結果與 YiModifiedPaillierEncryptionPy.encrypt 相同。
+
+        Args:
+            m: int，要加密的訊息。
+            r: int，是個特定的隨機數。
+
+        Returns:
+            C: int，密文。
+        """
+        r = gmpy2.mpz(r)
+        C = gmpy2.mod(self.powmod(m) * gmpy2.powmod(r, self.N, self.N_power_2), self.N_power_2)
+        return int(C)
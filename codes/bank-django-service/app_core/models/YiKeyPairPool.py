@@ -0,0 +1,165 @@
+import os
+import random
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from .YiModifiedPaillierEncryptionPy import YiModifiedPaillierEncryptionPy
+
+# 已經重新設定亂數種子的子程序
+seeded_pid = None
+
+def generate_keypair(q:int) ->tuple:
+    """生成一組Yi的鑰匙，使用目前程序的亂數狀態
+
+    Args:
+        q: int，ECDSA中橢圓曲線的Order。
+
+    Returns:
+        (p, k, N, g): tuple，p, k 為私鑰，N, g 為公鑰。
+    """
+    Yi = YiModifiedPaillierEncryptionPy()
+    p, k = Yi.generate_p_k(q)
+    N, g = Yi.generate_N_g()
+    return (p, k, N, g)
+
+def generate_keypair_in_worker(q:int) ->tuple:
+    """在子程序中生成一組Yi的鑰匙
+
+    子程序由fork產生時會繼承相同的亂數狀態，每個子程序第一次生成前重新設定亂數種子。
+    只在子程序中重新設定，不影響請求程序的 random(例如固定種子的測試)。
+    Python 3.6 的 ProcessPoolExecutor 沒有 initializer，所以依照pid判斷是否已經設定。
+    """
+    global seeded_pid
+    if seeded_pid != os.getpid():
+        random.seed(os.urandom(32))
+        seeded_pid = os.getpid()
+    return generate_keypair(q)
+
+class YiKeyPairPool:
+    """Yi鑰匙池
+
+    生成Yi的鑰匙需要搜尋兩個質數，是使用者端盲簽章流程中最耗時的步驟。
+    鑰匙池在背景的 ProcessPoolExecutor 中預先生成 (p, k, N, g)，
+    取用時直接從佇列取出，數量低於補充水位時自動在背景補充到目標數量。
+    鑰匙池是空的時候(未命中)，改為在目前程序同步生成一組鑰匙，使用目前程序的亂數狀態。
+
+    設定可以由環境變數指定:
+        YI_KEYPAIR_POOL_SIZE: 目標數量，預設8。
+        YI_KEYPAIR_POOL_WATERMARK: 補充水位，預設4。
+        YI_KEYPAIR_POOL_WORKERS: 子程序數量，預設為CPU核心數。
+
+    Attributes:
+        q: int，ECDSA中橢圓曲線的Order。
+        target_size: int，鑰匙池的目標數量。
+        refill_watermark: int，數量低於此值時開始補充。
+        max_workers: int，子程序數量。
+        hits: int，從鑰匙池取得鑰匙的次數。
+        misses: int，鑰匙池是空的而同步生成的次數。
+    """
+    # 每個程序、每個q共用的鑰匙池
+    shared_pools = dict()
+    shared_pools_lock = threading.Lock()
+
+    def __init__(self, q:int, target_size:int = None, refill_watermark:int = None, max_workers:int = None):
+        if q == 0:
+            raise Exception("必須輸入來自 ECDSA 的 Order q")
+        self.q = int(q)
+        self.target_size = target_size if target_size is not None else int(os.environ.get('YI_KEYPAIR_POOL_SIZE', 8))
+        self.refill_watermark = refill_watermark if refill_watermark is not None else int(os.environ.get('YI_KEYPAIR_POOL_WATERMARK', 4))
+        if max_workers is None and 'YI_KEYPAIR_POOL_WORKERS' in os.environ:
+            max_workers = int(os.environ['YI_KEYPAIR_POOL_WORKERS'])
+        self.max_workers = max_workers
+        if self.refill_watermark > self.target_size:
+            raise Exception("補充水位不可以大於目標數量。")
+        self.keypairs = deque()
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.executor = None
+        self.executor_lock = threading.Lock()
+        self.pid = os.getpid()
+
+    @classmethod
+    def shared(cls, q:int):
+        """取得目前程序共用的鑰匙池，第一次取得時開始在背景生成鑰匙"""
+        with cls.shared_pools_lock:
+            pool = cls.shared_pools.get(int(q))
+            # fork 之後的子程序不能沿用父程序的 ProcessPoolExecutor
+            if pool is None or pool.pid != os.getpid():
+                pool = cls(q)
+                cls.shared_pools[int(q)] = pool
+                pool.refill()
+        return pool
+
+    def get_executor(self) ->ProcessPoolExecutor:
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self.executor
+
+    def refill(self):
+        """在背景補充鑰匙到目標數量"""
+        with self.lock:
+            need = self.target_size - len(self.keypairs) - self.pending
+            if need <= 0:
+                return
+            self.pending += need
+        executor = self.get_executor()
+        for i in range(need):
+            future = executor.submit(generate_keypair_in_worker, self.q)
+            future.add_done_callback(self.on_generated)
+
+    def on_generated(self, future):
+        with self.lock:
+            self.pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.errors += 1
+            else:
+                self.keypairs.append(future.result())
+                self.generated += 1
+
+    def acquire(self) ->tuple:
+        """取出一組鑰匙
+
+        Returns:
+            (p, k, N, g): tuple，p, k 為私鑰，N, g 為公鑰。
+        """
+        with self.lock:
+            if self.keypairs:
+                keypair = self.keypairs.popleft()
+                self.hits += 1
+            else:
+                keypair = None
+                self.misses += 1
+            low = len(self.keypairs) < self.refill_watermark
+        if low:
+            self.refill()
+        if keypair is None:
+            keypair = generate_keypair(self.q)
+        return keypair
+
+    def metrics(self) ->dict:
+        """鑰匙池的統計數據"""
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "size":len(self.keypairs),
+                "pending":self.pending,
+                "target_size":self.target_size,
+                "refill_watermark":self.refill_watermark,
+                "hits":self.hits,
+                "misses":self.misses,
+                "hit_ratio":self.hits / requests if requests else 0.0,
+                "generated":self.generated,
+                "errors":self.errors,
+            }
+
+    def shutdown(self, wait:bool = True):
+        """關閉背景的子程序"""
+        with self.executor_lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
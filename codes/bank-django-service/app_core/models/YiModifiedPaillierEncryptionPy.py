@@ -5,7 +5,11 @@ from math import gcd
 import json
 from base64 import b64encode, b64decode
 from binascii import hexlify, unhexlify
-from copy import deepcopy
+from .YiFixedBasePrecomputation import YiFixedBasePrecomputation
+from .MultiExponentiation import multi_powmod
+from .RandomUnitSampler import RandomUnitSampler
+from .YiDecryptionContext import get_decryption_context
+from .Instrumentation import Instrumentation
 
 class YiModifiedPaillierEncryptionPy:
     """Yi's modified paillier encryptionPy
@@ -25,6 +29,7 @@ class YiModifiedPaillierEncryptionPy:
         N: int，公鑰的一部分。
         g: int，公鑰的一部分。
         r: int，一個混淆用的隨機數值，若該數值密文改變，但仍可以用同一組私鑰解開。
+        fixed_base: YiFixedBasePrecomputation，目前公鑰的固定底數預計算表，呼叫 enable_fixed_base 後才會建立。
     """
     def __init__(self):
         gmpy2.get_context().precision = 10**5 #浮點數精度設置，當q值與要加密的數值過大時，若出現運算尾數不精確，請調大該數值分配更多記憶體用於儲存浮點數。
@@ -34,6 +39,7 @@ class YiModifiedPaillierEncryptionPy:
         self.N = gmpy2.mpz(0)
         self.g = gmpy2.mpz(0)
         self.r = gmpy2.mpz(0)
+        self.fixed_base = None
 
     def random_prime_in_range(self, min:int, max:int) ->int:
         """生成一定範圍的一個質數
@@ -152,8 +158,12 @@ class YiModifiedPaillierEncryptionPy:
         """
         if N == 0:
             N = self.N
-        r = 0
-        r = self.find_random_co_prime(pow(N,2))
+        # 若為自己的公鑰，已知 N^2 的質因數為 p, q, k
+        if (N == self.N) and (self.p != 0) and (self.q != 0) and (self.k != 0):
+            sampler = RandomUnitSampler(pow(N,2), [self.p, self.q, self.k])
+        else:
+            sampler = RandomUnitSampler(pow(N,2), [N])
+        r = sampler.sample()
         self.r = gmpy2.mpz(r)
         return r
 
@@ -172,14 +182,10 @@ class YiModifiedPaillierEncryptionPy:
         Raises:
             (無錯誤回傳)
         """
-        result = random.randrange(deepcopy(n)) #尋找極限以下的隨機數
-        while gcd(n,result) != 1: # 當與n不互質時
-            result += 1 # 往下個數值進行線性搜索。
-            if result > n : # 若結果不小心大於目標
-                result = random.randrange(deepcopy(n)) #重新尋找隨機數
-        return result
+        return RandomUnitSampler(n).sample()
 
 
+    @Instrumentation.timed("cbdc_yi_seconds", operation="encrypt")
     def encrypt(self, m:int=0, N:int=0, g:int=0 ,r:int=0, q:int=0):
         """Yi的同態加密
 
@@ -205,12 +211,86 @@ class YiModifiedPaillierEncryptionPy:
             raise Exception("輸入q值才可對於密文是否過長進行驗證。")
         if m > q:
             raise Exception("加密失敗，因為密文過長，可以嘗試加大q值，以容納更長的密文。")
+        # 若已經為該組公鑰建立預計算表，則查表計算 g^m
+        if (self.fixed_base is not None) and self.fixed_base.matches(N, g):
+            return self.fixed_base.encrypt(m, r)
         N, g, r, m= gmpy2.mpz(N), gmpy2.mpz(g), gmpy2.mpz(r), gmpy2.mpz(m)
         N_power_2 = pow(N,2)
         # 此處將算式改為 C = [(g^m mod N^2) * (r^N mod N^2)] mod N^2 ，防止數值過大導致的記憶體占滿，或者速度緩慢。
-        C = gmpy2.mod(gmpy2.powmod(g, m, N_power_2) * gmpy2.powmod(r, N, N_power_2), N_power_2)
+        # g^m * r^N 以同時多重冪次運算計算
+        C = multi_powmod([g, r], [m, N], N_power_2)
         return int(C)
 
+    def enable_fixed_base(self, N:int=0, g:int=0, q:int=0, window:int=4):
+        """為一組公鑰建立固定底數預計算表
+
+        同一組公鑰需要加密多次時(例如零知識證明約80次加密)，
+        先建立預計算表，之後該公鑰的 encrypt 會查表計算 g^m。
+
+        Args:
+            N: int，公鑰的一部分，預設使用目前的公鑰。
+            g: int，公鑰的一部分，預設使用目前的公鑰。
+            q: int，m的上限，決定預計算表的位元數，預設使用目前的q。
+            window: int，視窗大小(位元)。
+
+        Returns:
+            fixed_base: YiFixedBasePrecomputation，預計算表。
+
+        Raises:
+            (無錯誤回傳)
+        """
+        if (N == 0) or (g == 0) or (q == 0):
+            N = self.N
+            g = self.g
+            q = self.q
+        if q == 0:
+            raise Exception("必須輸入來自 ECDSA 的 Order q")
+        if (self.fixed_base is None) or not self.fixed_base.matches(N, g):
+            self.fixed_base = YiFixedBasePrecomputation(g, N, gmpy2.mpz(q).bit_length(), window)
+        return self.fixed_base
+
+    @Instrumentation.timed("cbdc_yi_seconds", operation="batch_verify")
+    def batch_verify(self, equations:list, N:int=0, g:int=0, q:int=0, security_bits:int=64) ->bool:
+        """小指數批次驗證多組加密等式
+
+        一次驗證多組 Enc(m_i, r_i) == C_i。
+        為每組等式選擇隨機的小指數s_i，只檢查一條等式:
+            g^(Σ s_i*m_i) * (Π r_i^s_i)^N == Π C_i^s_i (mod N^2)
+        若其中有任一組等式不成立，批次檢查通過的機率約為 2^(-security_bits)。
+        差異只落在 Z_{N^2}^* 小階數子群的等式可能無法被偵測，這類差異在解密時的 C^((p-1)(q-1)(k-1)) 也會被消去。
+
+        Args:
+            equations: list，[(m_i, r_i, C_i), ...]。
+            N: int，公鑰的一部分。
+            g: int，公鑰的一部分。
+            q: int，m的上限。
+            security_bits: int，隨機小指數的位元數。
+
+        Returns:
+            bool，全部等式成立時回傳True。
+            若有無法加密的輸入(m不在1到q之間或r不是正整數)也回傳False，交由逐一驗證處理。
+
+        Raises:
+            (無錯誤回傳)
+        """
+        if (N == 0) or (g == 0) or (q == 0):
+            raise Exception("請輸入正確的公鑰對與q值。")
+        N, g = gmpy2.mpz(N), gmpy2.mpz(g)
+        N_power_2 = pow(N,2)
+        exponent_sum = gmpy2.mpz(0)
+        s_list = []
+        for m, r, C in equations:
+            if (m <= 0) or (m > q) or (r <= 0):
+                return False
+            s = random.randrange(1, 2**security_bits)
+            s_list.append(s)
+            exponent_sum += gmpy2.mul(s, m)
+        # Π r_i^s_i 與 Π C_i^s_i 的所有底數共用平方運算
+        r_product = multi_powmod([r for m, r, C in equations], s_list, N_power_2)
+        C_product = multi_powmod([C for m, r, C in equations], s_list, N_power_2)
+        left = multi_powmod([g, r_product], [exponent_sum, N], N_power_2)
+        return left == C_product
+
     def encrypt_string(self, m:str=0, N:int=0, g:int=0 ,r:int=0, q:int=0):
         """Yi的同態加密字串
 
@@ -234,7 +314,8 @@ class YiModifiedPaillierEncryptionPy:
         C = self.encrypt(m, N, g, r, q)
         return C
 
-    def decrypt(self, C:int=0, p:int = 0, k:int = 0, q:int = 0, N:int=0):
+    @Instrumentation.timed("cbdc_yi_seconds", operation="decrypt")
+    def decrypt(self, C:int=0, p:int = 0, k:int = 0, q:int = 0, N:int=0, crt:bool = True):
         """Yi的同態解密
 
         進行同態加密的解密。
@@ -245,6 +326,7 @@ class YiModifiedPaillierEncryptionPy:
             q: int，隨機質數。
             C: int，密文
             N: int，公鑰
+            crt: bool，使用已知的 p, q, k 以CRT加速解密(YiDecryptionContext)，False時在N^2底下直接計算。
 
         Returns:
             m: int，明文。
@@ -256,6 +338,8 @@ class YiModifiedPaillierEncryptionPy:
             raise Exception("請輸入正確的私鑰對與隨機數。")
         if C == 0:
             raise Exception("必須輸入密文")
+        if crt:
+            return get_decryption_context(p, k, q, N).decrypt(C)
         p, k, q, C, N= gmpy2.mpz(p), gmpy2.mpz(k), gmpy2.mpz(q), gmpy2.mpz(C), gmpy2.mpz(N)
         N_power_2 = pow(N,2)
         temp_numner1 = gmpy2.mul(gmpy2.mul(p-1, q-1), k-1)
@@ -264,6 +348,29 @@ class YiModifiedPaillierEncryptionPy:
         m = gmpy2.mod(gmpy2.mul(temp_numner2 ,gmpy2.invert(temp_numner1, q)) , q)
         return int(m)
 
+    @Instrumentation.timed("cbdc_yi_seconds", operation="decrypt_many")
+    def decrypt_many(self, C_list:list, p:int = 0, k:int = 0, q:int = 0, N:int=0):
+        """Yi的同態批次解密
+
+        以同一組私鑰解密多個密文，共用同一個CRT解密context。
+
+        Args:
+            C_list: list，密文。
+            p: int，私鑰的一部分。
+            k: int，私鑰的一部分。
+            q: int，隨機質數。
+            N: int，公鑰
+
+        Returns:
+            m_list: list，明文，順序與密文相同。
+
+        Raises:
+            (無錯誤回傳)
+        """
+        if (p == 0) or (k == 0) or (q == 0) or (N == 0):
+            raise Exception("請輸入正確的私鑰對與隨機數。")
+        return get_decryption_context(p, k, q, N).decrypt_many(C_list)
+
     def decrypt_string(self, C:int=0, p:int = 0, k:int = 0, q:int = 0, N:int=0):
         m = self.decrypt(C, p, k, q, N)
         hex_int = "{0:x}".format(m)
@@ -273,6 +380,7 @@ class YiModifiedPaillierEncryptionPy:
         m = bytes_string.decode("utf-8")
         return m
 
+    @Instrumentation.timed("cbdc_yi_seconds", operation="generate_keypairs")
     def generate_keypairs(self, q:int=0):
         """生成鑰匙對與隨機值
 
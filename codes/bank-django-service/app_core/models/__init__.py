@@ -5,4 +5,24 @@ from .Currency import Currency
 from .Login import Login
 from .YiModifiedPaillierEncryptionPy import YiModifiedPaillierEncryptionPy
 from .PartiallyBlindSignatureClientInterface import PartiallyBlindSignatureClientInterface
-from .PartiallyBlindSignatureServerInterface import PartiallyBlindSignatureServerInterface
\ No newline at end of file
+from .PartiallyBlindSignatureServerInterface import PartiallyBlindSignatureServerInterface
+from .YiFixedBasePrecomputation import YiFixedBasePrecomputation
+from .YiKeyPairPool import YiKeyPairPool
+from .RandomUnitSampler import RandomUnitSampler
+from .YiDecryptionContext import YiDecryptionContext
+from .ProtocolExecutor import ProtocolExecutor
+from .ProtocolMessageCodec import ProtocolMessageCodec
+from .RedisConnection import RedisConnection
+from .TokenCache import TokenCache
+from .SchemaVersion import SchemaVersion
+from .PasswordHashing import PasswordHashing
+from .DatabaseConnection import DatabaseConnection
+from .LedgerEntry import LedgerEntry
+from .Ledger import Ledger
+from .BulkTransfer import BulkTransfer
+from .SpentCoin import SpentCoin
+from .SpentCoinRegistry import SpentCoinRegistry
+from .ProtocolSession import ProtocolSession
+from .ProtocolSchema import ProtocolSchema
+from .Instrumentation import Instrumentation
+from .RequestProfiler import RequestProfiler
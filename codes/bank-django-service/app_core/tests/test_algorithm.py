@@ -1,15 +1,26 @@
 from django.test import TestCase
 import os
 import json
+import random
+import time
 from pprint import pprint
 from ellipticcurve.ecdsa import Ecdsa
 from ellipticcurve.privateKey import PrivateKey, PublicKey
 from ..models import YiModifiedPaillierEncryptionPy
+from ..models import YiFixedBasePrecomputation
+from ..models import YiKeyPairPool
+from ..models import ProtocolExecutor
 from ..models import PartiallyBlindSignatureClientInterface
 from ..models import PartiallyBlindSignatureServerInterface
 from ..models import Login
+from ..models import RedisConnection
 import requests
 import redis
+from concurrent.futures import ThreadPoolExecutor
+
+# 在 ProtocolExecutor 中執行的job
+def process_id(job):
+    return os.getpid()
 
 class TestAlgorithm(TestCase):
     
@@ -24,6 +35,123 @@ class TestAlgorithm(TestCase):
         yiModifiedPaillierEncryptionPy = YiModifiedPaillierEncryptionPy()
         yiModifiedPaillierEncryptionPy.test()
 
+    # 測試Yi算法的批次驗證
+    def test_YiBatchVerify(self):
+        print("[算法測試] 測試Yi同態加密批次驗證")
+        q = 115792089237316195423570985008687907852837564279074904382605163141518161494337
+        yiModifiedPaillierEncryptionPy = YiModifiedPaillierEncryptionPy()
+        keys = yiModifiedPaillierEncryptionPy.generate_keypairs(q)
+        N, g = keys["PublicKey_N"], keys["PublicKey_g"]
+        equations = []
+        for i in range(10):
+            m = random.randrange(1, q)
+            r = yiModifiedPaillierEncryptionPy.generate_r(N)
+            equations.append((m, r, yiModifiedPaillierEncryptionPy.encrypt(m, N, g, r, q)))
+        self.assertTrue(yiModifiedPaillierEncryptionPy.batch_verify(equations, N, g, q), "\n\n 正確的加密等式未通過批次驗證")
+        m, r, C = equations[3]
+        equations[3] = (m, r, C + 1)
+        self.assertFalse(yiModifiedPaillierEncryptionPy.batch_verify(equations, N, g, q), "\n\n 錯誤的加密等式通過了批次驗證")
+        print("[算法測試] 無法加密的輸入回傳False")
+        m, r, C = equations[0]
+        for equation in ((-5, r, C), (0, r, C), (q + 1, r, C), (m, -r, C), (m, 0, C)):
+            self.assertFalse(yiModifiedPaillierEncryptionPy.batch_verify([equation], N, g, q))
+
+    # 測試Yi算法的固定底數預計算表
+    def test_YiFixedBase(self):
+        print("[算法測試] 測試Yi同態加密固定底數預計算表")
+        q = 115792089237316195423570985008687907852837564279074904382605163141518161494337
+        plain = YiModifiedPaillierEncryptionPy()
+        keys = plain.generate_keypairs(q)
+        N, g = keys["PublicKey_N"], keys["PublicKey_g"]
+        fixed_base = YiModifiedPaillierEncryptionPy()
+        table = fixed_base.enable_fixed_base(N, g, q)
+        messages = [random.randrange(1, q) for i in range(20)] + [1, 2**255, q]
+        for m in messages:
+            r = plain.generate_r(N)
+            self.assertEqual(fixed_base.encrypt(m, N, g, r, q), plain.encrypt(m, N, g, r, q), "\n\n 查表加密與一般加密的結果不同")
+        print("[算法測試] 超出預計算表範圍的m退回 powmod")
+        small_table = YiFixedBasePrecomputation(g, N, 64)
+        for m in (2**64 - 1, 2**64, random.randrange(2**64, q), -3):
+            self.assertEqual(small_table.powmod(m), pow(g, m, N * N))
+        r = plain.generate_r(N)
+        m = random.randrange(2**64, q)
+        fixed_base.fixed_base = small_table
+        self.assertEqual(fixed_base.encrypt(m, N, g, r, q), plain.encrypt(m, N, g, r, q))
+        print("[算法測試] 其他公鑰的預計算表不會被使用")
+        fixed_base.fixed_base = table
+        other_keys = plain.generate_keypairs(q)
+        other_N, other_g = other_keys["PublicKey_N"], other_keys["PublicKey_g"]
+        self.assertFalse(table.matches(other_N, other_g))
+        self.assertFalse(table.matches(N, other_g))
+        r = plain.generate_r(other_N)
+        m = random.randrange(1, q)
+        self.assertEqual(fixed_base.encrypt(m, other_N, other_g, r, q), plain.encrypt(m, other_N, other_g, r, q))
+        self.assertEqual(fixed_base.decrypt(fixed_base.encrypt(m, other_N, other_g, r, q),
+            other_keys["PrivateKey_p"], other_keys["PrivateKey_k"], q, other_N), m)
+
+    # 測試Yi算法的CRT解密
+    def test_YiDecryptCRT(self):
+        print("[算法測試] 測試Yi同態CRT解密")
+        q = 115792089237316195423570985008687907852837564279074904382605163141518161494337
+        yiModifiedPaillierEncryptionPy = YiModifiedPaillierEncryptionPy()
+        keys = yiModifiedPaillierEncryptionPy.generate_keypairs(q)
+        p, k, N, g = keys["PrivateKey_p"], keys["PrivateKey_k"], keys["PublicKey_N"], keys["PublicKey_g"]
+        messages = [random.randrange(1, q) for i in range(10)]
+        C_list = [yiModifiedPaillierEncryptionPy.encrypt(m, N, g, yiModifiedPaillierEncryptionPy.generate_r(N), q) for m in messages]
+        for m, C in zip(messages, C_list):
+            self.assertEqual(yiModifiedPaillierEncryptionPy.decrypt(C, p, k, q, N), yiModifiedPaillierEncryptionPy.decrypt(C, p, k, q, N, crt = False))
+            self.assertEqual(yiModifiedPaillierEncryptionPy.decrypt(C, p, k, q, N), m, "\n\n CRT解密結果與明文不同")
+        self.assertEqual(yiModifiedPaillierEncryptionPy.decrypt_many(C_list, p, k, q, N), messages)
+        # 同態相加後的密文
+        C_sum = (C_list[0] * C_list[1]) % pow(N, 2)
+        self.assertEqual(yiModifiedPaillierEncryptionPy.decrypt(C_sum, p, k, q, N), (messages[0] + messages[1]) % q)
+        self.assertEqual(yiModifiedPaillierEncryptionPy.decrypt(C_sum, p, k, q, N, crt = False), (messages[0] + messages[1]) % q)
+
+    # 測試Yi鑰匙池
+    def test_YiKeyPairPool(self):
+        print("[算法測試] 鑰匙池未命中時不重設目前程序的亂數種子")
+        q = 115792089237316195423570985008687907852837564279074904382605163141518161494337
+        pool = YiKeyPairPool(q, target_size=0, refill_watermark=0)
+        random.seed(7)
+        keypair = pool.acquire()
+        random.seed(7)
+        self.assertEqual(pool.acquire(), keypair)
+        self.assertEqual(pool.metrics()["misses"], 2)
+
+        print("[算法測試] 鑰匙池的子程序各自設定亂數種子")
+        pool = YiKeyPairPool(q, target_size=4, refill_watermark=0, max_workers=2)
+        try:
+            pool.refill()
+            deadline = time.monotonic() + 60
+            while pool.metrics()["pending"] > 0 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            keypairs = [pool.acquire() for i in range(4)]
+        finally:
+            pool.shutdown()
+        self.assertEqual(pool.metrics()["hits"], 4)
+        self.assertEqual(len(set(keypairs)), 4)
+
+    # 測試平行運算執行器
+    def test_ProtocolExecutor(self):
+        print("[算法測試] 同時第一次使用執行器只建立一個")
+        executor = ProtocolExecutor("thread", 2)
+        try:
+            with ThreadPoolExecutor(max_workers=8) as threads:
+                executors = list(threads.map(lambda i: executor.get_executor(), range(32)))
+            self.assertEqual(len(set(map(id, executors))), 1)
+            self.assertEqual(executor.find_failures(sorted, [[3], [], [1, 2]], early_exit=False), [1, 2, 3])
+        finally:
+            executor.shutdown()
+        print("[算法測試] 只有一個子程序與一個job時仍然在子程序中執行")
+        executor = ProtocolExecutor("process", 1)
+        try:
+            self.assertEqual(len(executor.split(list(range(20)))), 1)
+            self.assertNotEqual(executor.map(process_id, [None]), [os.getpid()])
+            self.assertEqual(executor.map(process_id, []), [])
+        finally:
+            executor.shutdown()
+        self.assertEqual(ProtocolExecutor("thread", 1).map(process_id, [None]), [os.getpid()])
+
     # 測試ECDSA模塊
     def test_ECDSA(self):
         print("[算法測試] ECDSA模塊")
@@ -35,8 +163,8 @@ class TestAlgorithm(TestCase):
         self.assertTrue(result, "\n\n ECDSA模塊測試失敗，有可能是模塊損壞或者ECDSA鑰匙錯誤")
 
     def test_PartiallyBlindSignatureServerInterface(self):
-        redis_connection_0 = redis.Redis(host=os.environ['REDIS_IP'], port=6379, db=0, password=os.environ['REDIS_PASSWORD']) 
-        redis_connection_1 = redis.Redis(host=os.environ['REDIS_IP'], port=6379, db=1, password=os.environ['REDIS_PASSWORD']) 
+        redis_connection_0 = RedisConnection.get(RedisConnection.TOKEN_INDEX)
+        redis_connection_1 = RedisConnection.get(RedisConnection.USER_INDEX)
 
         login = Login()
         token = login.setUserToken("user")
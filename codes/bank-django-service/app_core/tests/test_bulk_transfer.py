@@ -0,0 +1,91 @@
+from django.test import TestCase, TransactionTestCase, Client
+from ..models.BulkTransfer import BulkTransfer
+from ..models.Currency import Currency
+from ..models.Ledger import Ledger
+from ..models.LedgerEntry import LedgerEntry
+import json
+import os
+
+
+class BulkTransferTestData:
+    """批次轉帳測試共用的帳戶與結算金鑰"""
+    def setUp(self):
+        Currency.objects.create(user_id=1, balance=100)
+        Currency.objects.create(user_id=2, balance=0)
+        Currency.objects.create(user_id=3, balance=0)
+        self.settlement_key = os.environ.get('SETTLEMENT_KEY')
+        os.environ['SETTLEMENT_KEY'] = "settlement"
+
+    def tearDown(self):
+        if self.settlement_key is None:
+            os.environ.pop('SETTLEMENT_KEY', None)
+        else:
+            os.environ['SETTLEMENT_KEY'] = self.settlement_key
+
+    def lines(self, transfers:list) ->list:
+        return [json.dumps(transfer).encode('utf-8') + b"\n" for transfer in transfers]
+
+
+class TestBulkTransfer(BulkTransferTestData, TestCase):
+    """測試批次轉帳"""
+    def test_Process(self):
+        lines = self.lines([
+            {"sender":1, "receiver":2, "amount":60},
+            # 使用前一筆轉入的餘額
+            {"sender":2, "receiver":3, "amount":50},
+            {"sender":1, "receiver":3, "amount":50},
+            {"sender":1, "receiver":4, "amount":10},
+            {"sender":1, "receiver":3, "amount":-1},
+        ]) + [b"\n", b"not json\n", b'{"sender":1,"receiver":2,"amount":40}']
+        # 每段2筆，確認跨段時順序與餘額正確
+        bulk_transfer = BulkTransfer(chunk_size=2)
+        results = [json.loads(line) for line in bulk_transfer.process(lines)]
+        self.assertEqual([result["index"] for result in results], list(range(7)))
+        self.assertEqual([result["code"] for result in results], [1, 1, 0, 0, 0, 0, 1])
+        self.assertEqual([result.get("message") for result in results[2:6]], ["餘額不足。", "帳戶不存在。", "轉帳金額必須為正整數。", "格式錯誤。"])
+        self.assertEqual((bulk_transfer.succeeded, bulk_transfer.failed), (3, 4))
+        self.assertEqual([Ledger.balance(user_id) for user_id in (1, 2, 3)], [0, 50, 50])
+        self.assertEqual(LedgerEntry.objects.count(), 6)
+        print("[批次轉帳測試] 逐筆成功或失敗")
+
+    def test_MaxTransfers(self):
+        lines = self.lines([{"sender":1, "receiver":2, "amount":10}] * 3) + [b"\n"]
+        with self.assertRaisesMessage(Exception, "每次批次轉帳最多2筆"):
+            list(BulkTransfer(chunk_size=1, max_transfers=2).process(lines))
+        # 超過上限時第一段也沒有寫入
+        self.assertEqual(Ledger.balance(1), 100)
+        self.assertFalse(LedgerEntry.objects.exists())
+        self.assertEqual(len(list(BulkTransfer(max_transfers=3).process(lines))), 3)
+        self.assertEqual(Ledger.balance(1), 70)
+        print("[批次轉帳測試] 每次的轉帳筆數上限")
+
+
+class TestBulkTransferAPI(BulkTransferTestData, TransactionTestCase):
+    """測試批次轉帳API
+    批次轉帳在執行緒池中以另一個資料庫連線執行，需要實際提交測試資料
+    """
+    def test_API(self):
+        client = Client()
+        body = b"".join(self.lines([{"sender":1, "receiver":2, "amount":10}] * 3))
+        response = client.post("/api/bulk_transfer", body, content_type=BulkTransfer.CONTENT_TYPE)
+        self.assertEqual(json.loads(response.content)["code"], 0)
+        self.assertEqual(Ledger.balance(1), 100)
+        print("[批次轉帳測試] 沒有結算金鑰時拒絕")
+        response = client.post("/api/bulk_transfer", body, content_type=BulkTransfer.CONTENT_TYPE, HTTP_X_SETTLEMENT_KEY="settlement")
+        self.assertEqual(response["Content-Type"], BulkTransfer.CONTENT_TYPE)
+        results = [json.loads(line) for line in response.content.splitlines()]
+        self.assertEqual([result["code"] for result in results], [1, 1, 1])
+        self.assertEqual(Ledger.balance(1), 70)
+        print("[批次轉帳測試] 批次轉帳API")
+        max_transfers = os.environ.get('BULK_TRANSFER_MAX_TRANSFERS')
+        os.environ['BULK_TRANSFER_MAX_TRANSFERS'] = "2"
+        try:
+            response = client.post("/api/bulk_transfer", body, content_type=BulkTransfer.CONTENT_TYPE, HTTP_X_SETTLEMENT_KEY="settlement")
+        finally:
+            if max_transfers is None:
+                os.environ.pop('BULK_TRANSFER_MAX_TRANSFERS', None)
+            else:
+                os.environ['BULK_TRANSFER_MAX_TRANSFERS'] = max_transfers
+        self.assertEqual(json.loads(response.content)["code"], 0)
+        self.assertEqual(Ledger.balance(1), 70)
+        print("[批次轉帳測試] 超過筆數上限時拒絕")
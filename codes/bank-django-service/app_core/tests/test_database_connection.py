@@ -0,0 +1,57 @@
+from django.test import TransactionTestCase
+from django.core.signals import request_started, request_finished
+from django.db import connection, transaction
+from unittest import mock
+from ..models.DatabaseConnection import DatabaseConnection
+from ..models.User import User
+
+
+class TestDatabaseConnection(TransactionTestCase):
+    """測試資料庫連線的健康檢查
+    TestCase 的每個測試都在交易中，交易中的連線不檢查，所以使用 TransactionTestCase
+    """
+    def setUp(self):
+        self.conn_health_checks = connection.settings_dict.get('CONN_HEALTH_CHECKS', False)
+        # 確保已經建立連線，並且清除之前的請求留下的標記
+        connection.ensure_connection()
+        connection.health_check_needed = False
+
+    def tearDown(self):
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = self.conn_health_checks
+        connection.health_check_needed = False
+
+    def test_HealthCheck(self):
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = False
+        before = DatabaseConnection.metrics()
+        request_started.send(sender=self.__class__)
+        User.objects.exists()
+        self.assertEqual(DatabaseConnection.metrics()["health_checks"], before["health_checks"])
+        print("[資料庫連線測試] 未啟用時不檢查")
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = True
+        request_started.send(sender=self.__class__)
+        self.assertEqual(DatabaseConnection.metrics()["health_checks"], before["health_checks"])
+        print("[資料庫連線測試] 請求開始時不檢查，不使用資料庫的請求沒有額外的往返")
+        User.objects.exists()
+        User.objects.exists()
+        after = DatabaseConnection.metrics()
+        self.assertEqual(after["health_checks"], before["health_checks"] + 1)
+        self.assertEqual(after["health_check_failures"], before["health_check_failures"])
+        print("[資料庫連線測試] 請求中第一次使用連線時檢查一次")
+        request_started.send(sender=self.__class__)
+        with mock.patch.object(connection, 'is_usable', return_value=False), mock.patch.object(connection, 'close') as close:
+            User.objects.exists()
+            self.assertTrue(close.called)
+        self.assertEqual(DatabaseConnection.metrics()["health_check_failures"], before["health_check_failures"] + 1)
+        print("[資料庫連線測試] 無法使用的連線被關閉")
+        before = DatabaseConnection.metrics()
+        request_started.send(sender=self.__class__)
+        request_finished.send(sender=self.__class__)
+        self.assertEqual(DatabaseConnection.metrics()["health_checks"], before["health_checks"])
+        connection.health_check_needed = False
+        print("[資料庫連線測試] 請求結束時關閉舊連線不會觸發檢查")
+        with transaction.atomic():
+            request_started.send(sender=self.__class__)
+            with mock.patch.object(connection, 'is_usable') as is_usable:
+                User.objects.exists()
+                self.assertFalse(is_usable.called)
+        print("[資料庫連線測試] 交易中的連線不檢查")
@@ -0,0 +1,119 @@
+from django.test import TestCase, Client
+from asgiref.sync import async_to_sync
+import json
+import os
+import tempfile
+import time
+from ..models import Instrumentation
+from ..models import ProtocolExecutor
+from ..models import RedisConnection
+from ..models import User
+
+# 在 ProtocolExecutor 的子程序中記錄
+@Instrumentation.timed("cbdc_test_seconds", operation="child")
+def child_job(job):
+    return os.getpid()
+
+
+class TestInstrumentation(TestCase):
+    """測試耗時統計與指標API"""
+    def setUp(self):
+        self.settings = (Instrumentation.sample_rate, Instrumentation.directory, Instrumentation.flush_interval)
+        Instrumentation.sample_rate = 1.0
+        Instrumentation.reset()
+
+    def tearDown(self):
+        Instrumentation.sample_rate, Instrumentation.directory, Instrumentation.flush_interval = self.settings
+        Instrumentation.snapshot_file = None
+        Instrumentation.reset()
+
+    def histogram(self, name:str, **labels):
+        return Instrumentation.histograms.get(Instrumentation.key(name, labels))
+
+    def test_Timed(self):
+        @Instrumentation.timed("cbdc_test_seconds", operation="sync")
+        def add(a, b):
+            return a + b
+
+        @Instrumentation.timed("cbdc_test_seconds", operation="async")
+        async def async_add(a, b):
+            return a + b
+
+        self.assertEqual(add(1, 2), 3)
+        self.assertEqual(async_to_sync(async_add)(1, 2), 3)
+        with Instrumentation.timer("cbdc_test_seconds", operation="block"):
+            add(3, 4)
+        self.assertEqual(self.histogram("cbdc_test_seconds", operation="sync").count, 2)
+        self.assertEqual(self.histogram("cbdc_test_seconds", operation="async").count, 1)
+        self.assertEqual(self.histogram("cbdc_test_seconds", operation="block").count, 1)
+        print("[耗時統計測試] 裝飾器與 context manager")
+        Instrumentation.sample_rate = 0.0
+        add(1, 2)
+        with Instrumentation.timer("cbdc_test_seconds", operation="block"):
+            pass
+        self.assertEqual(self.histogram("cbdc_test_seconds", operation="sync").count, 2)
+        self.assertEqual(self.histogram("cbdc_test_seconds", operation="block").count, 1)
+        print("[耗時統計測試] 停止取樣時不記錄")
+
+    def test_Render(self):
+        Instrumentation.observe("cbdc_yi_seconds", 0.002, operation="encrypt")
+        Instrumentation.observe("cbdc_yi_seconds", 20, operation="encrypt")
+        Instrumentation.observe("cbdc_redis_command_seconds", 0.0001, command='GE"T', db=0)
+        text = Instrumentation.render()
+        lines = text.splitlines()
+        self.assertIn("# TYPE cbdc_yi_seconds histogram", lines)
+        bucket = [line for line in lines if line.startswith('cbdc_yi_seconds_bucket{operation="encrypt",le="0.0025"}')]
+        self.assertEqual(bucket[0].split()[-1], "1")
+        infinity = [line for line in lines if line.startswith('cbdc_yi_seconds_bucket') and 'le="+Inf"' in line]
+        self.assertEqual(infinity[0].split()[-1], "2")
+        self.assertTrue(any(line.startswith("cbdc_yi_seconds_count") and line.endswith(" 2") for line in lines))
+        self.assertIn('command="GE\\"T"', text)
+        print("[耗時統計測試] Prometheus 文字格式")
+
+    def test_HotPaths(self):
+        redis_connection = RedisConnection.get(RedisConnection.TOKEN_INDEX)
+        redis_connection.exists("instrumentation-test")
+        self.assertEqual(self.histogram("cbdc_redis_command_seconds", command="EXISTS", db=RedisConnection.TOKEN_INDEX).count, 1)
+        User.objects.filter(account="instrumentation-test").exists()
+        self.assertTrue(any(name == "cbdc_database_query_seconds" for name, labels in Instrumentation.histograms))
+        print("[耗時統計測試] Redis 指令與資料庫查詢")
+
+    def test_MetricsAPI(self):
+        client = Client()
+        client.get("/api/login", {"account":"nobody", "password":"wrong"})
+        response = client.get("/api/metrics")
+        self.assertEqual(response["Content-Type"], Instrumentation.CONTENT_TYPE)
+        text = response.content.decode("utf-8")
+        self.assertIn('cbdc_login_seconds_count{method="alogin"', text)
+        self.assertIn("cbdc_metrics_sample_rate", text)
+        print("[耗時統計測試] 不需要登入的指標API")
+
+    def test_MultiProcess(self):
+        temporary_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        Instrumentation.directory = temporary_directory.name
+        Instrumentation.flush_interval = 0.05
+        Instrumentation.snapshot_file = None
+        child_job(None)
+        # 已經結束的 worker 留下的統計
+        counts = [0] * (len(Instrumentation.BUCKETS) + 1)
+        counts[-1] = 3
+        with open(os.path.join(temporary_directory.name, "1-finished.json"), "w", encoding="utf-8") as snapshot_file:
+            json.dump([["cbdc_test_seconds", [["operation", "child"]], counts, 60.0, 3]], snapshot_file)
+        executor = ProtocolExecutor("process", 2)
+        self.addCleanup(executor.shutdown)
+        pids = executor.map(child_job, [1, 2, 3, 4])
+        self.assertNotIn(os.getpid(), pids)
+        # 子程序由定期寫入的執行緒寫入，最多延遲 flush_interval 秒
+        expected = 'cbdc_test_seconds_count{operation="child"} 8'
+        deadline = time.monotonic() + 5
+        while expected not in Instrumentation.render() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        text = Instrumentation.render()
+        self.assertIn(expected, text)
+        self.assertIn('cbdc_test_seconds_bucket{operation="child",le="+Inf"} 8', text)
+        self.assertNotIn("pid=", text)
+        print("[耗時統計測試] 合併所有程序的統計，子程序不重複計算父程序的統計")
+        child_job(None)
+        self.assertIn('cbdc_test_seconds_count{operation="child"} 9', Instrumentation.render())
+        print("[耗時統計測試] 輸出前寫入目前程序的統計")
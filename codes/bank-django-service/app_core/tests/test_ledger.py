@@ -0,0 +1,73 @@
+from django.test import TestCase
+from ..models.Currency import Currency
+from ..models.Ledger import Ledger
+from ..models.LedgerEntry import LedgerEntry
+
+
+class TestLedger(TestCase):
+    """測試帳本轉帳"""
+    def setUp(self):
+        Currency.objects.create(user_id=1, balance=100)
+        Currency.objects.create(user_id=2, balance=50)
+
+    def test_Transfer(self):
+        transfer_id = Ledger.transfer(1, 2, 30)
+        self.assertEqual(Ledger.balance(1), 70)
+        self.assertEqual(Ledger.balance(2), 80)
+        entries = LedgerEntry.objects.filter(transfer_id=transfer_id).order_by('amount')
+        self.assertEqual([(entry.user_id, entry.amount, entry.balance) for entry in entries], [(1, -30, 70), (2, 30, 80)])
+        print("[帳本測試] 轉帳與帳本分錄")
+        Ledger.transfer(2, 1, 80)
+        self.assertEqual(Ledger.balance(1), 150)
+        self.assertEqual(Ledger.balance(2), 0)
+        self.assertEqual([entry.amount for entry in Ledger.history(2)], [-80, 30])
+        print("[帳本測試] 反向轉帳與交易紀錄")
+
+    def test_TransferFail(self):
+        for arguments, message in (
+            ((1, 2, 101), "餘額不足。"),
+            ((1, 3, 10), "帳戶不存在。"),
+            ((1, 1, 10), "不能轉帳給自己。"),
+            ((1, 2, 0), "轉帳金額必須為正整數。"),
+            ((1, 2, 1.5), "轉帳金額必須為正整數。"),
+        ):
+            with self.assertRaisesMessage(Exception, message):
+                Ledger.transfer(*arguments)
+        self.assertEqual(Ledger.balance(1), 100)
+        self.assertEqual(Ledger.balance(2), 50)
+        self.assertFalse(LedgerEntry.objects.exists())
+        print("[帳本測試] 轉帳失敗時不改變餘額")
+
+    def test_EntryAppendOnly(self):
+        Ledger.transfer(1, 2, 10)
+        entry = LedgerEntry.objects.first()
+        entry.amount = 0
+        with self.assertRaisesMessage(Exception, "帳本分錄不能修改。"):
+            entry.save()
+        with self.assertRaisesMessage(Exception, "帳本分錄不能刪除。"):
+            entry.delete()
+        print("[帳本測試] 帳本分錄只能新增")
+        with self.assertRaisesMessage(Exception, "帳本分錄不能修改。"):
+            LedgerEntry.objects.filter(pk=entry.pk).update(amount=0)
+        with self.assertRaisesMessage(Exception, "帳本分錄不能修改。"):
+            LedgerEntry.objects.bulk_update([entry], ['amount'])
+        with self.assertRaisesMessage(Exception, "帳本分錄不能刪除。"):
+            LedgerEntry.objects.all().delete()
+        self.assertEqual(sorted(LedgerEntry.objects.values_list('amount', flat=True)), [-10, 10])
+        print("[帳本測試] 帳本分錄不能批次修改或刪除")
+
+    def test_LargeAmount(self):
+        amount = 2**40
+        Currency.objects.create(user_id=3, balance=amount)
+        Ledger.transfer(3, 1, amount)
+        self.assertEqual(Ledger.balance(1), amount + 100)
+        self.assertEqual(LedgerEntry.objects.get(user_id=1).balance, amount + 100)
+        print("[帳本測試] 超過32位元的金額")
+        with self.assertRaisesMessage(Exception, "轉帳金額超過上限。"):
+            Ledger.transfer(1, 2, Ledger.MAX_BALANCE + 1)
+        Currency.objects.filter(user_id=2).update(balance=Ledger.MAX_BALANCE)
+        with self.assertRaisesMessage(Exception, "轉入後的餘額超過上限。"):
+            Ledger.transfer(1, 2, 1)
+        self.assertEqual(Ledger.apply_transfers([(1, 2, 1)]), [{"code":0, "message":"轉入後的餘額超過上限。"}])
+        self.assertEqual(Ledger.balance(1), amount + 100)
+        print("[帳本測試] 金額與餘額的上限")
@@ -1,10 +1,20 @@
-from django.test import TestCase
+from django.test import TestCase, AsyncClient
+from django.db import IntegrityError
+from asgiref.sync import sync_to_async
 from ..models.Login import Login
 from ..models.User import User
+from ..models.RedisConnection import RedisConnection
+from ..models.TokenCache import TokenCache
+from ..models.PasswordHashing import PasswordHashing
 import redis
 import requests
 import json
 import os
+import time
+import uuid
+import hashlib
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
 
 
 class TestLogin(TestCase):
@@ -24,8 +34,8 @@ class TestLogin(TestCase):
         User.objects.create(account = self.account)
         User.objects.create(password_hash = self.password_hash)
         # 建立 Redis 連線
-        self.redis_connection_token_index = redis.Redis(host=os.environ['REDIS_IP'], port=6379, db=0, password=os.environ['REDIS_PASSWORD'])
-        self.redis_connection_user_index = redis.Redis(host=os.environ['REDIS_IP'], port=6379, db=1, password=os.environ['REDIS_PASSWORD'])
+        self.redis_connection_token_index = RedisConnection.get(RedisConnection.TOKEN_INDEX)
+        self.redis_connection_user_index = RedisConnection.get(RedisConnection.USER_INDEX)
         
     # 測試登入
     def test_Login(self):
@@ -56,4 +66,144 @@ class TestLogin(TestCase):
         result_json_object = json.loads(result.text)
         self.assertEqual(result_json_object['code'], 0)
         # self.assertTrue(False)
-        # self.assertFalse(False)
\ No newline at end of file
+        # self.assertFalse(False)
+
+    # 測試帳號密碼驗證
+    def test_Authenticate(self):
+        login = Login()
+        User.objects.create(account = "authenticate", password_hash = self.password_hash)
+        print("[登入測試] 帳號密碼正確")
+        self.assertTrue(login.authenticate("authenticate", self.password))
+        print("[登入測試] 密碼錯誤、帳號不存在與帳號部分相符")
+        self.assertFalse(login.authenticate("authenticate", "wrong password"))
+        self.assertFalse(login.authenticate("nobody", self.password))
+        self.assertFalse(login.authenticate("authentic", self.password))
+        print("[登入測試] 帳號不能重複")
+        with self.assertRaises(IntegrityError):
+            User.objects.create(account = "authenticate", password_hash = self.password_hash)
+
+    # 測試舊版密碼重新雜湊
+    def test_PasswordRehash(self):
+        login = Login()
+        User.objects.create(account = "rehash", password_hash = self.password_hash)
+        print("[登入測試] 舊版 SHA-256 密碼登入後重新雜湊")
+        self.assertTrue(login.authenticate("rehash", self.password))
+        password_hash = User.objects.get(account = "rehash").password_hash
+        self.assertTrue(password_hash.startswith("pbkdf2_sha256$"))
+        print("[登入測試] 重新雜湊後的密碼驗證")
+        self.assertTrue(login.authenticate("rehash", self.password))
+        self.assertFalse(login.authenticate("rehash", "wrong password"))
+        self.assertEqual(User.objects.get(account = "rehash").password_hash, password_hash)
+        self.assertGreater(PasswordHashing.shared().metrics()["rehashes"], 0)
+
+    # 測試Token快取
+    def test_TokenCache(self):
+        print("[登入測試] Token快取命中與失效")
+        token_cache = TokenCache(ttl=0.2, max_size=2, listen=False)
+        self.assertFalse(token_cache.get("a"))
+        token_cache.put("a")
+        self.assertTrue(token_cache.get("a"))
+        time.sleep(0.3)
+        self.assertFalse(token_cache.get("a"))
+
+        print("[登入測試] Token快取數量上限")
+        token_cache.put("a")
+        token_cache.put("b")
+        token_cache.get("a")
+        token_cache.put("c")
+        self.assertTrue(token_cache.get("a"))
+        self.assertFalse(token_cache.get("b"))
+
+        print("[登入測試] Token快取移除")
+        token_cache.invalidate("a")
+        self.assertFalse(token_cache.get("a"))
+        metrics = token_cache.metrics()
+        self.assertEqual(metrics["hits"], 3)
+        self.assertEqual(metrics["misses"], 4)
+        self.assertEqual(metrics["invalidations"], 1)
+
+        print("[登入測試] Token被刪除後快取失效")
+        token = uuid.uuid4().hex
+        self.redis_connection_token_index.set(token, "{}", ex=300)
+        login = Login()
+        self.assertTrue(login.login_verify(token))
+        self.assertTrue(login.login_verify(token))
+        self.redis_connection_token_index.delete(token)
+        # 等待鍵空間通知，沒有開啟通知時等待快取到期
+        deadline = time.monotonic() + TokenCache.shared().ttl + 1
+        while login.login_verify(token) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(login.login_verify(token))
+
+    # 測試Token快取訂閱鍵空間通知
+    def test_TokenCacheListener(self):
+        print("[登入測試] Token快取的訂閱在閒置時不會中斷")
+        # 連線池的讀取逾時很短時，訂閱的連線仍然不會逾時
+        socket_timeout = os.environ.get('REDIS_SOCKET_TIMEOUT')
+        os.environ['REDIS_SOCKET_TIMEOUT'] = '0.2'
+        try:
+            token_cache = TokenCache(ttl=60, listen=True)
+            token_cache.start_listener()
+            self.assertTrue(token_cache.subscribed.wait(5))
+        finally:
+            if socket_timeout is None:
+                del os.environ['REDIS_SOCKET_TIMEOUT']
+            else:
+                os.environ['REDIS_SOCKET_TIMEOUT'] = socket_timeout
+        token = uuid.uuid4().hex
+        self.redis_connection_token_index.set(token, "{}", ex=300)
+        token_cache.put(token)
+        time.sleep(token_cache.POLL_SECONDS * 2)
+        self.assertTrue(token_cache.get(token))
+        self.assertEqual(token_cache.metrics()["disconnects"], 0)
+
+        print("[登入測試] Token被刪除時由通知移除")
+        self.redis_connection_token_index.delete(token)
+        deadline = time.monotonic() + 5
+        while token_cache.get(token) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(token_cache.get(token))
+        self.assertEqual(token_cache.metrics()["invalidations"], 1)
+
+    # 測試同時登入
+    def test_SetUserTokenConcurrent(self):
+        login = Login()
+        account = "concurrent-" + uuid.uuid4().hex
+        print("[登入測試] 同一帳號同時登入只建立一個Token")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            tokens = set(executor.map(login.setUserToken, [account] * 32))
+        self.assertEqual(len(tokens), 1)
+        token = tokens.pop()
+        self.assertEqual(self.redis_connection_user_index.get(account).decode('utf-8'), token)
+        self.assertEqual(json.loads(self.redis_connection_token_index.get(token))['account'], account)
+        self.assertGreater(self.redis_connection_token_index.ttl(token), 0)
+
+        print("[登入測試] Token被刪除後重新登入建立新的Token")
+        self.redis_connection_token_index.delete(token)
+        new_token = login.setUserToken(account)
+        self.assertNotEqual(new_token, token)
+        self.assertTrue(self.redis_connection_token_index.exists(new_token))
+        self.redis_connection_token_index.delete(new_token)
+        self.redis_connection_user_index.delete(account)
+
+    # 測試非同步(ASGI)的登入流程
+    async def test_AsyncLogin(self):
+        account = "async-" + uuid.uuid4().hex
+        await sync_to_async(User.objects.create)(account = account, password_hash = hashlib.sha256(self.password.encode('utf-8')).hexdigest())
+        # Django 3.2 的 AsyncClient 不會處理 GET 的 data 參數，參數直接寫在網址中
+        client = AsyncClient()
+        print("[登入測試] 非同步登入")
+        response = await client.get('/api/login?' + urlencode({'account': account, 'password': self.password}))
+        token = json.loads(response.content)['token']
+        self.assertEqual(self.redis_connection_user_index.get(account).decode('utf-8'), token)
+
+        print("[登入測試] 非同步登入檢查與登入中間層")
+        response = await client.get('/api/check_login?token=' + token)
+        self.assertEqual(json.loads(response.content)['code'], 1)
+        response = await client.get('/login?token=' + token)
+        self.assertEqual(response.status_code, 302)
+        response = await client.get('/api/blind_signature')
+        self.assertEqual(json.loads(response.content)['code'], 0)
+
+        self.redis_connection_token_index.delete(token)
+        self.redis_connection_user_index.delete(account)
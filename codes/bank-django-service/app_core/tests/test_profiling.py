@@ -0,0 +1,92 @@
+import os
+import tempfile
+import threading
+import time
+from django.test import TestCase, Client
+from ..models import RequestProfiler
+
+def busy_loop(seconds:float):
+    end_time = time.perf_counter() + seconds
+    while time.perf_counter() < end_time:
+        pass
+
+class TestProfiling(TestCase):
+    """測試效能分析中間層"""
+    def setUp(self):
+        self.settings = (RequestProfiler.sample_every, RequestProfiler.secret, RequestProfiler.directory, RequestProfiler.max_files)
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        RequestProfiler.directory = self.temporary_directory.name
+
+    def tearDown(self):
+        RequestProfiler.sample_every, RequestProfiler.secret, RequestProfiler.directory, RequestProfiler.max_files = self.settings
+        self.temporary_directory.cleanup()
+
+    def test_Collapsed(self):
+        profile = RequestProfiler.start("/api/blind_signature", "collapsed-test")
+        self.assertIs(RequestProfiler.current(), profile)
+        worker = threading.Thread(target=RequestProfiler.wrap_current(busy_loop), args=(0.05,))
+        worker.start()
+        busy_loop(0.05)
+        worker.join()
+        file_path = RequestProfiler.stop(profile)
+        self.assertIsNone(RequestProfiler.current())
+        self.assertEqual(file_path, os.path.join(RequestProfiler.directory, "api_blind_signature", "collapsed-test.collapsed"))
+        with open(file_path, encoding="utf-8") as profile_file:
+            lines = profile_file.read().splitlines()
+        stacks = [line.rsplit(" ", 1)[0] for line in lines]
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        self.assertTrue(any(stack.startswith("request;") and "busy_loop (tests/test_profiling.py" in stack for stack in stacks))
+        self.assertTrue(any(stack.startswith("worker;") and "busy_loop (tests/test_profiling.py" in stack for stack in stacks))
+        print("[效能分析測試] 請求與執行緒工作的折疊堆疊")
+
+    def test_SampleEvery(self):
+        RequestProfiler.sample_every, RequestProfiler.secret = 2, None
+        client = Client()
+        responses = [client.get("/api/metrics", HTTP_X_REQUEST_ID="sample-%d" % i) for i in range(4)]
+        profiled = [response[RequestProfiler.PROFILE_ID_HEADER] for response in responses if response.has_header(RequestProfiler.PROFILE_ID_HEADER)]
+        self.assertEqual(len(profiled), 2)
+        for request_id in profiled:
+            self.assertTrue(os.path.exists(RequestProfiler.file_path("/api/metrics", request_id)))
+        print("[效能分析測試] 每N個請求分析一個")
+
+    def test_SignedHeader(self):
+        RequestProfiler.sample_every, RequestProfiler.secret = 0, "profiling-test-secret"
+        client = Client()
+        response = client.get("/api/metrics", HTTP_X_PROFILE=RequestProfiler.sign("/api/metrics"))
+        self.assertTrue(response.has_header(RequestProfiler.PROFILE_ID_HEADER))
+        print("[效能分析測試] 正確簽章的標頭")
+        for header in (RequestProfiler.sign("/api/login"), "/api/metrics:forged", None):
+            extra = {} if header is None else {"HTTP_X_PROFILE":header}
+            self.assertFalse(client.get("/api/metrics", **extra).has_header(RequestProfiler.PROFILE_ID_HEADER))
+        print("[效能分析測試] 其他路徑、偽造或沒有標頭時不分析")
+
+    def test_Disabled(self):
+        RequestProfiler.sample_every, RequestProfiler.secret = 0, None
+        response = Client().get("/api/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header(RequestProfiler.PROFILE_ID_HEADER))
+        self.assertEqual(os.listdir(RequestProfiler.directory), [])
+        print("[效能分析測試] 未設定時不載入")
+
+    def test_RequestId(self):
+        self.assertEqual(RequestProfiler.request_id("abc-123"), "abc-123")
+        self.assertEqual(len(RequestProfiler.request_id("../../etc/passwd")), 32)
+        self.assertEqual(RequestProfiler.file_path("/", "x"), os.path.join(RequestProfiler.directory, "root", "x.collapsed"))
+        print("[效能分析測試] 請求編號與檔案路徑")
+
+    def test_Retention(self):
+        RequestProfiler.sample_every, RequestProfiler.secret, RequestProfiler.max_files = 1, None, 3
+        self.assertEqual(RequestProfiler.route("/api/metrics"), "/api/metrics")
+        self.assertEqual(RequestProfiler.route("/no-such-page/1"), RequestProfiler.UNMATCHED)
+        client = Client()
+        for i in range(3):
+            client.get("/api/no-such-page-%d" % i, HTTP_X_REQUEST_ID="unmatched-%d" % i)
+        self.assertEqual(sorted(os.listdir(RequestProfiler.directory)), ["unmatched"])
+        print("[效能分析測試] 沒有對應路由的請求不會建立新的目錄")
+        for i in range(5):
+            client.get("/api/metrics", HTTP_X_REQUEST_ID="retention-%d" % i)
+            # 確保修改時間不同
+            time.sleep(0.01)
+        self.assertEqual(sorted(os.listdir(os.path.join(RequestProfiler.directory, "api_metrics"))),
+            ["retention-2.collapsed", "retention-3.collapsed", "retention-4.collapsed"])
+        print("[效能分析測試] 每個路由只保留最新的結果")
@@ -0,0 +1,123 @@
+from django.test import TestCase
+import json
+import os
+import random
+from ellipticcurve.privateKey import PublicKey
+from ..models import Login
+from ..models import PartiallyBlindSignatureClientInterface
+from ..models import PartiallyBlindSignatureServerInterface
+from ..models import ProtocolSession
+from ..models import RedisConnection
+from ..models import ProtocolSchema
+
+
+class TestProtocolIssuance(TestCase):
+    """測試部分盲簽章的完整發行流程"""
+    def setUp(self):
+        self.token = Login().setUserToken("protocol-issuance")
+        ProtocolSession(self.token).delete()
+        self.Q = PublicKey.fromPem(os.environ['ECDSA_PUBLICKEY']).point
+
+    def tearDown(self):
+        ProtocolSession(self.token).delete()
+        RedisConnection.get(RedisConnection.TOKEN_INDEX).delete(self.token)
+        RedisConnection.get(RedisConnection.USER_INDEX).delete("protocol-issuance")
+
+    def process(self, input = None):
+        # 每個請求都是新的簽署者，狀態從Redis載入
+        return PartiallyBlindSignatureServerInterface(self.token).process(self.token, input)
+
+    def start(self) ->PartiallyBlindSignatureClientInterface:
+        user = PartiallyBlindSignatureClientInterface()
+        user.generate_message_hash("Message")
+        user.generate_I("Public")
+        user.step1_input(*self.process())
+        user.generate_keypairs_parameters()
+        user.step2_input(*self.process(user.step1_output()))
+        return user
+
+    def test_FullIssuance(self):
+        user = self.start()
+        self.assertEqual(len(user.i_list), 20)
+        user.step3_input(*self.process(user.step2_output()))
+        self.assertTrue(user.verify_signature(self.Q.x, self.Q.y))
+        self.assertFalse(user.verify_signature(self.Q.x, self.Q.y, message_hash=user.hash_H("Other")))
+        self.assertFalse(user.verify_signature(self.Q.x, self.Q.y, I=user.hash_H("Other")))
+        print("[發行測試] 完整發行並且驗證簽章")
+        with self.assertRaisesMessage(Exception, "部分盲簽章已經完成"):
+            self.process(user.step2_output())
+        metrics = PartiallyBlindSignatureServerInterface.metrics()
+        for step in ("step_1", "step_2", "step_3"):
+            self.assertGreater(metrics[step]["count"], 0)
+            self.assertIsNotNone(metrics[step]["mean_total_seconds"])
+        print("[發行測試] 每個步驟的耗時")
+
+    def test_RevealedLMismatch(self):
+        user = self.start()
+        L = json.loads(user.step2_output())["L"]
+        L[3] += 1
+        with self.assertRaisesMessage(Exception, "公開的l與F不符"):
+            self.process(json.dumps({"L":L}))
+        with self.assertRaisesMessage(Exception, "公開的l必須有20個"):
+            self.process(json.dumps({"L":L[1:]}))
+        # 驗證失敗時不會前進，仍然可以送出正確的 L
+        user.step3_input(*self.process(user.step2_output()))
+        self.assertTrue(user.verify_signature(self.Q.x, self.Q.y))
+        print("[發行測試] 公開的l與F不符")
+
+    def test_MalformedZeroKnowledgeProof(self):
+        user = PartiallyBlindSignatureClientInterface()
+        user.generate_message_hash("Message")
+        user.generate_I("Public")
+        user.step1_input(*self.process())
+        user.generate_keypairs_parameters()
+        step1_output = user.step1_output()
+        message = json.loads(step1_output)
+        # 第0回合的 m 為0，第1回合的 r 為0，encrypt 不接受這些輸入
+        for i, names in ((0, ("x", "xp")), (1, ("rp", "rpp"))):
+            for name in ("ZeroKnowledgeProofC1List", "ZeroKnowledgeProofC2List"):
+                parameter_set = message[name][i]
+                for key in names:
+                    if key in parameter_set:
+                        parameter_set[key] = 0
+        signer = PartiallyBlindSignatureServerInterface(self.token)
+        signer.ZeroKnowledgeProofEarlyExit = False
+        with self.assertRaisesMessage(Exception, "零知識證明驗證失敗"):
+            signer.process(self.token, json.dumps(message))
+        self.assertEqual(signer.zero_knowledge_proof_failed_rounds, [0, 1])
+        print("[發行測試] m 或 r 為0的零知識證明視為失敗的回合")
+        # 驗證失敗時不會前進，仍然可以送出正確的證明
+        user.step2_input(*self.process(step1_output))
+        user.step3_input(*self.process(user.step2_output()))
+        self.assertTrue(user.verify_signature(self.Q.x, self.Q.y))
+
+    def test_SignRandomness(self):
+        self.start()
+        signer = PartiallyBlindSignatureServerInterface(self.token)
+        # 重新隨機化的 r 不使用 random 模組，重設 random 的種子不會得到相同的簽章
+        random.seed(1)
+        C = signer.sign()
+        random.seed(1)
+        self.assertNotEqual(signer.sign(), C)
+        print("[發行測試] 簽章重新隨機化使用作業系統的隨機數")
+
+    def test_PerSessionK1(self):
+        K1 = json.loads(self.process()[0])
+        ProtocolSession(self.token).delete()
+        self.assertNotEqual(json.loads(self.process()[0])["K1x"], K1["K1x"])
+        print("[發行測試] 每次簽章的K1不同")
+
+    def test_Schema(self):
+        schema = ProtocolSchema.USER_STEP4
+        self.assertEqual(ProtocolSchema.validate({"L":[1, 2]}, schema), {"L":[1, 2]})
+        for message in ({"L":[1, -2]}, {"L":[True]}, {"L":"1"}, {}, {"L":[1], "extra":1}):
+            with self.assertRaisesMessage(Exception, "協定訊息格式錯誤"):
+                ProtocolSchema.validate(message, schema)
+        rounds = [{"x":1, "rp":2, "Cp":3}, {"xp":1, "rpp":2, "Cp":3}]
+        self.assertEqual(ProtocolSchema.validate(rounds, [ProtocolSchema.ZERO_KNOWLEDGE_PROOF_ROUND]), rounds)
+        with self.assertRaisesMessage(Exception, "不符合任何一種格式"):
+            ProtocolSchema.validate([{"x":1, "rpp":2, "Cp":3}], [ProtocolSchema.ZERO_KNOWLEDGE_PROOF_ROUND])
+        self.process()
+        with self.assertRaisesMessage(Exception, "的欄位必須是 C1"):
+            self.process(json.dumps({"C1":"1"}))
+        print("[發行測試] 訊息格式檢查")
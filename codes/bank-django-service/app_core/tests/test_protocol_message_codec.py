@@ -0,0 +1,41 @@
+from django.test import TestCase
+from ..models.ProtocolMessageCodec import ProtocolMessageCodec
+
+
+class TestProtocolMessageCodec(TestCase):
+    """測試協定訊息編碼
+    確認二進位格式與JSON格式解碼後的訊息相同
+    """
+    def setUp(self):
+        self.message = {
+            "N": 2**3000 + 12345,
+            "C1": 0,
+            "negative": -2**70,
+            "b_list": [0, 1, 1, 0],
+            "ZeroKnowledgeProofC1List": [{"x": 2**255 - 19, "rp": 3**500, "Cp": 7**900}],
+            "text": "盲簽章",
+            "flags": [True, False, None],
+        }
+
+    # 測試二進位格式
+    def test_binary(self):
+        print("[協定訊息測試] 二進位格式編碼與解碼")
+        data = ProtocolMessageCodec.encode(self.message, ProtocolMessageCodec.CONTENT_TYPE_BINARY)
+        self.assertTrue(data.startswith(b"CBDC"))
+        self.assertEqual(ProtocolMessageCodec.decode(data, ProtocolMessageCodec.CONTENT_TYPE_BINARY), self.message)
+        # 未指定格式時由內容判斷
+        self.assertEqual(ProtocolMessageCodec.decode(data), self.message)
+        # 長度不足的訊息
+        with self.assertRaises(Exception):
+            ProtocolMessageCodec.decode(data[:-1], ProtocolMessageCodec.CONTENT_TYPE_BINARY)
+
+    # 測試JSON格式與格式協商
+    def test_json_and_negotiate(self):
+        print("[協定訊息測試] JSON格式與格式協商")
+        data = ProtocolMessageCodec.encode(self.message)
+        self.assertEqual(ProtocolMessageCodec.decode(data), self.message)
+        self.assertEqual(ProtocolMessageCodec.decode(data.encode("utf-8"), "application/json; charset=utf-8"), self.message)
+        self.assertEqual(ProtocolMessageCodec.negotiate(None), ProtocolMessageCodec.CONTENT_TYPE_JSON)
+        self.assertEqual(ProtocolMessageCodec.negotiate("application/json"), ProtocolMessageCodec.CONTENT_TYPE_JSON)
+        self.assertEqual(ProtocolMessageCodec.negotiate("application/x-cbdc-protocol, application/json;q=0.5"), ProtocolMessageCodec.CONTENT_TYPE_BINARY)
+        self.assertEqual(ProtocolMessageCodec.negotiate("application/x-cbdc-protocol;q=0"), ProtocolMessageCodec.CONTENT_TYPE_JSON)
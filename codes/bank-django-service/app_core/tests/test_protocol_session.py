@@ -0,0 +1,59 @@
+from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from ..models.Login import Login
+from ..models.ProtocolSession import ProtocolSession
+from ..models.RedisConnection import RedisConnection
+
+
+class TestProtocolSession(TestCase):
+    """測試盲簽章協定的狀態"""
+    def setUp(self):
+        self.token = Login().setUserToken("protocol-session")
+        self.session = ProtocolSession(self.token)
+        self.session.delete()
+        self.redis_connection = RedisConnection.get(RedisConnection.TOKEN_INDEX)
+
+    def tearDown(self):
+        self.session.delete()
+        self.redis_connection.delete(self.token)
+        RedisConnection.get(RedisConnection.USER_INDEX).delete("protocol-session")
+
+    def test_LoadAndAdvance(self):
+        status = self.session.load({"b_list":[0, 1, 1], "i_list":[3, 5]})
+        self.assertEqual(status, {"step":1, "b_list":[0, 1, 1], "i_list":[3, 5]})
+        # 已經存在時不會覆蓋
+        self.assertEqual(self.session.load({"b_list":[1, 1, 1], "i_list":[1]}), status)
+        print("[協定狀態測試] 建立與載入狀態")
+        self.session.advance(1)
+        N = (1 << 2047) + 12345
+        self.session.advance(2, {"N":N, "C1":N * N - 1})
+        status = self.session.load({})
+        self.assertEqual((status["step"], status["N"], status["C1"]), (3, N, N * N - 1))
+        self.assertEqual(status["b_list"], [0, 1, 1])
+        # 大整數以二進位存放
+        self.assertLess(len(self.redis_connection.hget(self.session.key, "N")), 260)
+        print("[協定狀態測試] 只寫入改變的欄位")
+        with self.assertRaisesMessage(Exception, "第2步驟已經處理過"):
+            self.session.advance(2, {"N":1})
+        self.assertEqual(self.session.load({})["N"], N)
+        print("[協定狀態測試] 重複送出的步驟不會寫入")
+
+    def test_ConcurrentAdvance(self):
+        self.session.load({"b_list":[0]})
+        def advance(i):
+            try:
+                ProtocolSession(self.token).advance(1, {"winner":i})
+                return True
+            except Exception:
+                return False
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(advance, range(16)))
+        self.assertEqual(sum(results), 1)
+        self.assertEqual(self.session.load({})["winner"], results.index(True))
+        print("[協定狀態測試] 同時前進只有一個請求成功")
+
+    def test_ExpiredToken(self):
+        self.redis_connection.delete(self.token)
+        with self.assertRaisesMessage(Exception, "登入已經逾時"):
+            self.session.load({"b_list":[0]})
+        print("[協定狀態測試] 登入逾時")
@@ -0,0 +1,46 @@
+from django.test import TestCase
+from ..models.SpentCoin import SpentCoin
+from ..models.SpentCoinRegistry import SpentCoinRegistry
+
+
+class TestSpentCoinRegistry(TestCase):
+    """測試已使用貨幣的登記"""
+    def setUp(self):
+        self.registry = SpentCoinRegistry(capacity=1000, error_rate=0.01, key_prefix="test_spent_coin_filter")
+        self.registry.clear()
+
+    def tearDown(self):
+        self.registry.clear()
+
+    def test_Spend(self):
+        # 過濾器不存在時查詢資料庫
+        self.assertFalse(self.registry.ready())
+        self.assertFalse(self.registry.is_spent(b"coin-1"))
+        self.assertTrue(self.registry.spend(b"coin-1"))
+        self.assertFalse(self.registry.ready())
+        self.assertTrue(self.registry.is_spent(b"coin-1"))
+        self.assertFalse(self.registry.spend(b"coin-1"))
+        self.assertEqual(self.registry.metrics()["filter_negatives"], 0)
+        print("[已使用貨幣測試] 過濾器不存在時由資料庫判斷")
+        self.assertEqual(self.registry.rebuild(), 1)
+        self.assertTrue(self.registry.ready())
+        self.assertTrue(self.registry.is_spent(b"coin-1"))
+        self.assertTrue(self.registry.spend("coin-2"))
+        self.assertTrue(self.registry.is_spent("coin-2"))
+        self.assertFalse(self.registry.spend("coin-2"))
+        print("[已使用貨幣測試] 重建過濾器後登記與重複使用")
+        for i in range(100):
+            self.assertFalse(self.registry.is_spent("unspent-%d" % i))
+        metrics = self.registry.metrics()
+        self.assertEqual(metrics["filter_negatives"] + metrics["false_positives"], 100)
+        self.assertLess(metrics["false_positives"], 10)
+        self.assertEqual((metrics["spends"], metrics["double_spends"]), (2, 2))
+        print("[已使用貨幣測試] 未使用的貨幣由過濾器判斷")
+
+    def test_RebuildFromDatabase(self):
+        coins = ["rebuild-%d" % i for i in range(500)]
+        SpentCoin.objects.bulk_create([SpentCoin(coin_hash=SpentCoinRegistry.coin_hash(coin)) for coin in coins])
+        self.assertEqual(self.registry.rebuild(batch_size=64), 500)
+        for coin in coins:
+            self.assertTrue(self.registry.is_spent(coin))
+        print("[已使用貨幣測試] 由資料庫重建過濾器")
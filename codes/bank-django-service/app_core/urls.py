@@ -11,6 +11,9 @@ urlpatterns = [
     # API
     path('api/login', views.login_api),
     path('api/check_login', views.check_login),
+    path('api/blind_signature', views.blind_signature),
+    path('api/bulk_transfer', views.bulk_transfer),
+    path('api/metrics', views.metrics),
 ]
 
 # 把不需要登入就可以瀏覽的頁面加入這裡
@@ -19,4 +22,8 @@ none_login_pages = [
     "/admin",
     "/api/login",
     "/api/check_login",
+    # 以結算金鑰驗證
+    "/api/bulk_transfer",
+    # Prometheus 抓取指標
+    "/api/metrics",
 ]
\ No newline at end of file
@@ -1,6 +1,18 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from django.shortcuts import render
+from django.db import close_old_connections
 from django.http import HttpResponse
+from .models import BulkTransfer
+from .models import Instrumentation
 from .models import Login
+from .models import PartiallyBlindSignatureServerInterface
+from .models import ProtocolExecutor
+from .models import ProtocolMessageCodec
+from .models import RequestProfiler
+import json
 
 """
 前端頁面
@@ -30,14 +42,76 @@ def 此API的名稱(request):
     return HttpResponse(回傳結果)
 
 之後到 urls.py 來將網址聯繫到這個view
+
+API 為非同步的view，在ASGI伺服器下不會佔用執行緒等待Redis與資料庫，
+需要大量運算或者阻塞的部分請以 run_in_thread 交給執行緒，不要直接在view中執行。
 """
-def login_api(request):
+# 執行同步工作的執行緒池，數量由環境變數 ASGI_THREADS 決定(見 init.py)
+thread_pool = None
+
+def run_in_thread(func, *args):
+    global thread_pool
+    if thread_pool is None:
+        thread_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('ASGI_THREADS', 4)))
+    # 目前的請求正在被分析時，執行緒中的工作也會被取樣
+    return asyncio.get_event_loop().run_in_executor(thread_pool, partial(RequestProfiler.wrap_current(func), *args))
+
+async def login_api(request):
     login =Login()
-    result = login.login(request)
+    result = await login.alogin(request)
     return HttpResponse(result)
 
 # 檢查登入 API
-def check_login(request):
+async def check_login(request):
+    login =Login()
+    result = await login.acheck_login(request)
+    return HttpResponse(result)
+
+# 部分盲簽章的同步處理，在執行緒中執行
+def blind_signature_process(token, input, content_type, accept):
+    # 零知識證明在子程序中驗證，gmpy2 運算時不會釋放GIL，在執行緒中運算仍然會阻塞事件迴圈
+    signer = PartiallyBlindSignatureServerInterface(token, ProtocolExecutor.shared())
+    return signer.process(token, input, content_type, accept)
+
+# 部分盲簽章 API，依照目前的步驟處理請求
+async def blind_signature(request):
     login =Login()
-    result = login.check_login(request)
-    return HttpResponse(result)
\ No newline at end of file
+    token = login.get_request_token(request)
+    # 不是協定格式的 Content-Type 時由內容判斷
+    content_type = request.content_type
+    if content_type not in (ProtocolMessageCodec.CONTENT_TYPE_JSON, ProtocolMessageCodec.CONTENT_TYPE_BINARY):
+        content_type = None
+    try:
+        output, content_type = await run_in_thread(blind_signature_process,
+            token, request.body, content_type, request.headers.get("Accept"))
+    except Exception as e:
+        return HttpResponse(json.dumps({"code":0, "message":str(e)}))
+    return HttpResponse(output, content_type=content_type)
+
+# 批次轉帳的同步處理，在執行緒中執行
+# 回應在執行緒中組合完成後才送出，Django 3.2 的ASGI在事件迴圈中同步迭代串流回應，不能在其中寫入資料庫，
+# 所以回應的大小由 BULK_TRANSFER_MAX_TRANSFERS 限制
+def bulk_transfer_process(request):
+    # 執行緒池的連線不會經過 request_started/request_finished，依照 CONN_MAX_AGE 自行關閉
+    close_old_connections()
+    try:
+        return b"".join(BulkTransfer().process(request))
+    finally:
+        close_old_connections()
+
+# 批次轉帳 API，供結算工作使用，以 X-Settlement-Key 標頭驗證
+async def bulk_transfer(request):
+    if request.method != "POST":
+        return HttpResponse(json.dumps({"code":0, "message":"請以POST送出批次轉帳。"}))
+    if not BulkTransfer.check_key(request.headers.get("X-Settlement-Key")):
+        return HttpResponse(json.dumps({"code":0, "message":"結算金鑰錯誤。"}))
+    try:
+        output = await run_in_thread(bulk_transfer_process, request)
+    except Exception as e:
+        return HttpResponse(json.dumps({"code":0, "message":str(e)}))
+    return HttpResponse(output, content_type=BulkTransfer.CONTENT_TYPE)
+
+# Prometheus 指標 API，設定 METRICS_DIR 時輸出所有 worker 與子程序的耗時統計，讀取檔案在執行緒中執行
+async def metrics(request):
+    output = await run_in_thread(Instrumentation.render)
+    return HttpResponse(output, content_type=Instrumentation.CONTENT_TYPE)
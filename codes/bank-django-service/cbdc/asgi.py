@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cbdc.settings')
 
 application = get_asgi_application()
+
+# 與 runserver 相同，開發模式下由Django提供靜態檔案
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
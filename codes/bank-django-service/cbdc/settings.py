@@ -53,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'app_core.middlewares.ProfilingMiddleware.ProfilingMiddleware', # 手動添加，效能分析中間層，未設定時不載入。
     'app_core.middlewares.LoginMiddleware.LoginMiddleware', # 手動添加，登入中間層。
 ]
 
@@ -91,6 +92,25 @@ DATABASES = {
     }
 }
 
+# 資料庫連線模式，由環境變數 DATABASE_POOL_MODE 設定:
+#   persistent(預設): 每個執行緒保留連線 DATABASE_CONN_MAX_AGE 秒(預設60)，每個請求開始時檢查重複使用的連線。
+#   external: 連線到外部連線池(例如 ProxySQL)，位址為 MYSQL_POOL_IP 與 MYSQL_POOL_PORT(預設6033)，
+#             由連線池保留與MySQL的連線，Django 每個請求結束後關閉與連線池的連線，適合多個worker的部署。
+#   none: 每個請求建立新的連線。
+DATABASE_POOL_MODE = os.environ.get('DATABASE_POOL_MODE', 'persistent')
+if DATABASE_POOL_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+    # Django 3.2 沒有這個設定，由 app_core.models.DatabaseConnection 檢查
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = os.environ.get('DATABASE_CONN_HEALTH_CHECKS', '1') == '1'
+elif DATABASE_POOL_MODE == 'external':
+    DATABASES['default']['HOST'] = os.environ['MYSQL_POOL_IP']
+    DATABASES['default']['PORT'] = os.environ.get('MYSQL_POOL_PORT', '6033')
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+elif DATABASE_POOL_MODE == 'none':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+else:
+    raise Exception("DATABASE_POOL_MODE 必須為 persistent、external 或 none。")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -110,6 +130,15 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# 密碼雜湊，第一個為新密碼使用的演算法，其他演算法的密碼在登入時重新雜湊
+# PBKDF2 的迭代次數由環境變數 PASSWORD_HASH_ITERATIONS 設定
+# Argon2 與 bcrypt 需要 requirements.txt 中沒有的套件，不列入
+PASSWORD_HASHERS = [
+    'app_core.models.PasswordHashing.ConfigurablePBKDF2PasswordHasher',
+    'app_core.models.PasswordHashing.UnsaltedSHA256PasswordHasher', # 舊版沒有加鹽的 SHA-256
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
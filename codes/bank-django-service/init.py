@@ -1,22 +1,186 @@
 # 啟動腳本
+"""
+容器啟動時依序執行:
+
+1. 等待資料庫: 先以TCP連線探測資料庫的埠口，再以 SELECT 1 確認可以登入，失敗時以指數退避重試。
+2. 資料庫結構: 計算 migrations 與 fixtures 的雜湊，與資料庫中記錄的相同時略過 migrate 與 loaddata。
+3. 啟動伺服器: gunicorn 預先 fork 多個 uvicorn worker(ASGI)，worker 與執行緒數量由CPU核心數決定。
+4. 記錄冷啟動耗時: 從腳本開始到伺服器可以處理請求為止，以及每個階段的耗時。
+5. 已使用貨幣的布隆過濾器: Redis 中不存在時在背景重建，不延遲伺服器啟動，重建完成前查詢資料庫。
+
+設定可以由環境變數指定:
+    ASGI_WORKERS: worker 程序數量，預設為CPU核心數。
+    ASGI_THREADS: 每個 worker 執行同步工作(盲簽章步驟)的執行緒數量，預設為 max(4, 2 * CPU核心數 / worker數量)。
+    PROTOCOL_EXECUTOR_WORKERS: 每個 worker 驗證零知識證明的子程序數量，預設為 max(1, CPU核心數 / worker數量)，
+                               只有1個時也在子程序中驗證，不佔用 worker 的GIL。
+    PASSWORD_HASH_WORKERS: 每個 worker 雜湊密碼的執行緒數量，預設為 max(1, CPU核心數 / worker數量)。
+    METRICS_DIR: 合併每個 worker 與子程序耗時統計的目錄，預設為暫存目錄下的 cbdc-metrics，啟動時清空。
+    DATABASE_READY_TIMEOUT: 等待資料庫的最長秒數，預設120。
+    FORCE_MIGRATE: 設為1時無論雜湊是否相同都執行 migrate 與 loaddata。
+"""
+import glob
+import hashlib
+import os
+import signal
+import socket
 import subprocess
+import sys
+import tempfile
 import time
+import urllib.request
 
-def main():
-    for i in range(20):
-        # 嘗試進行資料庫操作，如果操作失敗則嘗試重新連線，因為MySQL的啟動時間較長，所以重試直到連上。
+CODE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+FIXTURE = os.path.join(CODE_DIRECTORY, 'app_core', 'fixtures', 'data.json')
+HOST = '0.0.0.0'
+PORT = 8000
+
+CPU_COUNT = os.cpu_count() or 1
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', CPU_COUNT))
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', max(4, 2 * CPU_COUNT // ASGI_WORKERS)))
+PROTOCOL_EXECUTOR_WORKERS = int(os.environ.get('PROTOCOL_EXECUTOR_WORKERS', max(1, CPU_COUNT // ASGI_WORKERS)))
+# hashlib 的 PBKDF2 會釋放GIL，所有 worker 同時進行的雜湊總數不超過CPU核心數
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, CPU_COUNT // ASGI_WORKERS)))
+METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'cbdc-metrics')
+DATABASE_READY_TIMEOUT = float(os.environ.get('DATABASE_READY_TIMEOUT', 120))
+
+def log(message:str):
+    print("[啟動] " + message, flush=True)
+
+def backoff(timeout:float, initial:float = 0.5, maximum:float = 8):
+    """指數退避的等待秒數，超過 timeout 時停止"""
+    deadline = time.monotonic() + timeout
+    delay = initial
+    while time.monotonic() < deadline:
+        yield
+        time.sleep(min(delay, max(0, deadline - time.monotonic())))
+        delay = min(delay * 2, maximum)
+
+def wait_for_database():
+    """等待資料庫可以連線並且登入"""
+    from django.conf import settings
+    from django.db import connection
+    from django.db.utils import OperationalError
+    database = settings.DATABASES['default']
+    host = database.get('HOST')
+    port = int(database.get('PORT') or 3306)
+    error = None
+    for i in backoff(DATABASE_READY_TIMEOUT):
+        # TCP連線探測，資料庫尚未啟動時不需要經過Django的連線流程
+        if host:
+            try:
+                socket.create_connection((host, port), timeout=2).close()
+            except OSError as e:
+                error = e
+                log("等待資料庫 %s:%d ... (%s)" % (host, port, e))
+                continue
+        # MySQL 開始接受連線後仍然需要一段時間才能登入
         try:
-            subprocess.run(['python','/code/manage.py','migrate'], check = True)
-            subprocess.run(['python','/code/manage.py','loaddata','app_core/fixtures/data.json'], check = True)
-            subprocess.run(['python','/code/manage.py','runserver','0.0.0.0:8000'], check = True)
-            subprocess.run(['chmod','+x','Test'], check = True)
-            break
-        except subprocess.CalledProcessError:
-            print("資料庫連線重試...")
-        # 等待2秒重試
-        time.sleep(2)
-    # 嘗試20次後接受失敗，調整資料庫配置或者Django程式。
-    raise Exception("資料庫連線失敗，或者面對其他Django啟動失敗問題，請檢修資料庫與Django主程式。")
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return
+        except OperationalError as e:
+            error = e
+            connection.close()
+            log("等待資料庫登入 ... (%s)" % e)
+    raise Exception("資料庫連線失敗，請檢修資料庫與Django設定: %s" % error)
+
+def schema_hash() ->str:
+    """migrations、fixtures 與 Django 版本的雜湊"""
+    import django
+    digest = hashlib.sha256(django.get_version().encode('utf-8'))
+    paths = sorted(glob.glob(os.path.join(CODE_DIRECTORY, '*', 'migrations', '*.py'))) + [FIXTURE]
+    for path in paths:
+        digest.update(os.path.relpath(path, CODE_DIRECTORY).encode('utf-8'))
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+def prepare_database():
+    """資料庫結構有變更時執行 migrate 與 loaddata"""
+    from django.core.management import call_command
+    from django.db.utils import DatabaseError
+    from app_core.models import SchemaVersion
+    current_hash = schema_hash()
+    try:
+        recorded_hash = SchemaVersion.objects.filter(name='default').values_list('schema_hash', flat=True).first()
+    except DatabaseError:
+        # 第一次啟動，資料表尚未建立
+        recorded_hash = None
+    if recorded_hash == current_hash and os.environ.get('FORCE_MIGRATE') != '1':
+        log("資料庫結構沒有變更，略過 migrate 與 loaddata")
+        return
+    call_command('migrate', interactive=False)
+    call_command('loaddata', FIXTURE)
+    SchemaVersion.objects.update_or_create(name='default', defaults={'schema_hash':current_hash})
+
+def prepare_metrics_directory():
+    """清除上次啟動留下的耗時統計，累計的次數從0開始"""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json*')):
+        os.remove(path)
+
+def start_server() ->subprocess.Popen:
+    """以 gunicorn 預先 fork uvicorn worker"""
+    environment = dict(os.environ, ASGI_THREADS=str(ASGI_THREADS), PROTOCOL_EXECUTOR_WORKERS=str(PROTOCOL_EXECUTOR_WORKERS),
+        PASSWORD_HASH_WORKERS=str(PASSWORD_HASH_WORKERS), METRICS_DIR=METRICS_DIR)
+    return subprocess.Popen([
+        sys.executable, '-m', 'gunicorn', 'cbdc.asgi:application',
+        '--chdir', CODE_DIRECTORY,
+        '--worker-class', 'uvicorn.workers.UvicornWorker',
+        '--workers', str(ASGI_WORKERS),
+        '--bind', '%s:%d' % (HOST, PORT),
+        # 在主程序載入Django後才 fork，worker 不需要各自載入
+        '--preload',
+    ], env=environment)
+
+def wait_for_server(server:subprocess.Popen):
+    """等待伺服器可以處理請求
+
+    gunicorn 主程序綁定埠口後就會接受TCP連線，所以以HTTP請求確認 worker 已經可以處理請求。
+    """
+    while server.poll() is None:
+        try:
+            urllib.request.urlopen('http://127.0.0.1:%d/api/check_login' % PORT, timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise Exception("伺服器啟動失敗，請檢修Django主程式。")
+
+def rebuild_spent_coin_filter() ->subprocess.Popen:
+    """在背景重建已使用貨幣的布隆過濾器(已經存在時不重建)"""
+    return subprocess.Popen([sys.executable, os.path.join(CODE_DIRECTORY, 'manage.py'), 'rebuild_spent_coin_filter', '--if-missing'])
+
+def main():
+    start_time = time.perf_counter()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cbdc.settings')
+    sys.path.insert(0, CODE_DIRECTORY)
+    import django
+    django.setup()
+    from django.db import connection
+
+    phase_time = time.perf_counter()
+    wait_for_database()
+    log("資料庫就緒，耗時 %.2f 秒" % (time.perf_counter() - phase_time))
+
+    phase_time = time.perf_counter()
+    prepare_database()
+    connection.close()
+    log("資料庫結構準備完成，耗時 %.2f 秒" % (time.perf_counter() - phase_time))
+
+    subprocess.run(['chmod', '+x', os.path.join(CODE_DIRECTORY, 'Test')])
+
+    phase_time = time.perf_counter()
+    log("啟動伺服器: %d 個 worker，每個 worker %d 個執行緒、%d 個零知識證明子程序、%d 個密碼雜湊執行緒" % (ASGI_WORKERS, ASGI_THREADS, PROTOCOL_EXECUTOR_WORKERS, PASSWORD_HASH_WORKERS))
+    prepare_metrics_directory()
+    server = start_server()
+    # 容器停止時將訊號轉送給 gunicorn
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signal_number, lambda number, frame: server.send_signal(number))
+    wait_for_server(server)
+    log("伺服器就緒，耗時 %.2f 秒" % (time.perf_counter() - phase_time))
+    log("冷啟動完成，總耗時 %.2f 秒" % (time.perf_counter() - start_time))
+    rebuild_spent_coin_filter()
+    sys.exit(server.wait())
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()